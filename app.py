@@ -6,7 +6,17 @@ from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 from dash import no_update, ctx
 import os 
-import joblib # --- NOVO: Para carregar o modelo de ML ---
+import json
+
+from cache_consultas import CacheFigurasDisco, assinatura_arquivos, chave_filtros
+from modelo_recarregavel import ModeloRecarregavel
+from explorador_dados import ExploradorDados
+from atualizacao_dados import ETAPAS_ATUALIZACAO, atualizar_dados_e_modelo
+from dataset_ouvidoria import abrir_dataset, ler_dataset, versao_dataset
+
+# Copy-on-write: os frames em cache (cubos, resultados) são compartilhados entre
+# callbacks e nunca são alterados por eles (cada alteração gera uma cópia)
+pd.set_option("mode.copy_on_write", True)
 
 # Importamos as funções de gráfico
 from eda_ouvidoria import (
@@ -16,12 +26,26 @@ from eda_ouvidoria import (
     grafico_tipos,
     grafico_satisfacao,
     grafico_mapa,
-    grafico_raca
+    grafico_raca,
+    contar_registros
 )
+from etl import ARQUIVO_METADADOS, SATISFACAO_SEM_NOTA
+# Agregações dos callbacks (cubos do ETL ou DuckDB)
+from backend_consultas import consulta_do_painel, criar_backend, filtros_do_painel
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:  # A página /admin precisa do gerenciador de tarefas em disco
+    diskcache = None
 
-ARQUIVO_PARQUET = "ouvidoria.parquet"
 TEMA_GRAFICOS = "plotly_white" 
 ARQUIVO_MODELO = "modelo_satisfacao.joblib" # --- NOVO: Caminho do modelo ---
+TAMANHO_PAGINA_DADOS = 10 # Linhas por página da tabela /dados
+BACKEND_CONSULTAS = "pyarrow" # "pyarrow" (cubos do ETL) ou "duckdb" (requer: pip install duckdb)
+ARQUIVO_CACHE_FIGURAS = "cache_figuras.sqlite" # Cache em disco das figuras, compartilhado entre os workers
+LIMITE_CACHE_FIGURAS = 256 * 1024 * 1024 # Bytes máximos (comprimidos) do cache de figuras
+PASTA_CACHE_TAREFAS = "cache_tarefas" # Estado/progresso das tarefas em segundo plano (página /admin)
 
 # --- 0. CRIAR PASTA ASSETS SE NÃO EXISTIR ---
 assets_dir = os.path.join(os.getcwd(), "assets")
@@ -45,7 +69,58 @@ if not os.path.exists(css_file_path):
 
 
 # --- 1. CARREGAR OPÇÕES DOS FILTROS (EXPANDIDO) ---
-def carregar_opcoes_filtros():
+def carregar_metadados():
+    """
+    Metadados gerados pelo etl.py (valores distintos, contagens e amostra).
+    Retorna None se o arquivo não existir ou for de outra versão dos dados.
+    """
+    try:
+        with open(ARQUIVO_METADADOS, encoding="utf-8") as f:
+            metadados = json.load(f)
+        if metadados.get("versao_dados") != versao_dataset():
+            print(f"Metadados '{ARQUIVO_METADADOS}' desatualizados (de outra versão do dataset).")
+            return None
+        print(f"Metadados '{ARQUIVO_METADADOS}' carregados.")
+        return metadados
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"ERRO ao carregar os metadados '{ARQUIVO_METADADOS}': {e}")
+        return None
+
+
+def montar_opcoes(anos_unicos, ufs_unicas, tipos_unicos, orgaos_unicos, generos_unicos, faixas_unicas, racas_unicas):
+    return {
+        "anos": [{"label": ano, "value": ano} for ano in anos_unicos],
+        "ufs": [{"label": uf.upper(), "value": uf} for uf in ufs_unicas],
+        "anos_lista": anos_unicos, # Para o valor default
+        "ufs_lista": ufs_unicas, # Para o valor default
+        
+        # Opções para ML
+        "tipos_ml": [{"label": i, "value": i} for i in tipos_unicos],
+        "orgaos_ml": [{"label": i, "value": i} for i in orgaos_unicos],
+        "generos_ml": [{"label": i, "value": i} for i in generos_unicos],
+        "faixas_ml": [{"label": i, "value": i} for i in faixas_unicas],
+        "racas_ml": [{"label": i, "value": i} for i in racas_unicas],
+        "ufs_ml": [{"label": uf.upper(), "value": uf} for uf in ufs_unicas],
+    }
+
+
+def carregar_opcoes_filtros(metadados=None):
+    if metadados is not None:
+        # Caminho rápido: tudo vem do arquivo de metadados, sem ler o dataset
+        valores = {col: [valor for valor, _ in pares] for col, pares in metadados["contagens"].items()}
+        return montar_opcoes(
+            sorted(valores["ano_registro"]),
+            sorted(valores["uf_do_municipio_manifestante"]),
+            sorted(valores["tipo_manifestacao"]),
+            # As contagens já vêm em ordem decrescente: os 1000 órgãos mais frequentes
+            sorted(valores["nome_orgao"][:1000]),
+            sorted(valores["genero"]),
+            sorted(valores["faixa_etaria"]),
+            sorted(valores["raca_cor"]),
+        )
+
     print("Carregando opções de filtros e ML do Parquet...")
     try:
         # Colunas necessárias para os filtros e para o ML
@@ -56,39 +131,22 @@ def carregar_opcoes_filtros():
         ]
         
         # Lê todas as colunas necessárias de uma vez
-        df_opcoes = pd.read_parquet(
-            ARQUIVO_PARQUET, columns=colunas_necessarias, engine="pyarrow"
-        )
+        df_opcoes = ler_dataset(colunas=colunas_necessarias)
         print("Dados de opções carregados.")
 
-        # Opções para Filtros do Dashboard
-        anos_unicos = sorted(df_opcoes["ano_registro"].dropna().unique().astype(int))
-        ufs_unicas = sorted(df_opcoes["uf_do_municipio_manifestante"].dropna().unique())
-
-        # Opções para Dropdowns do ML
-        tipos_unicos = sorted(df_opcoes["tipo_manifestacao"].dropna().unique())
-        # Limita a 1000 órgãos para não sobrecarregar o dropdown
-        orgaos_unicos = sorted(df_opcoes["nome_orgao"].value_counts().head(1000).index)
-        generos_unicos = sorted(df_opcoes["genero"].dropna().unique())
-        faixas_unicas = sorted(df_opcoes["faixa_etaria"].dropna().unique())
-        racas_unicas = sorted(df_opcoes["raca_cor"].dropna().unique())
-        
+        opcoes = montar_opcoes(
+            # Opções para Filtros do Dashboard
+            sorted(df_opcoes["ano_registro"].dropna().unique().astype(int)),
+            sorted(df_opcoes["uf_do_municipio_manifestante"].dropna().unique()),
+            # Opções para Dropdowns do ML
+            sorted(df_opcoes["tipo_manifestacao"].dropna().unique()),
+            # Limita a 1000 órgãos para não sobrecarregar o dropdown
+            sorted(df_opcoes["nome_orgao"].value_counts().head(1000).index),
+            sorted(df_opcoes["genero"].dropna().unique()),
+            sorted(df_opcoes["faixa_etaria"].dropna().unique()),
+            sorted(df_opcoes["raca_cor"].dropna().unique()),
+        )
         print("Opções de filtros e ML carregadas.")
-        
-        opcoes = {
-            "anos": [{"label": ano, "value": ano} for ano in anos_unicos],
-            "ufs": [{"label": uf.upper(), "value": uf} for uf in ufs_unicas],
-            "anos_lista": anos_unicos, # Para o valor default
-            "ufs_lista": ufs_unicas, # Para o valor default
-            
-            # Opções para ML
-            "tipos_ml": [{"label": i, "value": i} for i in tipos_unicos],
-            "orgaos_ml": [{"label": i, "value": i} for i in orgaos_unicos],
-            "generos_ml": [{"label": i, "value": i} for i in generos_unicos],
-            "faixas_ml": [{"label": i, "value": i} for i in faixas_unicas],
-            "racas_ml": [{"label": i, "value": i} for i in racas_unicas],
-            "ufs_ml": [{"label": uf.upper(), "value": uf} for uf in ufs_unicas],
-        }
         return opcoes
         
     except Exception as e:
@@ -102,35 +160,55 @@ def carregar_opcoes_filtros():
         }
         return opcoes_emergencia
 
-opcoes = carregar_opcoes_filtros()
+metadados = carregar_metadados()
+opcoes = carregar_opcoes_filtros(metadados)
 
 
-# --- 2. CARREGAR AMOSTRA PARA A TABELA (Sem mudança) ---
-try:
-    df_amostra = pd.read_parquet(
-        ARQUIVO_PARQUET, columns=None, engine="pyarrow"
-    )
-    df_amostra = df_amostra.head(100)
-    df_amostra = df_amostra.astype(object).where(pd.notna(df_amostra), None)
-    dados_tabela = df_amostra.to_dict("records")
-    colunas_tabela = [
-        {"name": i.replace("_", " ").title(), "id": i} for i in df_amostra.columns
-    ]
-    del df_amostra
-except Exception as e:
-    print(f"ERRO AO CARREGAR AMOSTRA: {e}")
-    dados_tabela = []
-    colunas_tabela = []
+# --- 2. CARREGAR AMOSTRA PARA A TABELA ---
+def carregar_amostra(metadados=None):
+    """(linhas, colunas) da amostra mostrada na tabela /dados."""
+    try:
+        if metadados is not None:
+            colunas_amostra = metadados["amostra"]["colunas"]
+            dados_tabela = metadados["amostra"]["linhas"]
+        else:
+            # head() lê só os primeiros arquivos do dataset, não o dataset inteiro
+            df_amostra = abrir_dataset().head(100).to_pandas()
+            df_amostra = df_amostra.astype(object).where(pd.notna(df_amostra), None)
+            colunas_amostra = list(df_amostra.columns)
+            dados_tabela = df_amostra.to_dict("records")
+            del df_amostra
+        colunas_tabela = [
+            {"name": i.replace("_", " ").title(), "id": i} for i in colunas_amostra
+        ]
+        return dados_tabela, colunas_tabela
+    except Exception as e:
+        print(f"ERRO AO CARREGAR AMOSTRA: {e}")
+        return [], []
 
+dados_tabela, colunas_tabela = carregar_amostra(metadados)
 
-# --- 3. CARREGAR O MODELO DE ML (NOVO) ---
-try:
-    modelo_carregado = joblib.load(ARQUIVO_MODELO)
-    print(f"Modelo '{ARQUIVO_MODELO}' carregado com sucesso.")
-except Exception as e:
-    print(f"ERRO CRÍTICO: Não foi possível carregar o modelo '{ARQUIVO_MODELO}'.")
-    print(f"Erro: {e}")
-    modelo_carregado = None
+# Um novo ETL (ex: pela página /admin) regrava os metadados: opções dos filtros
+# e amostra são trocadas no próximo carregamento de página (layout_principal)
+assinatura_metadados = assinatura_arquivos([ARQUIVO_METADADOS])
+
+def recarregar_metadados_se_mudaram():
+    global metadados, opcoes, dados_tabela, colunas_tabela, assinatura_metadados
+    assinatura = assinatura_arquivos([ARQUIVO_METADADOS])
+    if assinatura == assinatura_metadados:
+        return
+    novos_metadados = carregar_metadados()
+    if novos_metadados is None:
+        return  # Desatualizados ou ilegíveis: continua com os atuais
+    assinatura_metadados = assinatura
+    metadados, opcoes = novos_metadados, carregar_opcoes_filtros(novos_metadados)
+    dados_tabela, colunas_tabela = carregar_amostra(novos_metadados)
+
+
+# --- 3. MODELO DE ML (NOVO) ---
+# Carregado só na primeira visita à página de predição e recarregado a quente
+# quando um modelo novo é salvo (ver modelo_recarregavel.py)
+modelo_satisfacao = ModeloRecarregavel(ARQUIVO_MODELO)
 
 
 # --- 4. DEFINIÇÃO DOS LAYOUTS DAS "PÁGINAS" ---
@@ -245,8 +323,8 @@ def layout_metodologia():
                 """
                 - **Extração (Extract):** Múltiplos arquivos CSV foram lidos.
                 - **Transformação (Transform):** Um script Python (`etl.py`) usando Pandas limpou e normalizou os dados.
-                - **Carga (Load):** O resultado limpo foi salvo em um único arquivo: **`ouvidoria.parquet`** (usando o motor `pyarrow`).
-                - **Visualização:** Este dashboard **lê dados diretamente do arquivo Parquet** (usando `pyarrow`), aplicando filtros antes de carregar os dados na memória.
+                - **Carga (Load):** O resultado limpo foi salvo em um dataset Parquet particionado por ano e UF: **`ouvidoria_dataset/`** (usando o motor `pyarrow`).
+                - **Visualização:** Este dashboard **lê dados diretamente do dataset Parquet** (usando `pyarrow`), descartando partições fora dos filtros antes de carregar os dados na memória.
                 """
             ),
             html.H2("Modelo de Machine Learning (Classificação)"),
@@ -263,26 +341,74 @@ def layout_metodologia():
     )
 
 def layout_amostra_dados():
-    # (Sem mudanças)
+    # Paginação, ordenação e filtro no servidor (callback atualizar_tabela_dados):
+    # a tabela navega pelo dataset inteiro, não só pela amostra
+    try:
+        colunas = explorador_dados.colunas()
+    except Exception as e:
+        print(f"ERRO ao abrir o dataset para a tabela: {e}")
+        colunas = colunas_tabela
     return html.Div(
         style={"padding": "20px"},
         children=[
-            html.H2("Amostra de 100 Linhas do Arquivo Parquet"),
+            html.H2("Dados do Arquivo Parquet"),
             dash_table.DataTable(
                 id="tabela-dados",
-                columns=colunas_tabela,
-                data=dados_tabela,
-                page_size=10,
-                sort_action="native",
-                filter_action="native",
+                columns=colunas,
+                data=dados_tabela[:TAMANHO_PAGINA_DADOS], # A 1ª página é o início da amostra
+                page_current=0,
+                page_size=TAMANHO_PAGINA_DADOS,
+                page_action="custom",
+                sort_action="custom",
+                sort_mode="multi",
+                filter_action="custom",
+                filter_query="",
                 style_table={"overflowX": "auto"},
             ),
         ]
     )
 
+def layout_admin():
+    if gerenciador_tarefas is None:
+        return html.Div(
+            style={"padding": "20px"},
+            children=[
+                html.H2("Atualização dos Dados e do Modelo"),
+                html.P("As tarefas em segundo plano precisam do diskcache: pip install \"dash[diskcache]\".", style={"color": "red"}),
+            ]
+        )
+    return html.Div(
+        style={"padding": "20px"},
+        children=[
+            html.H2("Atualização dos Dados e do Modelo"),
+            html.P(
+                "Roda o ETL (CSVs de src/dados) e/ou o treino do modelo em segundo plano. "
+                "O painel continua servindo os dados atuais e troca para os novos só quando cada etapa termina."
+            ),
+            dcc.Checklist(
+                id="admin-etapas",
+                options=[{"label": f" {rotulo}", "value": nome} for nome, rotulo in ETAPAS_ATUALIZACAO.items()],
+                value=list(ETAPAS_ATUALIZACAO),
+            ),
+            html.Div(
+                style={"display": "flex", "gap": "10px", "marginTop": "10px"},
+                children=[
+                    html.Button("Executar atualização", id="botao-atualizar", n_clicks=0),
+                    html.Button("Cancelar", id="botao-cancelar", n_clicks=0, disabled=True),
+                ]
+            ),
+            html.Div(id="admin-resultado", style={"marginTop": "15px", "fontWeight": "bold"}),
+            html.Div(id="admin-resumo", style={"marginTop": "10px"}),
+            html.Pre(
+                id="admin-log",
+                style={"maxHeight": "400px", "overflowY": "auto", "backgroundColor": "#f4f4f4", "padding": "10px"},
+            ),
+        ]
+    )
+
 # --- NOVO: Layout para a página de Predição ---
 def layout_predicao():
-    if modelo_carregado is None:
+    if modelo_satisfacao.obter() is None:
         return html.Div([
             html.H2("Erro na Análise Preditiva"),
             html.P(f"O modelo '{ARQUIVO_MODELO}' não pôde ser carregado."),
@@ -355,119 +481,128 @@ def layout_predicao():
 # --- CORREÇÃO IMPORTANTE AQUI ---
 #app = dash.Dash(__name__, suppress_callback_exceptions=True)
 #server = app.server
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
+# Tarefas longas (ETL, treino) rodam em processos separados: nunca seguram os workers
+gerenciador_tarefas = DiskcacheManager(diskcache.Cache(PASTA_CACHE_TAREFAS)) if diskcache is not None else None
+app = dash.Dash(__name__, suppress_callback_exceptions=True, background_callback_manager=gerenciador_tarefas)
 print("--- DEBUG: O MODO DE SUPRESSÃO DE ERRO ESTÁ ATIVO! ---") # <-- ADICIONE ESTA LINHA
 server = app.server
 
-app.layout = html.Div(
-    style={"padding": "20px", "fontFamily": "Arial, sans-serif"}, 
-    children=[
-        dcc.Store(id='memoria-filtro-tipo'),
-        dcc.Location(id="url", refresh=False),
+def layout_principal():
+    # Função (e não um layout fixo): cada carregamento de página usa as opções atuais
+    recarregar_metadados_se_mudaram()
+    return html.Div(
+        style={"padding": "20px", "fontFamily": "Arial, sans-serif"}, 
+        children=[
+            dcc.Store(id='memoria-filtro-tipo'),
+            dcc.Location(id="url", refresh=False),
 
-        html.H1(children="Análise Exploratória - Ouvidoria CGU"),
-        html.P(
-            children=f"Análise dos dados de {opcoes['anos_lista'][0]} a {opcoes['anos_lista'][-1]} (Via Parquet)"
-        ),
+            html.H1(children="Análise Exploratória - Ouvidoria CGU"),
+            html.P(
+                children=f"Análise dos dados de {opcoes['anos_lista'][0]} a {opcoes['anos_lista'][-1]} (Via Parquet)"
+            ),
         
-        # Filtros Globais
-        html.Button(
-            "Mostrar/Esconder Filtros",
-            id="botao-toggle-filtros",
-            style={"marginBottom": "10px", "width": "100%"},
-        ),
-        html.Div(
-            id="container-filtros",
-            className="filtros",
-            children=[
-                html.Label("Selecione o(s) Ano(s):"),
-                dcc.Dropdown(
-                    id="filtro-ano",
-                    options=opcoes["anos"],
-                    value=[opcoes["anos_lista"][-1]], # Default = último ano
-                    multi=True,
-                ),
-                html.Label("Selecione a(s) UF(s):"),
-                dcc.Dropdown(
-                    id="filtro-uf",
-                    options=opcoes["ufs"],
-                    value=opcoes["ufs_lista"], # Default = todas as UFs
-                    multi=True,
-                ),
-                html.Button(
-                    "Limpar seleção de Tipo (clique no gráfico)", 
-                    id="botao-limpar-tipo",
-                    style={"marginTop": "10px", "width": "100%"}
-                )
-            ],
-            style={"display": "none"}, # Inicia fechado
-        ),
+            # Filtros Globais
+            html.Button(
+                "Mostrar/Esconder Filtros",
+                id="botao-toggle-filtros",
+                style={"marginBottom": "10px", "width": "100%"},
+            ),
+            html.Div(
+                id="container-filtros",
+                className="filtros",
+                children=[
+                    html.Label("Selecione o(s) Ano(s):"),
+                    dcc.Dropdown(
+                        id="filtro-ano",
+                        options=opcoes["anos"],
+                        value=[opcoes["anos_lista"][-1]], # Default = último ano
+                        multi=True,
+                    ),
+                    html.Label("Selecione a(s) UF(s):"),
+                    dcc.Dropdown(
+                        id="filtro-uf",
+                        options=opcoes["ufs"],
+                        value=opcoes["ufs_lista"], # Default = todas as UFs
+                        multi=True,
+                    ),
+                    html.Button(
+                        "Limpar seleção de Tipo (clique no gráfico)", 
+                        id="botao-limpar-tipo",
+                        style={"marginTop": "10px", "width": "100%"}
+                    )
+                ],
+                style={"display": "none"}, # Inicia fechado
+            ),
 
-        layout_kpis(),
+            layout_kpis(),
+
+            # --- BARRA DE NAVEGAÇÃO ATUALIZADA ---
+            html.Nav(
+                style={
+                    "display": "flex", "alignItems": "center", "borderBottom": "1px solid #ddd", 
+                    "padding": "10px 0", "marginBottom": "20px", "marginTop": "20px", "fontSize": "1.1em"
+                },
+                children=[
+                    dcc.Link("Dashboard (Gráficos)", href="/", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
+                    html.Span(">", style={"color": "#888"}),
+                    dcc.Link("Análise Exploratória (EDA)", href="/eda", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
+                    html.Span(">", style={"color": "#888"}),
+                    # --- NOVO LINK ---
+                    dcc.Link("Análise Preditiva (ML)", href="/predicao", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF", "fontWeight": "bold"}),
+                    html.Span(">", style={"color": "#888"}),
+                    dcc.Link("Metodologia (ETL/ML)", href="/metodologia", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
+                    html.Span(">", style={"color": "#888"}),
+                    dcc.Link("Amostra dos Dados (Parquet)", href="/dados", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
+                    html.Span(">", style={"color": "#888"}),
+                    dcc.Link("Atualização (Admin)", href="/admin", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
+                ]
+            ),
 
-        # --- BARRA DE NAVEGAÇÃO ATUALIZADA ---
-        html.Nav(
-            style={
-                "display": "flex", "alignItems": "center", "borderBottom": "1px solid #ddd", 
-                "padding": "10px 0", "marginBottom": "20px", "marginTop": "20px", "fontSize": "1.1em"
-            },
-            children=[
-                dcc.Link("Dashboard (Gráficos)", href="/", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
-                html.Span(">", style={"color": "#888"}),
-                dcc.Link("Análise Exploratória (EDA)", href="/eda", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
-                html.Span(">", style={"color": "#888"}),
-                # --- NOVO LINK ---
-                dcc.Link("Análise Preditiva (ML)", href="/predicao", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF", "fontWeight": "bold"}),
-                html.Span(">", style={"color": "#888"}),
-                dcc.Link("Metodologia (ETL/ML)", href="/metodologia", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
-                html.Span(">", style={"color": "#888"}),
-                dcc.Link("Amostra dos Dados (Parquet)", href="/dados", style={"textDecoration": "none", "padding": "0 10px", "color": "#007BFF"}),
-            ]
-        ),
+            # Container da Página
+            html.Div(id="page-content")
+        ]
+    )
 
-        # Container da Página
-        html.Div(id="page-content")
-    ]
-)
+app.layout = layout_principal
 
-# --- 6. FUNÇÃO HELPER DE FILTRAGEM ---
-def ler_dados_filtrados(anos, ufs, tipo_clicado):
-    # (Sem mudanças)
+# --- 6. TABELA /dados (páginas lidas do Parquet sob demanda) ---
+explorador_dados = ExploradorDados()
+
+
+# --- 6a. BACKEND DE CONSULTAS (agregações dos KPIs e gráficos) ---
+# Os callbacks pedem filtros + dimensões (+ top-N); o backend decide se
+# responde pelos cubos do ETL ou agregando o Parquet (ver backend_consultas.py)
+backend_consultas = criar_backend(BACKEND_CONSULTAS)
+# Já na inicialização: com `gunicorn --preload` o mapeamento do Arrow do painel
+# é herdado pelos workers, que leem as mesmas páginas do arquivo
+backend_consultas.aquecer()
+
+def consultar(anos, ufs, tipo_clicado, nome_consulta):
+    """
+    Contagens ('total') da consulta `nome_consulta` (ver CONSULTAS_PAINEL)
+    para os filtros do painel. DataFrame vazio se não houver dados.
+    """
     if not anos or not ufs:
         print("Filtros vazios.")
         return pd.DataFrame()
-
-    filtros_parquet = [
-        ("ano_registro", "in", anos),
-        ("uf_do_municipio_manifestante", "in", ufs),
-    ]
-    if tipo_clicado:
-        print(f"Filtrando também por TIPO: {tipo_clicado}")
-        filtros_parquet.append(("tipo_manifestacao", "==", tipo_clicado))
-
-    colunas_necessarias = [
-        "ano_registro", "data_registro",
-        "tipo_manifestacao", "nome_orgao",
-        "satisfacao", "dias_de_atraso",
-        "genero", "faixa_etaria", "raca_cor",
-        "uf_do_municipio_manifestante",
-    ]
-    colunas_necessarias = list(set(colunas_necessarias)) 
-
     try:
-        df_filtrado = pd.read_parquet(
-            ARQUIVO_PARQUET,
-            columns=colunas_necessarias,
-            filters=filtros_parquet,
-            engine="pyarrow",
-        )
-        print(f"Leitura do Parquet retornou {len(df_filtrado)} linhas.")
-        return df_filtrado
+        consulta = consulta_do_painel(filtros_do_painel(anos, ufs, tipo_clicado), nome_consulta)
+        return backend_consultas.consultar(consulta)
     except Exception as e:
-        print(f"ERRO ao ler Parquet com filtros: {e}")
+        print(f"ERRO na consulta (backend '{backend_consultas.nome}'): {e}")
+        # Erro passageiro (memória, arquivo sendo trocado): o gráfico vazio não vai para o cache
+        cache_figuras.nao_memorizar()
         return pd.DataFrame()
 
 
+# --- 6b. CACHE DE FIGURAS (disco, compartilhado entre os workers do gunicorn) ---
+# A versão dos dados (do manifesto do ETL) entra na chave: um novo ETL invalida o cache
+def versao_dados():
+    return versao_dataset() or "-"
+
+cache_figuras = CacheFigurasDisco(ARQUIVO_CACHE_FIGURAS, LIMITE_CACHE_FIGURAS, versao_dados)
+
+
 # --- 7. CALLBACKS ---
 
 # Callback 7.1: Roteador (Renderiza a página correta) - ATUALIZADO
@@ -485,6 +620,8 @@ def display_page(pathname):
     # --- NOVA ROTA ---
     elif pathname == "/predicao":
         return layout_predicao()
+    elif pathname == "/admin":
+        return layout_admin()
     else:
         # Página inicial (href="/")
         return layout_dashboard()
@@ -535,32 +672,27 @@ def gerenciar_filtro_clique(clique_grafico, clique_limpar):
         Input("memoria-filtro-tipo", "data")
     ]
 )
+@cache_figuras.memorizar("atualizar_kpis", normalizar=chave_filtros)
 def atualizar_kpis(anos_selecionados, ufs_selecionadas, tipo_clicado):
     # (ESSA É A PARTE QUE FALTAVA)
     print("Atualizando KPIs...")
-    df_filtrado = ler_dados_filtrados(
-        anos_selecionados, ufs_selecionadas, tipo_clicado
-    )
+    contagens = consultar(anos_selecionados, ufs_selecionadas, tipo_clicado, "kpis")
 
-    if df_filtrado.empty:
+    if contagens.empty:
         return "0", "0.0%", "N/A"
 
     # --- 1. KPI Total ---
-    total_manifestacoes = len(df_filtrado)
+    total_manifestacoes = int(contagens["total"].sum())
     
     # --- 2. KPI Atraso ---
-    df_filtrado["em_atraso"] = pd.to_numeric(df_filtrado["dias_de_atraso"], errors='coerce').fillna(0) > 0
-    pct_atraso = df_filtrado["em_atraso"].mean() * 100
+    pct_atraso = contagens.loc[contagens["em_atraso"].astype(bool), "total"].sum() / total_manifestacoes * 100
     
-    # --- 3. KPI Satisfação (CORRIGIDO com extração) ---
-    df_satisfacao = df_filtrado.copy()
-    # Extrai o número de "(1) muito insatisfeito"
-    df_satisfacao["satisfacao_num"] = df_satisfacao["satisfacao"].astype(str).str.extract(r'\((\d)\)')
-    df_satisfacao["satisfacao_num"] = pd.to_numeric(df_satisfacao["satisfacao_num"], errors='coerce')
-    df_satisfacao = df_satisfacao.dropna(subset=["satisfacao_num"])
+    # --- 3. KPI Satisfação (média ponderada pelas contagens) ---
+    df_satisfacao = contagens[contagens["satisfacao_num"] != SATISFACAO_SEM_NOTA]
+    total_com_nota = df_satisfacao["total"].sum()
 
-    if not df_satisfacao.empty:
-        media_satisfacao = df_satisfacao["satisfacao_num"].mean()
+    if total_com_nota > 0:
+        media_satisfacao = (df_satisfacao["satisfacao_num"] * df_satisfacao["total"]).sum() / total_com_nota
         str_satisfacao = f"{media_satisfacao:.2f}"
     else:
         str_satisfacao = "N/A"
@@ -582,36 +714,42 @@ def atualizar_kpis(anos_selecionados, ufs_selecionadas, tipo_clicado):
         Input("memoria-filtro-tipo", "data")
     ]
 )
+@cache_figuras.memorizar("atualizar_dashboard", normalizar=chave_filtros)
 def atualizar_dashboard(anos_selecionados, ufs_selecionadas, tipo_clicado):
     # (Função que estava faltando)
     print("Atualizando gráficos do DASHBOARD...")
-    df_filtrado = ler_dados_filtrados(
-        anos_selecionados, ufs_selecionadas, tipo_clicado
-    )
+    filtros = (anos_selecionados, ufs_selecionadas, tipo_clicado)
+    volume = consultar(*filtros, "volume_mensal")
     empty_fig = {"layout": {"template": TEMA_GRAFICOS, "title": {"text": "Sem dados para exibir"}}}
 
-    if df_filtrado.empty:
+    if volume.empty:
         return empty_fig, empty_fig, empty_fig, empty_fig
 
-    fig_volume_mes = grafico_volume_tempo(df_filtrado.copy())
+    fig_volume_mes = grafico_volume_tempo(volume)
     fig_volume_mes.update_layout(title=None) 
 
-    tipo_counts_dash = (df_filtrado["tipo_manifestacao"].value_counts().reset_index(name="Contagem"))
+    tipo_counts_dash = (contar_registros(consultar(*filtros, "tipos"), "tipo_manifestacao").reset_index(name="Contagem"))
     fig_tipo_dash = px.bar(tipo_counts_dash, x="tipo_manifestacao", y="Contagem", template=TEMA_GRAFICOS)
     fig_tipo_dash.update_layout(title=None, title_x=0.5)
 
-    orgao_counts = (df_filtrado["nome_orgao"].value_counts().head(20).reset_index(name="Contagem"))
+    orgao_counts = (contar_registros(consultar(*filtros, "orgaos_top"), "nome_orgao").reset_index(name="Contagem"))
     fig_orgaos = px.bar(orgao_counts, y="nome_orgao", x="Contagem", orientation="h", template=TEMA_GRAFICOS)
     fig_orgaos.update_layout(yaxis={"categoryorder": "total ascending"}, title=None, title_x=0.5) 
 
-    df_filtrado["em_atraso"] = pd.to_numeric(df_filtrado["dias_de_atraso"], errors='coerce').fillna(0) > 0
-    # CORREÇÃO: Usar a coluna 'satisfacao' original para o histograma
-    fig_satisfacao_hist = px.histogram(
-        df_filtrado.dropna(subset=["satisfacao"]),
-        x="satisfacao", color="em_atraso", barmode="group",
+    # Histograma montado a partir das contagens (satisfação x atraso)
+    satisfacao_counts = (
+        consultar(*filtros, "satisfacao_atraso")
+        .rename(columns={"total": "count"})
+        .sort_values(["satisfacao", "em_atraso"])
+    )
+    satisfacao_counts = satisfacao_counts[satisfacao_counts["count"] > 0]
+    satisfacao_counts["em_atraso"] = satisfacao_counts["em_atraso"].astype(str)
+    fig_satisfacao_hist = px.bar(
+        satisfacao_counts,
+        x="satisfacao", y="count", color="em_atraso", barmode="group",
         template=TEMA_GRAFICOS,
         # Ordena o eixo X pelo texto (ex: (1), (2)...)
-        category_orders={"satisfacao": sorted(df_filtrado[df_filtrado['satisfacao'] != 'não informado']['satisfacao'].unique())}
+        category_orders={"satisfacao": sorted(v for v in satisfacao_counts["satisfacao"].unique() if v != 'não informado')}
     )
     fig_satisfacao_hist.update_layout(title=None, title_x=0.5) 
 
@@ -635,25 +773,29 @@ def atualizar_dashboard(anos_selecionados, ufs_selecionadas, tipo_clicado):
         Input("memoria-filtro-tipo", "data")
     ]
 )
+@cache_figuras.memorizar("atualizar_eda", normalizar=chave_filtros)
 def atualizar_eda(anos_selecionados, ufs_selecionadas, tipo_clicado):
     # (Função que estava faltando)
     print("Atualizando gráficos do EDA...")
-    df_filtrado = ler_dados_filtrados(
-        anos_selecionados, ufs_selecionadas, tipo_clicado
-    )
+    filtros = (anos_selecionados, ufs_selecionadas, tipo_clicado)
+    volume = consultar(*filtros, "volume_mensal")
     empty_fig = {"layout": {"template": TEMA_GRAFICOS, "title": {"text": "Sem dados para exibir"}}}
 
-    if df_filtrado.empty:
+    if volume.empty:
         return [empty_fig] * 7
 
-    #
-    fig_eda_volume = grafico_volume_tempo(df_filtrado.copy())
-    fig_eda_genero = grafico_genero(df_filtrado)
-    fig_eda_faixa = grafico_faixa_etaria(df_filtrado)
-    fig_eda_raca = grafico_raca(df_filtrado) 
-    fig_eda_tipos = grafico_tipos(df_filtrado)
-    fig_eda_satisfacao_box = grafico_satisfacao(df_filtrado.copy())
-    fig_eda_mapa = grafico_mapa(df_filtrado)
+    # Boxplot a partir das contagens por nota: quartis calculados no servidor
+    df_satisfacao = consultar(*filtros, "satisfacao_boxplot")
+    if not df_satisfacao.empty:
+        df_satisfacao = df_satisfacao[df_satisfacao["satisfacao_num"] != SATISFACAO_SEM_NOTA]
+
+    fig_eda_volume = grafico_volume_tempo(volume)
+    fig_eda_genero = grafico_genero(consultar(*filtros, "genero"))
+    fig_eda_faixa = grafico_faixa_etaria(consultar(*filtros, "faixa_etaria"))
+    fig_eda_raca = grafico_raca(consultar(*filtros, "raca_cor")) 
+    fig_eda_tipos = grafico_tipos(consultar(*filtros, "tipos_top"))
+    fig_eda_satisfacao_box = grafico_satisfacao(df_satisfacao)
+    fig_eda_mapa = grafico_mapa(consultar(*filtros, "ufs_top"))
 
     return (
         fig_eda_volume, fig_eda_genero, fig_eda_faixa,
@@ -662,6 +804,49 @@ def atualizar_eda(anos_selecionados, ufs_selecionadas, tipo_clicado):
     )
 
 
+# --- Callback 7.6b: Página da tabela /dados (filtro, ordenação e offset/limit no servidor) ---
+@app.callback(
+    [Output("tabela-dados", "data"), Output("tabela-dados", "page_count")],
+    [
+        Input("tabela-dados", "page_current"),
+        Input("tabela-dados", "page_size"),
+        Input("tabela-dados", "sort_by"),
+        Input("tabela-dados", "filter_query"),
+    ],
+)
+def atualizar_tabela_dados(pagina_atual, tamanho_pagina, ordenacao, filter_query):
+    try:
+        df_pagina, total = explorador_dados.pagina(pagina_atual or 0, tamanho_pagina, ordenacao, filter_query)
+    except Exception as e:
+        print(f"ERRO ao ler a página da tabela: {e}")
+        return [], 1
+    df_pagina = df_pagina.astype(object).where(pd.notna(df_pagina), None)
+    return df_pagina.to_dict("records"), max(1, -(-total // tamanho_pagina))
+
+
+# --- Callback 7.6c: Atualização dos dados/modelo em segundo plano (página /admin) ---
+# O progresso (prints do ETL/treino com os tempos) chega pelo set_progress; ao
+# terminar, o app já está nos dados novos (versao_dados do manifesto) e no modelo novo (recarga a quente)
+if gerenciador_tarefas is not None:
+    @app.callback(
+        Output("admin-resultado", "children"),
+        Input("botao-atualizar", "n_clicks"),
+        State("admin-etapas", "value"),
+        background=True,
+        running=[
+            (Output("botao-atualizar", "disabled"), True, False),
+            (Output("botao-cancelar", "disabled"), False, True),
+        ],
+        cancel=[Input("botao-cancelar", "n_clicks")],
+        progress=[Output("admin-resumo", "children"), Output("admin-log", "children")],
+        prevent_initial_call=True,
+    )
+    def executar_atualizacao(set_progress, n_clicks, etapas):
+        if not etapas:
+            return "Selecione ao menos uma etapa."
+        return atualizar_dados_e_modelo(etapas, lambda resumo, log: set_progress((resumo, log)))
+
+
 # --- NOVO: Callback 7.7: Previsão do Modelo de ML ---
 @app.callback(
     Output("resultado-predicao", "children"),
@@ -681,6 +866,8 @@ def callback_prever_satisfacao(
     n_clicks, assunto, orgao, tipo, genero, faixa, raca, uf
 ):
     # (Função que estava faltando - FAZ O BOTÃO FUNCIONAR)
+    # Referência local: uma troca de modelo no meio da predição não afeta esta chamada
+    modelo_carregado = modelo_satisfacao.obter()
     if modelo_carregado is None:
         return html.P("ERRO: O modelo de ML não está carregado.", style={"color": "red"})
 
@@ -0,0 +1,203 @@
+# atualizacao_dados.py
+import glob
+import io
+import os
+import shutil
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from dataset_ouvidoria import DIRETORIO_DATASET
+from etl import executar_etl
+
+# ============================================================
+# Atualização dos dados e do modelo (rodada pela página /admin do app)
+#   - o ETL roda numa pasta de preparação, sobre uma cópia do dataset feita
+#     com hardlinks (o ETL nunca regrava um arquivo no lugar: só cria novos
+#     e troca com os.replace), então o app continua servindo os dados atuais;
+#   - cada publicação é uma pasta 'ouvidoria_dataset.<data-hora>' com o
+#     dataset e os arquivos derivados (cubos, Arrow do painel, metadados);
+#     'ouvidoria_dataset' é um link para ela, trocado de uma vez com
+#     os.replace. O app confere a versão dos dados gravada em cada arquivo
+#     derivado contra a do manifesto, nunca as datas de modificação;
+#   - o modelo é treinado sobre o dataset já publicado e salvo de forma
+#     atômica (salvar_modelo); o app o recarrega a quente.
+# Roda no processo da tarefa em segundo plano: o os.chdir não afeta o servidor.
+# ============================================================
+PASTA_PREPARACAO = "_atualizacao"
+ARQUIVO_TRAVA = "atualizacao_em_andamento.lock"
+ETAPAS_ATUALIZACAO = {"etl": "ETL (CSV -> Parquet, cubos, Arrow, metadados)", "modelo": "Treino do modelo"}
+# Versões publicadas mantidas no disco: a atual e a anterior (leituras em
+# andamento presas à pasta antiga terminam antes de ela ser apagada)
+VERSOES_MANTIDAS = 2
+INTERVALO_PROGRESSO = 0.5  # Segundos mínimos entre dois envios de progresso para a interface
+LINHAS_LOG = 300           # Últimas linhas do log mostradas na interface
+
+
+class RegistroProgresso(io.TextIOBase):
+    """
+    Recebe os prints do ETL e do treino (redirect_stdout), marca cada linha
+    com o tempo decorrido e repassa o resumo das etapas e o log para
+    `ao_atualizar(resumo, log)`, no máximo a cada INTERVALO_PROGRESSO segundos.
+    """
+
+    def __init__(self, ao_atualizar, intervalo=INTERVALO_PROGRESSO):
+        self.ao_atualizar = ao_atualizar
+        self.intervalo = intervalo
+        self.inicio = time.time()
+        self.linhas = []
+        self.etapas = []  # [nome, início, fim, situação]
+        self._parcial = ""
+        self._ultimo_envio = 0.0
+
+    def write(self, texto):
+        self._parcial += texto
+        *completas, self._parcial = self._parcial.split("\n")
+        for linha in completas:
+            self.linhas.append(f"[{time.time() - self.inicio:7.1f} s] {linha}")
+        del self.linhas[:-LINHAS_LOG]
+        if completas and time.time() - self._ultimo_envio >= self.intervalo:
+            self.enviar()
+        return len(texto)
+
+    def iniciar_etapa(self, nome):
+        self.etapas.append([nome, time.time(), None, "em andamento"])
+        self.enviar()
+
+    def concluir_etapa(self, situacao):
+        self.etapas[-1][2:] = [time.time(), situacao]
+        self.enviar()
+
+    def resumo(self):
+        partes = []
+        for nome, inicio, fim, situacao in self.etapas:
+            duracao = (fim or time.time()) - inicio
+            partes.append(f"{ETAPAS_ATUALIZACAO.get(nome, nome)}: {situacao} ({duracao:.1f} s)")
+        return " | ".join(partes) or "Aguardando..."
+
+    def enviar(self):
+        self._ultimo_envio = time.time()
+        self.ao_atualizar(self.resumo(), "\n".join(self.linhas))
+
+
+def _adquirir_trava():
+    """Só uma atualização por vez (entre todos os workers). Trava de um processo morto é descartada."""
+    for _ in range(2):
+        try:
+            fd = os.open(ARQUIVO_TRAVA, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(ARQUIVO_TRAVA) as f:
+                    pid = int(f.read().strip() or 0)
+                os.kill(pid, 0)
+                return False
+            except (OSError, ValueError):
+                os.remove(ARQUIVO_TRAVA)
+                continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+def executar_etl_em_preparacao(pasta=PASTA_PREPARACAO):
+    """Roda o executar_etl() numa cópia (hardlinks) do dataset atual. Retorna True se terminou bem."""
+    if os.path.exists(pasta):
+        shutil.rmtree(pasta)
+    os.makedirs(pasta)
+    if os.path.exists(DIRETORIO_DATASET):
+        # Incremental como sempre: só os CSVs novos ou alterados são processados
+        shutil.copytree(DIRETORIO_DATASET, os.path.join(pasta, DIRETORIO_DATASET), copy_function=os.link)
+    os.symlink(os.path.abspath("src"), os.path.join(pasta, "src"))
+
+    origem = os.getcwd()
+    os.chdir(pasta)
+    try:
+        return bool(executar_etl())
+    finally:
+        os.chdir(origem)
+
+
+def versoes_publicadas():
+    """Pastas das versões publicadas pelo /admin, da mais antiga para a mais nova."""
+    return sorted(
+        caminho for caminho in glob.glob(f"{DIRETORIO_DATASET}.[0-9]*")
+        if os.path.isdir(caminho) and not os.path.islink(caminho)
+    )
+
+
+def publicar_preparacao(pasta=PASTA_PREPARACAO):
+    """
+    Publica o dataset da pasta de preparação (com os arquivos derivados
+    dentro dele) numa pasta de versão nova e aponta o link do dataset para
+    ela com um único os.replace: quem abrir o dataset vê a versão antiga ou
+    a nova inteira, nunca uma mistura nem um caminho faltando.
+
+    Exceção: na primeira publicação (ou na primeira depois de um
+    etl.py --completo) o dataset ainda é uma pasta comum, que o link não
+    substitui com os.replace. Ela é renomeada para a versão anterior logo
+    antes da troca, e nesse intervalo (duas chamadas ao sistema) o caminho
+    não existe: uma consulta que caia nele falha como um erro de leitura
+    qualquer. Para não correr esse risco, publique uma vez com o app parado.
+    """
+    # Mesmo carimbo para as duas pastas: nunca colidem e a anterior ordena antes
+    carimbo = f"{DIRETORIO_DATASET}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+    versao, anterior = f"{carimbo}-1", f"{carimbo}-0"
+    os.rename(os.path.join(pasta, DIRETORIO_DATASET), versao)
+
+    link_tmp = f"{DIRETORIO_DATASET}.link-tmp"
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(versao, link_tmp)
+    if os.path.isdir(DIRETORIO_DATASET) and not os.path.islink(DIRETORIO_DATASET):
+        os.rename(DIRETORIO_DATASET, anterior)
+    os.replace(link_tmp, DIRETORIO_DATASET)
+    print(f"Dataset '{DIRETORIO_DATASET}' publicado: agora aponta para '{versao}'.")
+
+    for antiga in versoes_publicadas()[:-VERSOES_MANTIDAS]:
+        shutil.rmtree(antiga, ignore_errors=True)
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+def treinar_modelo():
+    """Treina e salva o modelo (ml_classificacao). Retorna True se um modelo novo foi salvo."""
+    from ml_classificacao import MODELO_SALVO, treinar_e_salvar_modelo
+
+    inicio = time.time()
+    treinar_e_salvar_modelo()
+    return os.path.exists(MODELO_SALVO) and os.path.getmtime(MODELO_SALVO) >= inicio
+
+
+def atualizar_dados_e_modelo(etapas, ao_atualizar):
+    """
+    Roda as `etapas` pedidas ("etl", "modelo"), nessa ordem, mandando o
+    progresso para `ao_atualizar(resumo, log)`. Retorna a mensagem final.
+    """
+    registro = RegistroProgresso(ao_atualizar)
+    if not _adquirir_trava():
+        return "Já existe uma atualização em andamento."
+    try:
+        with redirect_stdout(registro):
+            for nome, executar in (("etl", executar_etl_em_preparacao), ("modelo", treinar_modelo)):
+                if nome not in etapas:
+                    continue
+                registro.iniciar_etapa(nome)
+                try:
+                    sucesso = executar()
+                    if sucesso and nome == "etl":
+                        publicar_preparacao()
+                except Exception as e:
+                    print(f"ERRO na etapa '{nome}': {e}")
+                    sucesso = False
+                registro.concluir_etapa("concluída" if sucesso else "falhou")
+                if not sucesso:
+                    if nome == "etl":
+                        # Sem dados novos publicados não faz sentido treinar em cima deles
+                        print("Atualização interrompida: os dados em uso não foram alterados.")
+                    else:
+                        print("O modelo em uso não foi alterado.")
+                    break
+    finally:
+        os.remove(ARQUIVO_TRAVA)
+    registro.enviar()
+    return f"Atualização finalizada. {registro.resumo()}"
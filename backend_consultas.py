@@ -0,0 +1,485 @@
+# backend_consultas.py
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from dataset_ouvidoria import DIRETORIO_DATASET, abrir_dataset, ler_dataset, versao_dataset
+from etl import (
+    ARQUIVO_ARROW_PAINEL,
+    ARQUIVO_CUBO,
+    ARQUIVO_CUBO_DEMOGRAFICO,
+    DIMENSOES_CUBO,
+    DIMENSOES_CUBO_DEMOGRAFICO,
+    MEDIDAS_CUBO,
+    agregar_cubo,
+)
+
+try:
+    import duckdb
+except ImportError:  # O backend DuckDB é opcional
+    duckdb = None
+
+# ============================================================
+# Backends de consulta do dashboard
+# Os callbacks descrevem O QUE querem (Consulta: filtros, dimensões, medidas,
+# top-N) e o backend decide COMO responder:
+#   pyarrow -> cubos pré-agregados do ETL em memória; sem cubo que sirva,
+#              agrega o Arrow do painel (memory_map, sem cópia) ou, sem ele,
+#              lê o Parquet (pyarrow, filtros na leitura) e agrega no pandas
+#   duckdb  -> agrega direto sobre os arquivos do dataset com o DuckDB
+#              (várias threads); precisa do pacote duckdb
+# ============================================================
+BACKENDS = ['pyarrow', 'duckdb']
+CUBOS = [(ARQUIVO_CUBO, DIMENSOES_CUBO), (ARQUIVO_CUBO_DEMOGRAFICO, DIMENSOES_CUBO_DEMOGRAFICO)]
+
+# Medidas (MEDIDAS_CUBO) em SQL, com a mesma semântica do agregar_cubo()
+MEDIDAS_SQL = {
+    'total': 'COUNT(*)',
+    'soma_dias_atraso': 'SUM(COALESCE(CAST("dias_de_atraso" AS DOUBLE), 0))',
+}
+
+
+class Consulta:
+    """
+    Pedido declarativo ao backend: `filtros` {coluna: valores aceitos},
+    `dimensoes` do agrupamento, `medidas` (MEDIDAS_CUBO) e, opcionalmente,
+    só as `top_n` linhas com a maior primeira medida.
+    """
+
+    def __init__(self, filtros=None, dimensoes=(), medidas=('total',), top_n=None):
+        # Valores ordenados e sem repetição: a mesma consulta gera sempre a mesma chave
+        self.filtros = {col: tuple(sorted(set(valores))) for col, valores in sorted((filtros or {}).items())}
+        self.dimensoes = tuple(dimensoes)
+        self.medidas = tuple(medidas)
+        self.top_n = top_n
+        medidas_invalidas = set(self.medidas) - set(MEDIDAS_CUBO)
+        if medidas_invalidas:
+            raise ValueError(f"Medidas desconhecidas: {sorted(medidas_invalidas)}")
+
+    def chave(self):
+        return (tuple(self.filtros.items()), self.dimensoes, self.medidas, self.top_n)
+
+    def vazia(self):
+        """Um filtro sem nenhum valor aceito não deixa passar nenhuma linha."""
+        return any(len(valores) == 0 for valores in self.filtros.values())
+
+    def colunas(self):
+        return set(self.dimensoes) | set(self.filtros)
+
+    def __repr__(self):
+        return f"Consulta(filtros={self.filtros}, dimensoes={self.dimensoes}, medidas={self.medidas}, top_n={self.top_n})"
+
+
+# Consultas dos callbacks do app.py: nome -> (dimensões, top_n). O app só
+# consulta por estes nomes, e a comparação entre backends (e os testes)
+# cobrem exatamente estas consultas
+CONSULTAS_PAINEL = {
+    'kpis': (["em_atraso", "satisfacao_num"], None),
+    'volume_mensal': (["ano_registro", "mes"], None),
+    'tipos': (["tipo_manifestacao"], None),
+    'tipos_top': (["tipo_manifestacao"], 10),
+    'orgaos_top': (["nome_orgao"], 20),
+    'satisfacao_atraso': (["satisfacao", "em_atraso"], None),
+    'satisfacao_boxplot': (["em_atraso", "satisfacao_num", "satisfacao"], None),
+    'ufs_top': (["uf_do_municipio_manifestante"], 30),
+    'genero': (["genero"], None),
+    'faixa_etaria': (["faixa_etaria"], None),
+    'raca_cor': (["raca_cor"], None),
+}
+
+
+def consulta_do_painel(filtros, nome):
+    """A consulta `nome` de CONSULTAS_PAINEL com os `filtros` dados."""
+    dimensoes, top_n = CONSULTAS_PAINEL[nome]
+    return Consulta(filtros, dimensoes, top_n=top_n)
+
+
+def filtros_do_painel(anos, ufs, tipo_clicado=None):
+    """Filtros globais do dashboard (ano, UF e o tipo clicado no gráfico) no formato da Consulta."""
+    filtros = {"ano_registro": anos or [], "uf_do_municipio_manifestante": ufs or []}
+    if tipo_clicado:
+        filtros["tipo_manifestacao"] = [tipo_clicado]
+    return filtros
+
+
+def ordenar_resultado(df, consulta):
+    """
+    Ordem comum aos backends: primeira medida decrescente, empates pelo
+    texto das dimensões; linhas com medida zero saem; aplica o top_n.
+    """
+    if df.empty:
+        return df.reset_index(drop=True)
+    medida = consulta.medidas[0]
+    df = df[df[medida] > 0]
+    ordem = [medida] + list(consulta.dimensoes)
+    df = df.sort_values(
+        ordem, ascending=[False] + [True] * len(consulta.dimensoes), kind='stable',
+        key=lambda s: s.astype(str) if s.dtype.name in ('category', 'object') else s,
+    )
+    if consulta.top_n is not None:
+        df = df.head(consulta.top_n)
+    return df.reset_index(drop=True)
+
+
+def resultado_vazio(consulta):
+    return pd.DataFrame(columns=list(consulta.dimensoes) + list(consulta.medidas))
+
+
+def _assinatura_arquivo(caminho):
+    # Os arquivos do ETL são sempre trocados com os.replace: mesmo inode e mtime = mesmo conteúdo
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return (info.st_ino, info.st_mtime_ns)
+
+
+def _versao_gravada(esquema):
+    """Versão dos dados gravada pelo ETL nos metadados de um cubo ou do Arrow do painel."""
+    versao = (esquema.metadata or {}).get(b'versao_dados')
+    return versao.decode() if versao is not None else None
+
+
+class BackendPyArrow:
+    """
+    Responde pelos cubos do ETL (mantidos em memória até o arquivo mudar).
+    Se nenhum cubo tiver todas as colunas da consulta, ou se o cubo for de
+    outra versão dos dados que o dataset, agrega o Arrow do painel mapeado em memória
+    e, se ele também não servir, lê só as colunas necessárias do dataset.
+    """
+    nome = 'pyarrow'
+
+    def __init__(self, caminho=DIRETORIO_DATASET, cubos=CUBOS, usar_cubos=True,
+                 arquivo_arrow=ARQUIVO_ARROW_PAINEL, usar_arrow=True):
+        self.caminho = caminho
+        self.cubos = cubos if usar_cubos else []
+        self.arquivo_arrow = arquivo_arrow if usar_arrow else None
+        self._cubos_em_memoria = {}
+        self._tabela_mapeada = None  # (assinatura, versão, tabela, {(ano, uf): (início, fim)})
+        self._lock = threading.Lock()
+
+    def aquecer(self):
+        """Mapeia o Arrow do painel e carrega os cubos (chamado na inicialização do app)."""
+        self.carregar_tabela_mapeada()
+        for arquivo_cubo, _ in self.cubos:
+            self.carregar_cubo(arquivo_cubo)
+
+    def carregar_cubo(self, arquivo_cubo):
+        """
+        Carrega um cubo do etl.py e o mantém em memória até o arquivo mudar.
+        Retorna None se o cubo não existir ou for de outra versão dos dados.
+        """
+        assinatura = _assinatura_arquivo(arquivo_cubo)
+        if assinatura is None:
+            return None
+
+        with self._lock:
+            em_memoria = self._cubos_em_memoria.get(arquivo_cubo)
+        if em_memoria is None or em_memoria[0] != assinatura:
+            try:
+                tabela = pq.read_table(arquivo_cubo)
+                cubo = tabela.to_pandas()
+            except Exception as e:
+                print(f"ERRO ao carregar o cubo '{arquivo_cubo}': {e}")
+                return None
+            # Dimensões de texto como 'category': filtros e groupby viram operações sobre códigos inteiros
+            for col in cubo.columns:
+                if cubo[col].dtype == object:
+                    cubo[col] = cubo[col].astype("category")
+            em_memoria = (assinatura, _versao_gravada(tabela.schema), cubo)
+            with self._lock:
+                self._cubos_em_memoria[arquivo_cubo] = em_memoria
+            print(f"Cubo '{arquivo_cubo}' carregado: {len(cubo)} linhas.")
+
+        if em_memoria[1] != versao_dataset(self.caminho):
+            return None
+        return em_memoria[2]
+
+    def carregar_tabela_mapeada(self):
+        """
+        Abre o Arrow do painel com memory_map: nada é lido nem copiado para a
+        memória do processo, as páginas vêm do page cache (compartilhadas por
+        todos os workers). Retorna (tabela, {(ano, uf): (início, fim)}), ou
+        None se não existir ou for de outra versão dos dados.
+        """
+        if self.arquivo_arrow is None:
+            return None
+        assinatura = _assinatura_arquivo(self.arquivo_arrow)
+        if assinatura is None:
+            return None
+
+        with self._lock:
+            em_memoria = self._tabela_mapeada
+        if em_memoria is None or em_memoria[0] != assinatura:
+            try:
+                tabela = pa.ipc.open_file(pa.memory_map(self.arquivo_arrow, 'r')).read_all()
+                particoes = {
+                    (ano, uf): (inicio, fim)
+                    for ano, uf, inicio, fim in json.loads(tabela.schema.metadata[b'particoes'])
+                }
+            except Exception as e:
+                print(f"ERRO ao mapear o Arrow do painel '{self.arquivo_arrow}': {e}")
+                return None
+            em_memoria = (assinatura, _versao_gravada(tabela.schema), tabela, particoes)
+            with self._lock:
+                self._tabela_mapeada = em_memoria
+            print(f"Arrow do painel '{self.arquivo_arrow}' mapeado: {tabela.num_rows} linhas.")
+
+        if em_memoria[1] != versao_dataset(self.caminho):
+            return None
+        return em_memoria[2:]
+
+    def _agregar_tabela_mapeada(self, tabela, particoes, consulta):
+        """
+        Agrega a tabela mapeada: ano/UF viram slices (sem cópia) dos intervalos
+        das partições; os demais filtros viram um `take` só das colunas usadas.
+        """
+        filtro_anos = consulta.filtros.get('ano_registro')
+        filtro_ufs = consulta.filtros.get('uf_do_municipio_manifestante')
+        partes = [
+            tabela.slice(inicio, fim - inicio)
+            for (ano, uf), (inicio, fim) in sorted(particoes.items(), key=lambda item: item[1])
+            if (filtro_anos is None or ano in filtro_anos) and (filtro_ufs is None or uf in filtro_ufs)
+        ]
+        demais_filtros = {
+            col: valores for col, valores in consulta.filtros.items()
+            if col not in ('ano_registro', 'uf_do_municipio_manifestante')
+        }
+        colunas = sorted(set(consulta.dimensoes) | set(demais_filtros) | {'dias_de_atraso'})
+        base = pa.concat_tables(partes).select(colunas) if partes else tabela.slice(0, 0).select(colunas)
+
+        if demais_filtros:
+            mascara = None
+            for col, valores in demais_filtros.items():
+                tipo = base.schema.field(col).type
+                if pa.types.is_dictionary(tipo):
+                    tipo = tipo.value_type  # is_in compara com os valores, não com os códigos
+                condicao = pc.is_in(base.column(col), value_set=pa.array(valores, type=tipo))
+                mascara = condicao if mascara is None else pc.and_(mascara, condicao)
+            base = base.take(pc.indices_nonzero(mascara))
+
+        base = base.set_column(
+            colunas.index('dias_de_atraso'), 'dias_de_atraso', pc.fill_null(base.column('dias_de_atraso'), 0.0)
+        )
+        if consulta.dimensoes:
+            agregado = base.group_by(list(consulta.dimensoes)).aggregate([('dias_de_atraso', 'sum'), ([], 'count_all')])
+            resultado = agregado.to_pandas()
+        else:
+            resultado = pd.DataFrame({
+                'dias_de_atraso_sum': [pc.sum(base.column('dias_de_atraso')).as_py() or 0.0],
+                'count_all': [base.num_rows],
+            })
+        resultado = resultado.rename(columns={'dias_de_atraso_sum': 'soma_dias_atraso', 'count_all': 'total'})
+        return resultado[list(consulta.dimensoes) + MEDIDAS_CUBO]
+
+    def _base_agregada(self, consulta):
+        """Linhas pré-agregadas (cubo filtrado, ou Parquet agregado) que respondem à consulta."""
+        colunas = consulta.colunas()
+        for arquivo_cubo, dimensoes in self.cubos:
+            if colunas <= set(dimensoes):
+                cubo = self.carregar_cubo(arquivo_cubo)
+                if cubo is None:
+                    continue
+                mascara = pd.Series(True, index=cubo.index)
+                for col, valores in consulta.filtros.items():
+                    mascara &= cubo[col].isin(valores)
+                return cubo[mascara]
+
+        mapeada = self.carregar_tabela_mapeada()
+        if mapeada is not None and colunas <= set(mapeada[0].column_names):
+            return self._agregar_tabela_mapeada(mapeada[0], mapeada[1], consulta)
+
+        print(f"Nenhum cubo responde a {consulta}. Agregando a partir do Parquet bruto...")
+        # Filtros na leitura: partições (ano/UF) fora do filtro nem são abertas
+        filtros_parquet = [(col, "in", list(valores)) for col, valores in consulta.filtros.items()]
+        df = ler_dataset(colunas=sorted(colunas | {"dias_de_atraso"}), filtros=filtros_parquet or None, caminho=self.caminho)
+        if df.empty:
+            return df
+        if not colunas:
+            # Sem dimensões (total geral): agregar_cubo precisa de ao menos uma coluna de agrupamento
+            df = df.assign(_todas="todas")
+            return agregar_cubo(df, ["_todas"])
+        return agregar_cubo(df, sorted(colunas))
+
+    def consultar(self, consulta):
+        if consulta.vazia():
+            return resultado_vazio(consulta)
+        base = self._base_agregada(consulta)
+        if base.empty:
+            return resultado_vazio(consulta)
+        medidas = list(consulta.medidas)
+        if consulta.dimensoes:
+            resultado = base.groupby(list(consulta.dimensoes), observed=True)[medidas].sum().reset_index()
+        else:
+            resultado = base[medidas].sum().to_frame().T
+        return ordenar_resultado(resultado, consulta)
+
+
+class BackendDuckDB:
+    """
+    Agrega com o DuckDB direto sobre os arquivos do dataset, sem materializar
+    as linhas no pandas. O dataset é registrado a partir do pyarrow.dataset
+    (mesma descoberta de arquivos e mesmas partições do backend pyarrow); o
+    DuckDB empurra projeção e filtros para a leitura e agrega em paralelo.
+    Uma conexão por thread (os callbacks do Dash rodam em threads).
+    """
+    nome = 'duckdb'
+
+    def __init__(self, caminho=DIRETORIO_DATASET, threads=None):
+        if duckdb is None:
+            raise ImportError("O backend 'duckdb' precisa do pacote duckdb (pip install duckdb).")
+        self.caminho = caminho
+        self.threads = threads or os.cpu_count() or 1
+        self._local = threading.local()
+
+    def _conexao(self):
+        # Um novo ETL (ou uma nova pasta publicada pelo /admin) muda a versão: registra de novo
+        pasta = os.path.realpath(self.caminho)
+        versao = (pasta, versao_dataset(pasta))
+        if getattr(self._local, 'versao', None) != versao:
+            dataset = abrir_dataset(pasta)
+            con = duckdb.connect()
+            con.execute(f"SET threads = {int(self.threads)}")
+            con.register("ouvidoria", dataset)
+            self._local.con, self._local.versao, self._local.esquema = con, versao, dataset.schema
+        return self._local.con, self._local.esquema
+
+    def aquecer(self):
+        self._conexao()
+
+    def consultar(self, consulta):
+        if consulta.vazia():
+            return resultado_vazio(consulta)
+        con, esquema = self._conexao()
+
+        def coluna_sql(col):
+            # Colunas dictionary do Arrow voltam como texto (e ordenam pelo texto, não pelo código)
+            if str(esquema.field(col).type).startswith("dictionary"):
+                return f'CAST("{col}" AS VARCHAR)'
+            return f'"{col}"'
+
+        selecao = [f'{coluna_sql(d)} AS "{d}"' for d in consulta.dimensoes]
+        selecao += [f'{MEDIDAS_SQL[m]} AS "{m}"' for m in consulta.medidas]
+        sql = f"SELECT {', '.join(selecao)} FROM ouvidoria"
+
+        condicoes, parametros = [], []
+        for col, valores in consulta.filtros.items():
+            # Sem CAST no filtro: assim ele é empurrado para a leitura (poda de partições/row groups)
+            condicoes.append(f'"{col}" IN ({", ".join("?" * len(valores))})')
+            parametros.extend(valores)
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        if consulta.dimensoes:
+            sql += " GROUP BY " + ", ".join(coluna_sql(d) for d in consulta.dimensoes)
+            ordem = [f'"{consulta.medidas[0]}" DESC'] + [f'"{d}"' for d in consulta.dimensoes]
+            sql += " ORDER BY " + ", ".join(ordem)
+            if consulta.top_n is not None:
+                sql += f" LIMIT {int(consulta.top_n)}"
+
+        resultado = con.execute(sql, parametros).df()
+        return ordenar_resultado(resultado, consulta)
+
+
+def criar_backend(nome='pyarrow', caminho=DIRETORIO_DATASET):
+    if nome == 'pyarrow':
+        return BackendPyArrow(caminho)
+    if nome == 'duckdb':
+        return BackendDuckDB(caminho)
+    raise ValueError(f"Backend desconhecido: '{nome}' (opções: {BACKENDS})")
+
+
+# --- Verificação: todos os backends devolvem o mesmo resultado ---
+def consultas_do_dashboard(anos, ufs, tipo_clicado=None):
+    """
+    As consultas que os callbacks do app fazem para um filtro (de
+    CONSULTAS_PAINEL), mais duas que exercitam caminhos sem cubo.
+    """
+    filtros = filtros_do_painel(anos, ufs, tipo_clicado)
+    return [consulta_do_painel(filtros, nome) for nome in CONSULTAS_PAINEL] + [
+        Consulta(filtros, ["nome_orgao", "genero"], medidas=("total", "soma_dias_atraso"), top_n=15),  # Sem cubo
+        Consulta(filtros, [], medidas=("total", "soma_dias_atraso")),
+    ]
+
+
+def normalizar_resultado(df):
+    # Tipos diferem entre backends (category x texto, int8 x int64): compara os valores
+    df = df.copy()
+    for col in df.columns:
+        if col in MEDIDAS_CUBO:
+            df[col] = df[col].astype(float)
+        elif df[col].dtype.name in ("category", "object"):
+            df[col] = df[col].astype(str)
+        elif df[col].dtype.kind in "iub":
+            df[col] = df[col].astype("int64")
+    return df.reset_index(drop=True)
+
+
+def cenarios_de_comparacao(caminho=DIRETORIO_DATASET):
+    """Filtros (anos, UFs, tipo clicado) da comparação: tudo, recortes, tipo clicado e um filtro vazio."""
+    opcoes = ler_dataset(colunas=["ano_registro", "uf_do_municipio_manifestante", "tipo_manifestacao"], caminho=caminho)
+    anos = sorted(opcoes["ano_registro"].unique().tolist())
+    ufs = sorted(opcoes["uf_do_municipio_manifestante"].unique().tolist())
+    tipo = opcoes["tipo_manifestacao"].value_counts().index[0]
+    return [
+        (anos, ufs, None), (anos[-1:], ufs, None), (anos, ufs[:2], tipo),
+        (anos[:1], ufs[-1:], None), ([], ufs, None),
+    ]
+
+
+def comparar_backends(caminho=DIRETORIO_DATASET):
+    """
+    Roda as consultas do dashboard (vários filtros) em todos os backends
+    disponíveis e confere que os resultados são iguais. O backend pyarrow
+    é comparado também sem os cubos (agregando o Arrow mapeado e o Parquet bruto).
+    """
+    backends = [
+        ('pyarrow', BackendPyArrow(caminho)),
+        ('pyarrow arrow mapeado', BackendPyArrow(caminho, usar_cubos=False)),
+        ('pyarrow parquet', BackendPyArrow(caminho, usar_cubos=False, usar_arrow=False)),
+    ]
+    if duckdb is not None:
+        backends.append(('duckdb', BackendDuckDB(caminho)))
+    else:
+        print("AVISO: pacote duckdb não instalado; o backend 'duckdb' fica fora da comparação.")
+
+    cenarios = cenarios_de_comparacao(caminho)
+    tempos = {nome: 0.0 for nome, _ in backends}
+    divergencias = 0
+    for anos_c, ufs_c, tipo_c in cenarios:
+        for consulta in consultas_do_dashboard(anos_c, ufs_c, tipo_c):
+            resultados = {}
+            for nome, backend in backends:
+                inicio = time.time()
+                resultados[nome] = normalizar_resultado(backend.consultar(consulta))
+                tempos[nome] += time.time() - inicio
+            referencia_nome, referencia = backends[0][0], resultados[backends[0][0]]
+            for nome, resultado in resultados.items():
+                try:
+                    pd.testing.assert_frame_equal(resultado, referencia, check_dtype=False, check_index_type=False, rtol=1e-9)
+                except AssertionError as e:
+                    divergencias += 1
+                    print(f"DIVERGÊNCIA {nome} x {referencia_nome} em {consulta}:\n{e}")
+
+    print(f"\n{len(cenarios) * len(consultas_do_dashboard([], []))} consultas x {len(backends)} backends: "
+          f"{'todos iguais' if divergencias == 0 else f'{divergencias} divergências'}.")
+    for nome, segundos in tempos.items():
+        print(f"  {nome:<20} {segundos:8.3f} s")
+    return divergencias == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backends de consulta do dashboard.")
+    parser.add_argument("--comparar", action="store_true",
+                        help="Confere que todos os backends disponíveis devolvem os mesmos resultados.")
+    args = parser.parse_args()
+    if args.comparar:
+        raise SystemExit(0 if comparar_backends() else 1)
+    else:
+        parser.print_help()
@@ -0,0 +1,292 @@
+# cache_consultas.py
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+# ============================================================
+# Cache LRU (limitado por bytes) para leituras filtradas do Parquet
+# ============================================================
+class CacheLRUDados:
+    """
+    Cache LRU em memória para DataFrames, limitado pelo total de bytes.
+
+    Leituras concorrentes da mesma chave são compartilhadas: a primeira
+    thread lê o Parquet e as demais esperam pelo mesmo resultado. Os frames
+    devolvidos são cópias rasas; com `mode.copy_on_write` ativo (app.py),
+    alterações feitas pelos callbacks nunca chegam ao frame em cache.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.bytes_em_uso = 0
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()  # chave -> (df, bytes)
+        self._em_leitura = {}        # chave -> _LeituraEmAndamento
+        self._lock = threading.Lock()
+
+    def obter_ou_carregar(self, chave, carregar):
+        """Retorna o DataFrame da `chave`, chamando `carregar()` só em caso de falha (miss)."""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[0].copy(deep=False)
+
+            leitura = self._em_leitura.get(chave)
+            dono_da_leitura = leitura is None
+            if dono_da_leitura:
+                leitura = _LeituraEmAndamento()
+                self._em_leitura[chave] = leitura
+                self.falhas += 1
+            else:
+                self.acertos += 1
+
+        if not dono_da_leitura:
+            leitura.pronta.wait()
+            if leitura.resultado is None:
+                # A leitura compartilhada falhou: tenta de novo por conta própria
+                return self.obter_ou_carregar(chave, carregar)
+            return leitura.resultado.copy(deep=False)
+
+        df = None
+        try:
+            df = carregar()
+        finally:
+            with self._lock:
+                if df is not None:
+                    self._guardar(chave, df)
+                leitura.resultado = df
+                del self._em_leitura[chave]
+            leitura.pronta.set()
+
+        return df.copy(deep=False)
+
+    def _guardar(self, chave, df):
+        # (Chamado com o lock adquirido)
+        tamanho = int(df.memory_usage(index=True, deep=True).sum())
+        if tamanho > self.limite_bytes:
+            return  # Maior que o cache inteiro: não vale a pena guardar
+
+        self._itens[chave] = (df, tamanho)
+        self.bytes_em_uso += tamanho
+        while self.bytes_em_uso > self.limite_bytes:
+            _, (_, tamanho_removido) = self._itens.popitem(last=False)
+            self.bytes_em_uso -= tamanho_removido
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes_em_uso = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "itens": len(self._itens),
+                "bytes_em_uso": self.bytes_em_uso,
+                "limite_bytes": self.limite_bytes,
+            }
+
+
+class _LeituraEmAndamento:
+    """Leitura de uma chave em andamento; as outras threads esperam em `pronta`."""
+
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resultado = None
+
+
+def chave_filtros(anos, ufs, tipo_clicado):
+    """Normaliza os filtros em uma chave de cache (anos e UFs ordenados, sem repetição)."""
+    return (
+        tuple(sorted(set(anos or ()))),
+        tuple(sorted(set(ufs or ()))),
+        tipo_clicado or None,
+    )
+
+
+def assinatura_arquivos(caminhos):
+    """Versão de um conjunto de arquivos/pastas: mtime_ns e tamanho de cada um ('-' se não existir)."""
+    partes = []
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            partes.append(f"{info.st_mtime_ns}:{info.st_size}")
+        except OSError:
+            partes.append("-")
+    return "|".join(partes)
+
+
+# ============================================================
+# Cache em disco (SQLite) das saídas dos callbacks, compartilhado entre workers
+# ============================================================
+# Um acerto só regrava o horário de acesso se o anterior tiver mais que isso
+# (segundos): leituras repetidas não viram uma escrita no SQLite cada uma
+INTERVALO_ATUALIZACAO_ACESSO = 60
+
+
+class CacheFigurasDisco:
+    """
+    Guarda as saídas serializadas (JSON + zlib) dos callbacks num arquivo
+    SQLite: o que um worker do gunicorn calculou serve a todos os outros.
+
+    Cada entrada leva a versão dos dados (`versao()`, lida ANTES do cálculo):
+    só entradas da versão atual são servidas, e ao gravar a primeira entrada
+    de uma versão nova as das versões antigas são apagadas. O total de bytes
+    é limitado, removendo primeiro as entradas acessadas há mais tempo (o
+    horário de acesso tem a precisão de `intervalo_acesso` segundos).
+    """
+
+    def __init__(self, caminho, limite_bytes, versao, intervalo_acesso=INTERVALO_ATUALIZACAO_ACESSO):
+        self.caminho = caminho
+        self.limite_bytes = limite_bytes
+        self.versao = versao
+        self.intervalo_acesso = intervalo_acesso
+        self.acertos = 0
+        self.falhas = 0
+        self._local = threading.local()
+        self._versao_gravada = None
+        self._lock = threading.Lock()
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (os workers do gunicorn são forks)
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS figuras ("
+                "chave TEXT PRIMARY KEY, versao TEXT NOT NULL, valor BLOB NOT NULL, "
+                "bytes INTEGER NOT NULL, acesso REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS figuras_acesso ON figuras (acesso)")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    @staticmethod
+    def chave(id_callback, entradas):
+        texto = json.dumps([id_callback, entradas], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def obter(self, chave, versao):
+        """Saída guardada para `chave` na `versao` atual, ou None."""
+        con = self._conexao()
+        linha = con.execute(
+            "SELECT valor, acesso FROM figuras WHERE chave = ? AND versao = ?", (chave, versao)
+        ).fetchone()
+        if linha is None:
+            return None
+        agora = time.time()
+        if agora - linha[1] > self.intervalo_acesso:
+            # A condição no WHERE evita que vários workers regravem a mesma entrada
+            con.execute(
+                "UPDATE figuras SET acesso = ? WHERE chave = ? AND acesso < ?",
+                (agora, chave, agora - self.intervalo_acesso),
+            )
+        return json.loads(zlib.decompress(linha[0]))
+
+    def guardar(self, chave, versao, saida):
+        try:
+            valor = zlib.compress(json.dumps(saida, cls=PlotlyJSONEncoder).encode("utf-8"), 1)
+        except TypeError:
+            return  # Saída não serializável (ex: no_update): não vai para o cache
+        if len(valor) > self.limite_bytes:
+            return
+
+        if versao != self.versao():
+            return  # Os dados mudaram durante o cálculo: a saída já nasceu velha
+
+        con = self._conexao()
+        with self._lock:
+            versao_nova = self._versao_gravada != versao
+            self._versao_gravada = versao
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if versao_nova:
+                # Um novo ETL invalida tudo o que foi calculado com os dados antigos
+                con.execute("DELETE FROM figuras WHERE versao != ?", (versao,))
+            con.execute(
+                "INSERT OR REPLACE INTO figuras (chave, versao, valor, bytes, acesso) VALUES (?, ?, ?, ?, ?)",
+                (chave, versao, valor, len(valor), time.time()),
+            )
+            # Remove as menos acessadas até o total caber no limite
+            con.execute(
+                "DELETE FROM figuras WHERE chave IN ("
+                " SELECT chave FROM (SELECT chave, SUM(bytes) OVER (ORDER BY acesso DESC) AS acumulado FROM figuras)"
+                " WHERE acumulado > ?)",
+                (self.limite_bytes,),
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def memorizar(self, id_callback, normalizar=None):
+        """
+        Decorador para callbacks: a chave é `id_callback` + as entradas
+        (passadas por `normalizar(*args)`, se dado) + a versão dos dados.
+        Erros do cache nunca derrubam o callback: ele só é calculado de novo.
+        Saídas de uma chamada que pediu nao_memorizar() não são guardadas.
+        """
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def envolvida(*args):
+                try:
+                    entradas = normalizar(*args) if normalizar else args
+                    versao = self.versao()
+                    chave = self.chave(id_callback, entradas)
+                    saida = self.obter(chave, versao)
+                except Exception as e:
+                    print(f"ERRO ao ler o cache de figuras: {e}")
+                    return funcao(*args)
+                if saida is not None:
+                    self.acertos += 1
+                    return saida
+
+                self.falhas += 1
+                self._local.nao_memorizar = False
+                saida = funcao(*args)
+                if self._local.nao_memorizar:
+                    return saida
+                try:
+                    self.guardar(chave, versao, saida)
+                except Exception as e:
+                    print(f"ERRO ao gravar no cache de figuras: {e}")
+                return saida
+            return envolvida
+        return decorador
+
+    def nao_memorizar(self):
+        """
+        Chamado de dentro de um callback memorizado (mesma thread): a saída
+        desta chamada não vai para o cache. Para saídas montadas a partir de
+        uma consulta que falhou, que não podem ser servidas a todos os workers
+        até o próximo ETL.
+        """
+        self._local.nao_memorizar = True
+
+    def limpar(self):
+        self._conexao().execute("DELETE FROM figuras")
+
+    def estatisticas(self):
+        itens, bytes_em_uso = self._conexao().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM figuras").fetchone()
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "itens": itens,
+            "bytes_em_uso": bytes_em_uso,
+            "limite_bytes": self.limite_bytes,
+        }
@@ -0,0 +1,126 @@
+# dataset_ouvidoria.py
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ============================================================
+# Dataset Parquet particionado (estilo Hive) gerado pelo etl.py
+#   ouvidoria_dataset/ano_registro=2024/uf_do_municipio_manifestante=sp/*.parquet
+# ============================================================
+DIRETORIO_DATASET = "ouvidoria_dataset"
+COLUNAS_PARTICAO = ["ano_registro", "uf_do_municipio_manifestante"]
+
+# Tipos fixos das partições (sem isso o pyarrow infere int32). A UF é lida
+# como dictionary -> 'category', igual às demais colunas categóricas do ETL
+ESQUEMA_PARTICAO = pa.schema([
+    ("ano_registro", pa.int64()),
+    ("uf_do_municipio_manifestante", pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Colunas categóricas gravadas como string simples: o pyarrow só usa as
+# estatísticas min/max dos row groups para podar colunas não-dictionary.
+# ler_dataset() as devolve como 'category', igual às demais.
+COLUNAS_STRING_NO_DISCO = ["tipo_manifestacao"]
+
+# Manifesto do ETL, dentro do dataset (prefixo '_': ignorado pelo pyarrow).
+# Guarda a versão dos dados, trocada a cada execução do ETL que altera o
+# dataset; os arquivos derivados (cubos, Arrow do painel, metadados) gravam
+# a versão de que foram gerados e só valem enquanto ela for a atual
+NOME_MANIFESTO = "_manifesto.json"
+_versoes_lidas = {}  # caminho do manifesto -> (stat, versão)
+
+
+def versao_dataset(caminho=DIRETORIO_DATASET):
+    """Versão dos dados do dataset em `caminho` (None se não houver manifesto)."""
+    arquivo = os.path.join(caminho, NOME_MANIFESTO)
+    try:
+        info = os.stat(arquivo)
+    except OSError:
+        return None
+    # O manifesto é sempre trocado com os.replace: mesmo stat = mesmo conteúdo
+    assinatura = (info.st_ino, info.st_mtime_ns, info.st_size)
+    lida = _versoes_lidas.get(arquivo)
+    if lida is not None and lida[0] == assinatura:
+        return lida[1]
+    try:
+        with open(arquivo, encoding="utf-8") as f:
+            versao = json.load(f).get("versao_dados")
+    except (OSError, ValueError):
+        return None
+    _versoes_lidas[arquivo] = (assinatura, versao)
+    return versao
+
+
+def abrir_dataset(caminho=DIRETORIO_DATASET):
+    """
+    Abre o dataset particionado (não lê nenhum dado ainda). Se `caminho` for
+    o link da versão publicada, o dataset fica preso à pasta da versão atual.
+    """
+    return ds.dataset(
+        os.path.realpath(caminho),
+        format="parquet",
+        # dictionaries="infer": os valores da UF vêm dos nomes das pastas
+        partitioning=ds.partitioning(ESQUEMA_PARTICAO, flavor="hive", dictionaries="infer"),
+    )
+
+
+def ler_dataset(colunas=None, filtros=None, caminho=DIRETORIO_DATASET):
+    """
+    Lê o dataset como DataFrame. `filtros` usa o mesmo formato do
+    pd.read_parquet ([("coluna", "in", valores), ...]); filtros sobre as
+    colunas de partição descartam pastas inteiras sem abrir os arquivos.
+    """
+    dataset = abrir_dataset(caminho)
+    filtro = pq.filters_to_expression(filtros) if filtros else None
+    tabela = dataset.to_table(columns=colunas, filter=filtro)
+    return _como_categoricas(tabela).to_pandas()
+
+
+def iterar_lotes(colunas=None, filtros=None, tamanho_lote=64 * 1024, caminho=DIRETORIO_DATASET):
+    """
+    Gera o dataset em DataFrames de até `tamanho_lote` linhas, lendo só
+    `colunas` e aplicando `filtros` na leitura (mesmo formato do ler_dataset).
+    A memória usada não depende do tamanho do dataset.
+    """
+    dataset = abrir_dataset(caminho)
+    filtro = pq.filters_to_expression(filtros) if filtros else None
+    for lote in dataset.to_batches(columns=colunas, filter=filtro, batch_size=tamanho_lote):
+        if lote.num_rows:
+            yield _como_categoricas(pa.Table.from_batches([lote])).to_pandas()
+
+
+def _como_categoricas(tabela):
+    # Colunas gravadas como string (COLUNAS_STRING_NO_DISCO) voltam como 'category'
+    for col in COLUNAS_STRING_NO_DISCO:
+        if col in tabela.column_names:
+            i = tabela.column_names.index(col)
+            tabela = tabela.set_column(i, col, tabela.column(col).dictionary_encode())
+    return tabela
+
+
+def estimar_bytes_lidos(filtros, caminho=DIRETORIO_DATASET):
+    """
+    Estima quanto do dataset uma leitura com `filtros` precisa ler: partições
+    são podadas pelo caminho e row groups pelas estatísticas min/max.
+    Retorna (bytes_lidos, bytes_totais, row_groups_lidos, row_groups_totais).
+    """
+    dataset = abrir_dataset(caminho)
+    filtro = pq.filters_to_expression(filtros)
+
+    bytes_totais = row_groups_totais = 0
+    for fragmento in dataset.get_fragments():
+        for row_group in fragmento.row_groups:
+            bytes_totais += row_group.total_byte_size
+            row_groups_totais += 1
+
+    bytes_lidos = row_groups_lidos = 0
+    for fragmento in dataset.get_fragments(filter=filtro):
+        for parte in fragmento.split_by_row_group(filter=filtro, schema=dataset.schema):
+            for row_group in parte.row_groups:
+                bytes_lidos += row_group.total_byte_size
+                row_groups_lidos += 1
+
+    return bytes_lidos, bytes_totais, row_groups_lidos, row_groups_totais
@@ -2,16 +2,12 @@
 import pandas as pd
 import sys
 
-ARQUIVO_PARQUET = "ouvidoria.parquet"
+from dataset_ouvidoria import DIRETORIO_DATASET, estimar_bytes_lidos, ler_dataset
 
-print(f"Carregando {ARQUIVO_PARQUET} para diagnóstico...")
+print(f"Carregando {DIRETORIO_DATASET} para diagnóstico...")
 try:
-    df = pd.read_parquet(
-        ARQUIVO_PARQUET, 
-        # Carrega só as colunas que precisamos
-        columns=['satisfacao', 'dias_de_atraso'], 
-        engine="pyarrow"
-    )
+    # Carrega só as colunas que precisamos
+    df = ler_dataset(colunas=['satisfacao', 'dias_de_atraso'])
     print("Arquivo carregado com sucesso.\n")
     
     print("--- 1. Análise da Coluna 'satisfacao' ---")
@@ -25,12 +21,30 @@ try:
     # Verifica se a coluna é numérica
     if pd.api.types.is_numeric_dtype(df['dias_de_atraso']):
         print(f"Linhas com atraso (dias_de_atraso > 0): { (df['dias_de_atraso'] > 0).sum() }")
-        print(f"Média de dias de atraso: { df[df['dias_de_atraso'] > 0]['dias_de_atraso'].mean():.2f } dias")
+        print(f"Média de dias de atraso: {df[df['dias_de_atraso'] > 0]['dias_de_atraso'].mean():.2f} dias")
         print(f"Atraso máximo: { df['dias_de_atraso'].max() } dias")
     else:
         print("AVISO: A coluna 'dias_de_atraso' não é numérica. Verifique o etl.py.")
         print(df['dias_de_atraso'].value_counts(dropna=False).head(10))
 
+    print("\n--- 3. Bytes lidos por filtros típicos do dashboard ---")
+    # Poda por partição (ano/UF) + estatísticas min/max dos row groups (tipo)
+    ano = int(ler_dataset(colunas=['ano_registro'])['ano_registro'].max())
+    filtros_tipicos = {
+        f"ano = {ano}": [("ano_registro", "in", [ano])],
+        "UF = sp": [("uf_do_municipio_manifestante", "in", ["sp"])],
+        "tipo = reclamação": [("tipo_manifestacao", "==", "reclamação")],
+        f"ano = {ano}, UF = sp, tipo = reclamação": [
+            ("ano_registro", "in", [ano]),
+            ("uf_do_municipio_manifestante", "in", ["sp"]),
+            ("tipo_manifestacao", "==", "reclamação"),
+        ],
+    }
+    for descricao, filtros in filtros_tipicos.items():
+        lidos, totais, grupos_lidos, grupos_totais = estimar_bytes_lidos(filtros)
+        print(f"{descricao}: {lidos / 1e6:.1f} de {totais / 1e6:.1f} MB "
+              f"({lidos / max(totais, 1):.1%}), {grupos_lidos}/{grupos_totais} row groups")
+
 except Exception as e:
     print(f"Erro ao ler o arquivo: {e}")
     sys.exit(1)
\ No newline at end of file
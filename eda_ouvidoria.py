@@ -1,18 +1,21 @@
 # eda_ouvidoria.py (ATUALIZADO)
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
-ARQUIVO_PARQUET = "ouvidoria.parquet"
+from dataset_ouvidoria import ler_dataset
 TEMA_GRAFICOS = "plotly_white" # <--- NOSSA CONSTANTE DE TEMA
+COLUNA_TOTAL = "total" # Coluna de contagem dos cubos pré-agregados (etl.py)
 
 # ============================================================
 # Função base: carregar dados (Sem mudanças)
 # ============================================================
-def carregar_dados():
-    """Carrega todos os dados do Parquet."""
+def carregar_dados(filtros=None):
+    """Carrega os dados do dataset Parquet (opcionalmente filtrados por partição)."""
     print("Carregando dados completos para a aba EDA...")
     try:
-        df = pd.read_parquet(ARQUIVO_PARQUET, engine="pyarrow")
+        df = ler_dataset(filtros=filtros)
         print(f"Dados carregados com sucesso: {len(df)} linhas.")
         return df
     except Exception as e:
@@ -20,16 +23,35 @@ def carregar_dados():
         return pd.DataFrame()
 
 
+# ============================================================
+# Helper: contagens (linhas brutas OU cubo pré-agregado)
+# ============================================================
+def contar_registros(df, coluna):
+    """
+    Equivalente a df[coluna].value_counts(), mas também aceita um cubo
+    pré-agregado (com a coluna 'total'), somando as contagens.
+    """
+    if COLUNA_TOTAL not in df.columns:
+        contagem = df[coluna].value_counts()
+        # Em colunas 'category' o value_counts traz categorias ausentes com 0
+        return contagem[contagem > 0]
+    contagem = df.groupby(coluna, observed=True)[COLUNA_TOTAL].sum()
+    contagem = contagem[contagem > 0].sort_values(ascending=False)
+    contagem.name = "count"
+    return contagem
+
+
 # ============================================================
 # Gráficos (COM MELHORIAS)
 # ============================================================
 
 def grafico_volume_tempo(df):
-    if not pd.api.types.is_datetime64_any_dtype(df['data_registro']):
-         df["data_registro"] = pd.to_datetime(df["data_registro"])
-         
-    df["mes"] = df["data_registro"].dt.month
-    volume_tempo = df.groupby(["ano_registro", "mes"]).size().reset_index(name="total")
+    if COLUNA_TOTAL in df.columns:
+        # Cubo pré-agregado: 'mes' já existe, basta somar as contagens
+        volume_tempo = df.groupby(["ano_registro", "mes"], observed=True)[COLUNA_TOTAL].sum().reset_index(name="total")
+    else:
+        # 'mes' vem pronto do ETL
+        volume_tempo = df.groupby(["ano_registro", "mes"]).size().reset_index(name="total")
     fig = px.line(
         volume_tempo,
         x="mes",
@@ -44,7 +66,7 @@ def grafico_volume_tempo(df):
 
 def grafico_genero(df):
     # --- MELHORIA: Trocado de Pizza (Pie) para Barras Horizontais ---
-    df_genero = df['genero'].value_counts().reset_index(name="Total")
+    df_genero = contar_registros(df, 'genero').reset_index(name="Total")
     
     fig = px.bar(
         df_genero.sort_values(by="Total", ascending=True), # Ordena
@@ -61,7 +83,7 @@ def grafico_genero(df):
 
 
 def grafico_faixa_etaria(df):
-    df_faixa = df["faixa_etaria"].value_counts().reset_index()
+    df_faixa = contar_registros(df, "faixa_etaria").reset_index()
     df_faixa.columns = ["faixa_etaria", "count"]
     fig = px.bar(
         df_faixa,
@@ -76,7 +98,7 @@ def grafico_faixa_etaria(df):
 
 
 def grafico_raca(df):
-    raca_counts = df["raca_cor"].value_counts().reset_index()
+    raca_counts = contar_registros(df, "raca_cor").reset_index()
     raca_counts.columns = ["raca_cor", "contagem"]
     fig = px.bar(
         raca_counts,
@@ -91,7 +113,7 @@ def grafico_raca(df):
 
 
 def grafico_tipos(df):
-    tipo_counts = df["tipo_manifestacao"].value_counts().head(10).reset_index()
+    tipo_counts = contar_registros(df, "tipo_manifestacao").head(10).reset_index()
     tipo_counts.columns = ["tipo_manifestacao", "contagem"]
     fig = px.bar(
         tipo_counts,
@@ -105,22 +127,86 @@ def grafico_tipos(df):
     return fig
 
 
+def quantil_ponderado(valores, contagens, q):
+    """
+    Quantil (interpolação linear, como np.quantile) de uma distribuição dada
+    por valores ordenados e suas contagens, sem expandir as linhas.
+    """
+    acumulado = np.cumsum(contagens)
+    posicao = q * (acumulado[-1] - 1)
+    i = int(np.floor(posicao))
+    fracao = posicao - i
+    valor_i = valores[np.searchsorted(acumulado, i, side="right")]
+    valor_j = valores[np.searchsorted(acumulado, min(i + 1, acumulado[-1] - 1), side="right")]
+    return valor_i + fracao * (valor_j - valor_i)
+
+
+def estatisticas_boxplot(df, coluna_grupo, coluna_valor):
+    """
+    Quartis, média e bigodes (1,5 x IQR, como o Plotly) por grupo, calculados
+    a partir das contagens ('total') de cada (grupo, valor). Os outliers saem
+    como valores distintos com sua contagem: o tamanho não depende do nº de linhas.
+    """
+    linhas = []
+    for grupo, dados in df.groupby(coluna_grupo, observed=True):
+        dados = dados.groupby(coluna_valor, observed=True)[COLUNA_TOTAL].sum()
+        dados = dados[dados > 0].sort_index()
+        if dados.empty:
+            continue
+        valores = dados.index.to_numpy(dtype=float)
+        contagens = dados.to_numpy()
+        q1, mediana, q3 = (quantil_ponderado(valores, contagens, q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+        if dentro.size == 0:
+            dentro = valores
+        fora = (valores < dentro.min()) | (valores > dentro.max())
+        linhas.append({
+            coluna_grupo: grupo,
+            "q1": q1, "mediana": mediana, "q3": q3,
+            "media": np.average(valores, weights=contagens),
+            "limite_inferior": dentro.min(), "limite_superior": dentro.max(),
+            "n": int(contagens.sum()),
+            "outliers": list(zip(valores[fora], contagens[fora])),
+        })
+    return pd.DataFrame(linhas)
+
+
 def grafico_satisfacao(df):
-    df["em_atraso"] = pd.to_numeric(df["dias_de_atraso"], errors='coerce').fillna(0) > 0
-    fig = px.box(
-        df.dropna(subset=["satisfacao"]),
-        x="em_atraso",
-        y="satisfacao",
-        title="Distribuição da Satisfação por Atraso na Resposta",
-        labels={"em_atraso": "Em Atraso?", "satisfacao": "Nível de Satisfação"},
-        template=TEMA_GRAFICOS # <--- APLICA O TEMA
+    """
+    Boxplot da nota de satisfação (1-5) por atraso. Recebe as contagens por
+    ('em_atraso', 'satisfacao_num', 'satisfacao') só das manifestações com
+    nota; as estatísticas vão prontas para o Plotly (nada de linhas brutas).
+    """
+    stats = estatisticas_boxplot(df, "em_atraso", "satisfacao_num") if not df.empty else pd.DataFrame()
+    if stats.empty:
+        return go.Figure(layout={"template": TEMA_GRAFICOS, "title": {"text": "Sem dados para exibir"}})
+    grupos = stats["em_atraso"].astype(str).tolist()
+    fig = go.Figure(go.Box(
+        x=grupos,
+        q1=stats["q1"], median=stats["mediana"], q3=stats["q3"], mean=stats["media"],
+        lowerfence=stats["limite_inferior"], upperfence=stats["limite_superior"],
+        boxpoints=False, name="Satisfação",
+    ))
+    outliers = [(g, v, n) for g, lista in zip(grupos, stats["outliers"]) for v, n in lista]
+    if outliers:
+        fig.add_trace(go.Scatter(
+            x=[g for g, _, _ in outliers], y=[v for _, v, _ in outliers],
+            mode="markers", name="Outliers",
+            hovertext=[f"{n} manifestações" for _, _, n in outliers],
+        ))
+    # Eixo numérico (a nota) com os rótulos de texto do próprio dado
+    rotulos = df.groupby("satisfacao_num", observed=True)["satisfacao"].first().astype(str)
+    fig.update_layout(
+        title="Distribuição da Satisfação por Atraso na Resposta", title_x=0.5,
+        xaxis_title="Em Atraso?", showlegend=False, template=TEMA_GRAFICOS,
+        yaxis={"title": "Nível de Satisfação", "tickvals": rotulos.index.tolist(), "ticktext": rotulos.tolist()},
     )
-    fig.update_layout(title_x=0.5)
     return fig
 
 
 def grafico_mapa(df):
-    uf_counts = df["uf_do_municipio_manifestante"].value_counts().head(30).reset_index()
+    uf_counts = contar_registros(df, "uf_do_municipio_manifestante").head(30).reset_index()
     uf_counts.columns = ["UF", "Total"]
     
     fig = px.bar(
@@ -1,10 +1,34 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import glob
 import re
+import json
+import base64
+import codecs
+import csv
+import hashlib
+import shutil
+import argparse
+import io
+import time
+import warnings
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from urllib.parse import quote
 from unidecode import unidecode
 import os
 
+from dataset_ouvidoria import DIRETORIO_DATASET, COLUNAS_PARTICAO, COLUNAS_STRING_NO_DISCO, NOME_MANIFESTO, abrir_dataset
+from processamento_paralelo import mapear_em_ordem
+
 # --- Helper: Função para limpar nomes de colunas ---
+@lru_cache(maxsize=None)
 def snake_case_nome(nome_coluna):
     """Converte um nome de coluna para snake_case (ex: 'Raça/Cor' -> 'raca_cor')"""
     nome_coluna = unidecode(nome_coluna)
@@ -25,35 +49,188 @@ COLUNAS_TEXTO = [
 
 COLUNAS_NUM = ['dias para resolução', 'dias de atraso']
 
+# Identificadores numéricos: int64 no dataset (0 se vazio ou inválido)
+COLUNAS_INTEIRAS = ['protocolo']
+
+# Nomes já em snake_case (calculados uma vez, não a cada arquivo)
+COLUNAS_TEXTO_LIMPAS = [snake_case_nome(c) for c in COLUNAS_TEXTO]
+COLUNAS_NUM_LIMPAS = [snake_case_nome(c) for c in COLUNAS_NUM]
+
 # Mapa para forçar leitura como string
 DTYPE_MAP = {col: str for col in COLUNAS_TEXTO}
 
+# Colunas de texto com poucos valores distintos: viram 'category' no pandas
+# e dictionary<int32, string> no Parquet (lidas de volta como 'category')
+COLUNAS_CATEGORICAS = [
+    'uf_do_municipio_manifestante', 'uf_do_municipio_manifestacao', 'uf_do_orgao',
+    'tipo_manifestacao', 'nome_orgao', 'genero', 'faixa_etaria', 'raca_cor',
+    'satisfacao', 'situacao', 'esfera', 'demanda_atendida'
+]
+TIPO_ARROW_CATEGORICO = pa.dictionary(pa.int32(), pa.string())
+
+# Muda quando o formato das saídas muda: um manifesto de outra versão força reprocessamento completo
+VERSAO_FORMATO = 4
+
+# --- CUBOS PRÉ-AGREGADOS (servem os KPIs e gráficos do app.py) ---
+# Os arquivos derivados ficam dentro do dataset (prefixo '_': ignorados pelo
+# pyarrow) e são publicados junto com ele; cada um grava a versão dos dados
+# de que foi gerado (ver versao_dataset em dataset_ouvidoria.py)
+ARQUIVO_CUBO = os.path.join(DIRETORIO_DATASET, '_cubo.parquet')
+ARQUIVO_CUBO_DEMOGRAFICO = os.path.join(DIRETORIO_DATASET, '_cubo_demografico.parquet')
+
+# --- COLUNAS DERIVADAS (calculadas uma vez no ETL e gravadas no dataset) ---
+#   satisfacao_num: nota 1-5 extraída de 'satisfacao' (int8, 0 = sem nota)
+#   em_atraso: dias_de_atraso > 0 (bool)
+#   mes: mês de data_registro (int8)
+#   alvo: alvo do modelo de ML (int8: 1 = insatisfeito (1-2), 0 = satisfeito (4-5), -1 = fora do treino)
+COLUNAS_DERIVADAS = ['satisfacao_num', 'em_atraso', 'mes', 'alvo']
+SATISFACAO_SEM_NOTA = 0
+ALVO_FORA_DO_TREINO = -1
+
+# 'satisfacao_num' depende só de 'satisfacao', então não aumenta o tamanho do cubo
+DIMENSOES_CUBO = [
+    'ano_registro', 'mes', 'uf_do_municipio_manifestante', 'tipo_manifestacao',
+    'nome_orgao', 'satisfacao', 'satisfacao_num', 'em_atraso'
+]
+DIMENSOES_CUBO_DEMOGRAFICO = [
+    'ano_registro', 'uf_do_municipio_manifestante', 'tipo_manifestacao',
+    'genero', 'faixa_etaria', 'raca_cor'
+]
+MEDIDAS_CUBO = ['total', 'soma_dias_atraso']
+
+# --- ARROW DO PAINEL (Arrow IPC sem compressão, aberto com memory_map pelo app) ---
+#   só as colunas dos gráficos, ordenado por (ano, UF); os workers do app
+#   compartilham as páginas do arquivo e não descomprimem nada
+ARQUIVO_ARROW_PAINEL = os.path.join(DIRETORIO_DATASET, '_painel.arrow')
+COLUNAS_ARROW_PAINEL = list(dict.fromkeys(DIMENSOES_CUBO + DIMENSOES_CUBO_DEMOGRAFICO + ['dias_de_atraso']))
+
+# --- METADADOS (arquivo pequeno lido pelo app na inicialização) ---
+#   valores distintos/contagens das colunas de filtro, anos, linhas e uma amostra
+ARQUIVO_METADADOS = os.path.join(DIRETORIO_DATASET, '_metadados.json')
+LINHAS_AMOSTRA_METADADOS = 100
+# Coluna -> cubo de onde sai a contagem ('cubo' ou 'cubo_demografico')
+COLUNAS_METADADOS = {
+    'ano_registro': 'cubo', 'uf_do_municipio_manifestante': 'cubo',
+    'tipo_manifestacao': 'cubo', 'nome_orgao': 'cubo',
+    'genero': 'cubo_demografico', 'faixa_etaria': 'cubo_demografico', 'raca_cor': 'cubo_demografico',
+}
+
+# Linhas por row group do dataset final (configurável via --linhas-por-grupo)
+LINHAS_POR_GRUPO_PADRAO = 128 * 1024
+
+# Layout 'agrupado': dentro de cada partição ano/UF, as linhas de cada CSV são
+# separadas por tipo e cada row group contém um único tipo, ordenado por data
+# (min/max exatos para os filtros do app). 'streaming' grava na ordem do CSV.
+LAYOUTS = ['agrupado', 'streaming']
+COLUNAS_ORDENACAO = ['tipo_manifestacao', 'data_registro']
+
+# Máximo de linhas esperando nos buffers do escritor (somando partições e
+# tipos); acima disso o maior buffer é gravado antes de completar o row group
+LIMITE_LINHAS_BUFFER = 8 * LINHAS_POR_GRUPO_PADRAO
+
+# Motores de limpeza do texto: 'arrow' (pyarrow.compute sobre os valores
+# distintos) gera exatamente o mesmo resultado que 'pandas' (original)
+MOTORES_LIMPEZA = ['arrow', 'pandas']
+
+# Caracteres que o str.strip() do Python remove, ou seja, com str.isspace()
+# (o utf8_trim_whitespace do Arrow usa outra definição de espaço, então a
+# lista é passada explicitamente)
+ESPACOS_PYTHON = (
+    '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680'
+    '\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a'
+    '\u2028\u2029\u202f\u205f\u3000'
+)
+# Fora do Latin estendido (e o 'İ'), o lower() do Python pode diferir do Arrow
+REGEX_CAIXA_ESPECIAL = r'[^\x{0000}-\x{024F}]|\x{0130}'
+
+# Formatos de data testados (na ordem) em uma amostra de cada arquivo
+FORMATOS_DATA = [
+    '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y',
+]
+AMOSTRA_DATAS = 1000
+COLUNAS_DATA = ['data_registro', 'data_prazo_resposta', 'data_resposta']
+
+# --- Helper: Conversão de datas com formato detectado por arquivo ---
+def detectar_formato_data(valores):
+    """Primeiro formato de FORMATOS_DATA que converte toda a amostra, ou None."""
+    amostra = pd.Series(valores[:AMOSTRA_DATAS], dtype=object)
+    if amostra.empty:
+        return None
+    for formato in FORMATOS_DATA:
+        if pd.to_datetime(amostra, format=formato, errors='coerce').notna().all():
+            return formato
+    return None
+
+def converter_datas(serie, formato):
+    """
+    Converte uma coluna de datas em texto. Cada valor distinto é convertido
+    uma vez (as datas se repetem muito) com `formato`, detectado uma vez por
+    arquivo (detectar_formato_data no primeiro bloco).
+    Sem formato, ou se algum valor não seguir esse formato, a coluna inteira
+    volta para a inferência do pandas (comportamento original). Uma coluna
+    sem nenhum valor vira NaT direto (não há o que inferir).
+    Retorna (datas, True se usou a inferência, valores não convertidos).
+    """
+    if not serie.notna().any():
+        return pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]'), False, 0
+    datas = None
+    if formato is not None:
+        codigos, distintos = pd.factorize(serie)
+        convertidos = pd.to_datetime(distintos, format=formato, errors='coerce')
+        if convertidos.notna().all():
+            datas = pd.Series(convertidos.take(codigos, allow_fill=True, fill_value=pd.NaT), index=serie.index)
+    inferencia = datas is None
+    if inferencia:
+        with warnings.catch_warnings():
+            # O uso da inferência já entra no relatório do arquivo (blocos_inferencia)
+            warnings.filterwarnings('ignore', 'Could not infer format', UserWarning)
+            datas = pd.to_datetime(serie, errors='coerce', dayfirst=True)
+    falhas = int((serie.notna() & datas.isna()).sum())
+    return datas, inferencia, falhas
+
 # --- Helper: Função para limpar o DataFrame ---
-def limpar_dataframe(df):
+def limpar_dataframe(df, motor='pandas', formatos_data=None):
     # 1. Normaliza nomes das colunas
     df.columns = [snake_case_nome(col) for col in df.columns]
 
-    # Pega os nomes de colunas já em "snake_case"
-    colunas_texto_limpas = [snake_case_nome(c) for c in COLUNAS_TEXTO]
-    colunas_num_limpas = [snake_case_nome(c) for c in COLUNAS_NUM]
-
     # 2. Normaliza colunas de texto
-    for col in colunas_texto_limpas:
-        if col in df.columns:
-            df[col] = df[col].str.lower().str.strip()
-            df[col] = df[col].replace(['nan', '', None], 'não informado')
+    # 2b. Colunas de baixa cardinalidade como 'category' (códigos inteiros)
+    if motor == 'arrow':
+        _normalizar_texto_arrow(df)
+    else:
+        for col in COLUNAS_TEXTO_LIMPAS:
+            if col in df.columns:
+                df[col] = df[col].str.lower().str.strip()
+                df[col] = df[col].replace(['nan', '', None], 'não informado')
+
+        for col in COLUNAS_CATEGORICAS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
 
     # 3. Normaliza colunas numéricas
-    for col in colunas_num_limpas:
+    for col in COLUNAS_NUM_LIMPAS:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
             df[col] = df[col].fillna(0)
 
     # 4. Normaliza datas e cria 'ano_registro'
-    colunas_data = ['data_registro', 'data_prazo_resposta', 'data_resposta']
-    for col in colunas_data:
+    # (formato, uso da inferência e falhas de cada coluna ficam em df.attrs['datas'];
+    # `formatos_data` guarda os formatos detectados no primeiro bloco do arquivo
+    # em que a coluna tem valores)
+    relatorio_datas = {}
+    if formatos_data is None:
+        formatos_data = {}
+    for col in COLUNAS_DATA:
         if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True)
+            if col not in formatos_data:
+                valores = df[col].dropna().unique()
+                if len(valores):
+                    formatos_data[col] = detectar_formato_data(valores)
+            df[col], inferencia, falhas = converter_datas(df[col], formatos_data.get(col))
+            relatorio_datas[col] = {
+                'formato': formatos_data.get(col), 'blocos': 1, 'blocos_inferencia': int(inferencia), 'falhas': falhas,
+            }
 
     if 'data_registro' in df.columns:
         df['ano_registro'] = df['data_registro'].dt.year
@@ -63,89 +240,897 @@ def limpar_dataframe(df):
 
     # Garante que o ano é numérico
     df['ano_registro'] = pd.to_numeric(df['ano_registro'], errors='coerce').fillna(0).astype(int)
-    
+
+    df.attrs['datas'] = relatorio_datas
+    return df
+
+def _normalizar_texto_arrow(df):
+    """Passos 2 e 2b do limpar_dataframe com pyarrow.compute, alterando `df`."""
+    colunas = [col for col in COLUNAS_TEXTO_LIMPAS if col in df.columns]
+    if not colunas:
+        return
+    # Conversão pandas -> Arrow em paralelo (uma coluna por thread)
+    tabela = pa.Table.from_pandas(df[colunas], preserve_index=False, nthreads=os.cpu_count())
+    for col in colunas:
+        valores = _limpar_texto_arrow(tabela.column(col).combine_chunks().cast(pa.string()))
+        if col in COLUNAS_CATEGORICAS:
+            df[col] = pd.Series(_categorica_ordenada(valores), index=df.index)
+        else:
+            df[col] = pd.Series(valores.to_pandas(), index=df.index)
+
+def _limpar_texto_arrow(valores):
+    """lower + strip + 'não informado' calculados uma vez por valor distinto e expandidos pelos índices."""
+    codificado = pc.dictionary_encode(valores)
+    distintos = codificado.dictionary
+    limpos = pc.utf8_trim(pc.utf8_lower(distintos), characters=ESPACOS_PYTHON)
+
+    especiais = pc.match_substring_regex(distintos, REGEX_CAIXA_ESPECIAL)
+    if pc.any(especiais).as_py():
+        limpos = pa.array([
+            original.lower().strip() if especial else limpo
+            for original, limpo, especial in zip(distintos.to_pylist(), limpos.to_pylist(), especiais.to_pylist())
+        ], pa.string())
+
+    limpos = pc.if_else(pc.is_in(limpos, value_set=pa.array(['nan', ''])), 'não informado', limpos)
+    return pc.fill_null(limpos.take(codificado.indices), 'não informado')
+
+def _categorica_ordenada(valores):
+    """Categorical com as categorias ordenadas, como o astype('category') do pandas."""
+    categorias = pc.unique(valores)
+    categorias = categorias.take(pc.array_sort_indices(categorias))
+    codigos = pc.index_in(valores, value_set=categorias)
+    return pd.Categorical.from_codes(codigos.to_numpy(zero_copy_only=False), categories=categorias.to_pylist())
+
+# --- Helpers: Cubos pré-agregados ---
+def nota_satisfacao(serie):
+    """Extrai a nota de 'satisfacao' (ex: '(1) muito insatisfeito' -> 1), rodando o regex uma vez por valor distinto."""
+    unicos = pd.Series(serie.dropna().unique(), dtype=object)
+    notas = pd.to_numeric(unicos.astype(str).str.extract(r'\((\d)\)')[0], errors='coerce')
+    notas = notas.fillna(SATISFACAO_SEM_NOTA).astype('int8')
+    return serie.map(dict(zip(unicos, notas))).fillna(SATISFACAO_SEM_NOTA).astype('int8')
+
+def adicionar_colunas_derivadas(df):
+    """Materializa as COLUNAS_DERIVADAS em um DataFrame já limpo (alterando `df`)."""
+    if 'satisfacao' in df.columns:
+        df['satisfacao_num'] = nota_satisfacao(df['satisfacao'])
+    else:
+        df['satisfacao_num'] = pd.Series(SATISFACAO_SEM_NOTA, index=df.index, dtype='int8')
+    df['em_atraso'] = pd.to_numeric(df['dias_de_atraso'], errors='coerce').fillna(0) > 0
+    df['mes'] = df['data_registro'].dt.month.astype('int8')
+
+    nota = df['satisfacao_num']
+    alvo = pd.Series(ALVO_FORA_DO_TREINO, index=df.index, dtype='int8')
+    alvo[(nota >= 1) & (nota <= 2)] = 1
+    alvo[nota >= 4] = 0
+    df['alvo'] = alvo
+    return df
+
+def agregar_cubo(df, dimensoes=DIMENSOES_CUBO):
+    """
+    Agrega um DataFrame limpo (com as COLUNAS_DERIVADAS) nas `dimensoes`,
+    com a contagem de registros ('total') e a soma de 'dias_de_atraso'. Os
+    cubos são aditivos: cubos parciais (um por CSV) são somados depois com
+    `combinar_cubos`.
+    """
+    colunas = {}
+    for col in dimensoes:
+        if col in df.columns:
+            colunas[col] = df[col]
+        else:
+            colunas[col] = pd.Series('não informado', index=df.index)
+
+    base = pd.DataFrame(colunas, index=df.index)
+    base['total'] = 1
+    base['soma_dias_atraso'] = pd.to_numeric(df['dias_de_atraso'], errors='coerce').fillna(0)
+
+    return base.groupby(dimensoes, dropna=False, observed=True, sort=False)[MEDIDAS_CUBO].sum().reset_index()
+
+def combinar_cubos(cubos_parciais, dimensoes=DIMENSOES_CUBO):
+    """Soma cubos parciais (mesmas dimensões) em um único cubo."""
+    cubo = pd.concat(cubos_parciais, ignore_index=True)
+    return cubo.groupby(dimensoes, dropna=False, observed=True)[MEDIDAS_CUBO].sum().reset_index()
+
+# --- Leitura dos CSVs em blocos (pyarrow.csv), sem materializar o arquivo ---
+TAMANHO_BLOCO_CSV = 16 * 1024 * 1024   # bytes de CSV por bloco
+TAMANHO_AMOSTRA_CODIFICACAO = 1024 * 1024
+
+# Mesmos valores que o pd.read_csv trata como vazio
+VALORES_NULOS_CSV = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# Bytes inválidos em um arquivo UTF-8 são lidos como latin-1 (em vez de reler o
+# arquivo todo): o 'surrogateescape' os marca como U+DC80..U+DCFF, trocados depois
+REGEX_BYTES_INVALIDOS = re.compile('[\udc80-\udcff]')
+
+def _byte_como_latin1(marcado):
+    return chr(ord(marcado.group()) - 0xDC00)
+
+def detectar_codificacao(arquivo_csv):
+    """Codificação do CSV a partir de uma amostra do início: 'utf-8-sig', 'utf-8' ou 'latin-1'."""
+    with open(arquivo_csv, 'rb') as f:
+        amostra = f.read(TAMANHO_AMOSTRA_CODIFICACAO)
+    if amostra.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False: um caractere cortado no fim da amostra não conta como erro
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+class _LeitorUTF8(io.RawIOBase):
+    """
+    Arquivo binário que entrega o CSV convertido para UTF-8 aos poucos.
+    `bytes_latin1` conta os bytes inválidos lidos como latin-1 neste arquivo.
+    """
+
+    def __init__(self, caminho, codificacao, tamanho_bloco=TAMANHO_BLOCO_CSV):
+        self._arquivo = open(caminho, 'rb')
+        self._decodificador = codecs.getincrementaldecoder(codificacao)(errors='surrogateescape')
+        self._tamanho_bloco = tamanho_bloco
+        self._pendente = bytearray()
+        self._fim = False
+        self.bytes_latin1 = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._pendente) < len(buffer) and not self._fim:
+            bruto = self._arquivo.read(self._tamanho_bloco)
+            self._fim = not bruto
+            texto = self._decodificador.decode(bruto, final=self._fim)
+            try:
+                self._pendente += texto.encode('utf-8')
+            except UnicodeEncodeError:
+                # Só blocos com bytes inválidos pagam a troca (o encode falha nos U+DCxx)
+                texto, invalidos = REGEX_BYTES_INVALIDOS.subn(_byte_como_latin1, texto)
+                self.bytes_latin1 += invalidos
+                self._pendente += texto.encode('utf-8')
+        n = min(len(buffer), len(self._pendente))
+        buffer[:n] = self._pendente[:n]
+        del self._pendente[:n]
+        return n
+
+    def close(self):
+        self._arquivo.close()
+        super().close()
+
+def ler_cabecalho_csv(arquivo_csv, codificacao):
+    """Nomes das colunas do CSV (primeira linha), decodificados como no ler_csv_em_blocos."""
+    fonte = io.BufferedReader(_LeitorUTF8(arquivo_csv, codificacao, tamanho_bloco=64 * 1024))
+    with io.TextIOWrapper(fonte, encoding='utf-8', newline='') as texto:
+        return next(csv.reader(texto, delimiter=';'), [])
+
+def ler_csv_em_blocos(arquivo_csv, tamanho_bloco=TAMANHO_BLOCO_CSV):
+    """
+    Gera o CSV em DataFrames brutos de ~`tamanho_bloco` bytes. A codificação
+    é detectada uma vez e convertida em streaming; os blocos são
+    interpretados em paralelo pelo pyarrow, com todas as colunas como texto
+    (sem inferência: o tipo não muda de um bloco para outro). As conversões
+    são feitas pelo limpar_bloco.
+    Cada bloco leva em attrs['bytes_latin1'] os bytes fora do UTF-8 lidos
+    como latin-1 desde o bloco anterior (a soma é o total do arquivo).
+    """
+    codificacao = detectar_codificacao(arquivo_csv)
+    colunas = ler_cabecalho_csv(arquivo_csv, codificacao)
+    with _LeitorUTF8(arquivo_csv, codificacao) as fonte:
+        leitor = pacsv.open_csv(
+            fonte,
+            read_options=pacsv.ReadOptions(
+                use_threads=True, block_size=tamanho_bloco, column_names=colunas, skip_rows=1
+            ),
+            parse_options=pacsv.ParseOptions(delimiter=';', newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types={col: pa.string() for col in colunas},
+                null_values=VALORES_NULOS_CSV, strings_can_be_null=True,
+            ),
+        )
+        bytes_latin1_informados = 0
+        for lote in leitor:
+            if lote.num_rows:
+                df_bruto = lote.to_pandas()
+                df_bruto.attrs['bytes_latin1'] = fonte.bytes_latin1 - bytes_latin1_informados
+                bytes_latin1_informados = fonte.bytes_latin1
+                yield df_bruto
+
+def ler_csv(arquivo_csv):
+    """Lê um CSV bruto inteiro (concatena os blocos de ler_csv_em_blocos)."""
+    blocos = list(ler_csv_em_blocos(arquivo_csv))
+    df = pd.concat(blocos, ignore_index=True)
+    df.attrs['bytes_latin1'] = sum(bloco.attrs['bytes_latin1'] for bloco in blocos)
     return df
 
+# --- Helper: Limpa um bloco bruto e gera a tabela Arrow e os cubos parciais ---
+def limpar_bloco(df_bruto, motor='arrow', formatos_data=None):
+    """
+    Retorna {'tabela', 'cubo', 'cubo_demografico', 'datas', 'bytes_latin1'}
+    para um bloco (tabela None se o bloco ficar vazio). `formatos_data` guarda
+    os formatos de data detectados no primeiro bloco para os seguintes do
+    mesmo arquivo.
+    """
+    bytes_latin1 = df_bruto.attrs.get('bytes_latin1', 0)
+    df_limpo = limpar_dataframe(df_bruto, motor=motor, formatos_data=formatos_data)
+    bloco = {
+        'tabela': None, 'cubo': None, 'cubo_demografico': None,
+        'datas': df_limpo.attrs.get('datas', {}), 'bytes_latin1': bytes_latin1,
+    }
+
+    # O CSV é lido todo como texto: identificadores viram inteiros aqui
+    for col in COLUNAS_INTEIRAS:
+        if col in df_limpo.columns:
+            df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce').astype('Int64')
+
+    # Correção final de tipos
+    for col in df_limpo.columns:
+        if df_limpo[col].dtype == "Int64":
+            df_limpo[col] = df_limpo[col].fillna(0).astype("int64")
+        elif df_limpo[col].dtype == "boolean":
+            df_limpo[col] = df_limpo[col].fillna(False).astype(bool)
+    adicionar_colunas_derivadas(df_limpo)
+
+    if df_limpo.empty:
+        return bloco
+
+    tabela = pa.Table.from_pandas(df_limpo, preserve_index=False)
+    # Índice do dicionário fixo em int32 (o pandas escolhe int8/int16 conforme o arquivo)
+    for col in COLUNAS_CATEGORICAS:
+        if col in tabela.column_names:
+            i = tabela.column_names.index(col)
+            tipo = pa.string() if col in COLUNAS_STRING_NO_DISCO else TIPO_ARROW_CATEGORICO
+            tabela = tabela.set_column(i, col, tabela.column(col).cast(tipo))
+    bloco['tabela'] = tabela
+    bloco['cubo'] = agregar_cubo(df_limpo, DIMENSOES_CUBO)
+    bloco['cubo_demografico'] = agregar_cubo(df_limpo, DIMENSOES_CUBO_DEMOGRAFICO)
+    return bloco
+
+def somar_relatorios_datas(total, parcial):
+    """Acumula em `total` os blocos que usaram a inferência e as falhas de conversão de datas de um bloco."""
+    for col, info in parcial.items():
+        atual = total.setdefault(col, {'formato': info['formato'], 'blocos': 0, 'blocos_inferencia': 0, 'falhas': 0})
+        for campo in ('blocos', 'blocos_inferencia', 'falhas'):
+            atual[campo] += info[campo]
+    return total
+
+def _blocos_do_csv(arquivo_csv, motor):
+    formatos_data = {}
+    for df_bruto in ler_csv_em_blocos(arquivo_csv):
+        yield limpar_bloco(df_bruto, motor=motor, formatos_data=formatos_data)
+
+def _blocos_do_resultado(resultado):
+    # Resultado de processar_arquivo_csv (modo paralelo) visto como um único bloco
+    if resultado['erro']:
+        raise RuntimeError(resultado['erro'])
+    yield resultado
+
+# --- Helper: Lê e limpa UM arquivo CSV inteiro (roda dentro dos processos do pool) ---
+def processar_arquivo_csv(arquivo_csv, motor='arrow'):
+    """
+    Lê e limpa um CSV, devolvendo a tabela Arrow limpa e os cubos parciais.
+    Erros não são propagados: voltam em 'erro' para o relatório por arquivo.
+    (O modo serial do executar_etl grava os blocos direto, sem passar por aqui.)
+    """
+    resultado = {'tabela': None, 'cubo': None, 'cubo_demografico': None, 'datas': {}, 'bytes_latin1': 0, 'erro': None}
+    tabelas, cubos, cubos_demograficos = [], [], []
+    formatos_data = {}
+    try:
+        for df_bruto in ler_csv_em_blocos(arquivo_csv):
+            bloco = limpar_bloco(df_bruto, motor=motor, formatos_data=formatos_data)
+            somar_relatorios_datas(resultado['datas'], bloco['datas'])
+            resultado['bytes_latin1'] += bloco['bytes_latin1']
+            if bloco['tabela'] is not None:
+                tabelas.append(bloco['tabela'])
+                cubos.append(bloco['cubo'])
+                cubos_demograficos.append(bloco['cubo_demografico'])
+    except Exception as e:
+        resultado['erro'] = str(e)
+        return resultado
+
+    if tabelas:
+        resultado['tabela'] = pa.concat_tables(tabelas, promote_options='permissive')
+        resultado['cubo'] = combinar_cubos(cubos, DIMENSOES_CUBO)
+        resultado['cubo_demografico'] = combinar_cubos(cubos_demograficos, DIMENSOES_CUBO_DEMOGRAFICO)
+    return resultado
+
+# --- Helper: decodifica colunas dictionary (o sort do Arrow não aceita esse tipo) ---
+def _decodificar_dicionarios(tabela):
+    return pa.table({
+        col: tabela.column(col).cast(tabela.column(col).type.value_type)
+        if pa.types.is_dictionary(tabela.column(col).type) else tabela.column(col)
+        for col in tabela.column_names
+    })
+
+# --- Escrita em streaming do dataset particionado por ano/UF ---
+class EscritorDatasetParticionado:
+    """
+    Grava tabelas Arrow no dataset Hive (ano_registro/UF) à medida que chegam,
+    com um ParquetWriter por partição e por CSV de origem
+    (ex: ano_registro=2024/uf_do_municipio_manifestante=sp/manifestacoes_2024.parquet).
+
+    Todas as tabelas são convertidas para um único esquema (o da primeira
+    tabela recebida, ou `esquema`). As linhas esperam em buffers até
+    completar `linhas_por_grupo`: um por partição no layout 'streaming' e um
+    por partição e tipo no 'agrupado' (cada row group é ordenado por data ao
+    ser gravado). Se os buffers somarem mais de `limite_buffer` linhas, o
+    maior é gravado antes, então a memória não depende do tamanho nem do
+    número de CSVs.
+    """
+
+    def __init__(self, diretorio, linhas_por_grupo=LINHAS_POR_GRUPO_PADRAO, esquema=None, layout='agrupado',
+                 limite_buffer=LIMITE_LINHAS_BUFFER):
+        self.diretorio = diretorio
+        self.linhas_por_grupo = linhas_por_grupo
+        self.esquema = esquema
+        self.layout = layout
+        self.limite_buffer = max(limite_buffer, linhas_por_grupo)
+        self.linhas_gravadas = 0
+        self.linhas_em_buffer = 0
+        self._writers = {}  # (pasta_particao, nome_base) -> [ParquetWriter, {tipo (ou None): [tabelas, linhas]}]
+
+    def escrever(self, tabela, nome_base):
+        """Anexa `tabela` (com as colunas de partição) aos arquivos de `nome_base`."""
+        tabela = self._com_colunas_particao(tabela)
+        dados = self._conformar_esquema(tabela.drop_columns(COLUNAS_PARTICAO))
+
+        # Ordenação estável pelas partições: cada partição vira um trecho contíguo
+        chaves = _decodificar_dicionarios(tabela.select(COLUNAS_PARTICAO))
+        indices = pc.sort_indices(chaves, sort_keys=[(col, 'ascending') for col in COLUNAS_PARTICAO])
+        particoes = chaves.take(indices).to_pandas()
+
+        mudou = (particoes != particoes.shift()).any(axis=1).to_numpy()
+        inicios = mudou.nonzero()[0].tolist() + [len(particoes)]
+        for inicio, fim in zip(inicios[:-1], inicios[1:]):
+            ano, uf = particoes.iloc[inicio]
+            pasta = os.path.join(
+                self.diretorio,
+                f"{COLUNAS_PARTICAO[0]}={ano}",
+                f"{COLUNAS_PARTICAO[1]}={quote(str(uf), safe='')}",
+            )
+            # take por partição (e por tipo, em _separar_tipos): cada buffer fica com
+            # uma cópia só das suas linhas; uma fatia manteria o bloco inteiro na memória
+            self._anexar(pasta, nome_base, dados.take(indices.slice(inicio, fim - inicio)))
+        while self.linhas_em_buffer > self.limite_buffer:
+            self._descarregar_maior_buffer()
+
+    def fechar_arquivo_origem(self, nome_base):
+        """Descarrega os buffers e fecha os arquivos de um CSV de origem. Retorna os caminhos gravados."""
+        caminhos = []
+        for chave in [c for c in self._writers if c[1] == nome_base]:
+            writer, buffers = self._writers.pop(chave)
+            for tipo in sorted(buffers, key=lambda t: (t is None, t or '')):
+                tabelas, linhas = buffers[tipo]
+                if linhas:
+                    self._gravar(writer, self._ordenar(pa.concat_tables(tabelas)))
+                self.linhas_em_buffer -= linhas
+            writer.close()
+            caminhos.append(writer.where)
+        return caminhos
+
+    def fechar(self):
+        for nome_base in {c[1] for c in self._writers}:
+            self.fechar_arquivo_origem(nome_base)
+
+    def _anexar(self, pasta, nome_base, fatia):
+        chave = (pasta, nome_base)
+        if chave not in self._writers:
+            os.makedirs(pasta, exist_ok=True)
+            writer = pq.ParquetWriter(
+                os.path.join(pasta, f"{nome_base}.parquet"), self.esquema,
+                write_page_index=True,  # índices de coluna/página (min/max por página)
+                sorting_columns=self._colunas_ordenadas(),
+            )
+            self._writers[chave] = [writer, {}]
+
+        writer, buffers = self._writers[chave]
+        for tipo, parte in self._separar_tipos(fatia):
+            buffer = buffers.setdefault(tipo, [[], 0])
+            buffer[0].append(parte)
+            buffer[1] += parte.num_rows
+            self.linhas_em_buffer += parte.num_rows
+            if buffer[1] >= self.linhas_por_grupo:
+                # Grava só os row groups completos; o resto continua no buffer
+                # (no 'agrupado', as datas mais recentes, já ordenadas)
+                acumulado = self._ordenar(pa.concat_tables(buffer[0]))
+                completos = (acumulado.num_rows // self.linhas_por_grupo) * self.linhas_por_grupo
+                self._gravar(writer, acumulado.slice(0, completos))
+                resto = acumulado.slice(completos)
+                buffer[:] = [[resto] if resto.num_rows else [], resto.num_rows]
+                self.linhas_em_buffer -= completos
+
+    def _descarregar_maior_buffer(self):
+        # Grava inteiro (num row group menor que linhas_por_grupo) o buffer com mais linhas
+        writer, buffers, tipo = max(
+            ((writer, buffers, tipo) for writer, buffers in self._writers.values() for tipo in buffers),
+            key=lambda item: item[1][item[2]][1],
+        )
+        tabelas, linhas = buffers[tipo]
+        self._gravar(writer, self._ordenar(pa.concat_tables(tabelas)))
+        buffers[tipo] = [[], 0]
+        self.linhas_em_buffer -= linhas
+
+    def _separar_tipos(self, fatia):
+        """Pares (tipo, linhas do tipo) no 'agrupado'; no 'streaming', um único par (None, fatia)."""
+        if self.layout != 'agrupado' or COLUNAS_ORDENACAO[0] not in fatia.column_names:
+            return [(None, fatia)]
+        coluna = fatia.column(COLUNAS_ORDENACAO[0])
+        if pa.types.is_dictionary(coluna.type):
+            coluna = coluna.cast(coluna.type.value_type)
+        indices = pc.sort_indices(coluna)
+        tipos = coluna.take(indices).to_numpy(zero_copy_only=False)
+        inicios = [0] + (np.flatnonzero(tipos[1:] != tipos[:-1]) + 1).tolist() + [len(tipos)]
+        if len(inicios) == 2:
+            return [(tipos[0], fatia)]
+        return [
+            (tipos[inicio], fatia.take(indices.slice(inicio, fim - inicio)))
+            for inicio, fim in zip(inicios[:-1], inicios[1:])
+        ]
+
+    def _ordenar(self, tabela):
+        # No 'agrupado' cada row group é gravado ordenado por tipo e data (ver _colunas_ordenadas)
+        ordem = [col for col in COLUNAS_ORDENACAO if col in tabela.column_names]
+        if self.layout != 'agrupado' or not ordem:
+            return tabela
+        chaves = _decodificar_dicionarios(tabela.select(ordem))
+        return tabela.take(pc.sort_indices(chaves, sort_keys=[(col, 'ascending') for col in ordem]))
+
+    def _gravar(self, writer, tabela):
+        writer.write_table(tabela, row_group_size=self.linhas_por_grupo)
+        self.linhas_gravadas += tabela.num_rows
+
+    def _colunas_ordenadas(self):
+        if self.layout != 'agrupado':
+            return None
+        ordem = [(col, 'ascending') for col in COLUNAS_ORDENACAO if self.esquema.get_field_index(col) != -1]
+        return pq.SortingColumn.from_ordering(self.esquema, ordem) if ordem else None
+
+    def _com_colunas_particao(self, tabela):
+        # Sem a coluna de UF no CSV, os registros vão para a partição 'não informado'
+        for col in COLUNAS_PARTICAO:
+            if col not in tabela.column_names:
+                tabela = tabela.append_column(col, pa.array(['não informado'] * tabela.num_rows))
+        return tabela
+
+    def _conformar_esquema(self, tabela):
+        if self.esquema is None:
+            self.esquema = tabela.schema.remove_metadata()
+            return tabela.replace_schema_metadata(None)
+
+        extras = [c for c in tabela.column_names if self.esquema.get_field_index(c) == -1]
+        if extras:
+            print(f"  AVISO: Colunas fora do esquema descartadas: {extras}")
+        colunas = []
+        for campo in self.esquema:
+            if campo.name in tabela.column_names:
+                colunas.append(tabela.column(campo.name).cast(campo.type))
+            else:
+                colunas.append(pa.nulls(tabela.num_rows, type=campo.type))
+        return pa.Table.from_arrays(colunas, schema=self.esquema)
+
+# --- Manifesto do ETL incremental ---
+# Fica dentro do dataset; arquivos/pastas com prefixo '_' são ignorados pelo pyarrow
+ARQUIVO_MANIFESTO = os.path.join(DIRETORIO_DATASET, NOME_MANIFESTO)
+PASTA_CUBOS_PARCIAIS = os.path.join(DIRETORIO_DATASET, '_cubos')
+PASTA_CUBOS_DEMOGRAFICOS_PARCIAIS = os.path.join(DIRETORIO_DATASET, '_cubos_demograficos')
+PREFIXO_TEMPORARIO = '_tmp_'
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def carregar_manifesto():
+    if not os.path.exists(ARQUIVO_MANIFESTO):
+        return {'versao_formato': VERSAO_FORMATO, 'esquema': None, 'arquivos': {}}
+    with open(ARQUIVO_MANIFESTO, encoding='utf-8') as f:
+        return json.load(f)
+
+def salvar_manifesto(manifesto):
+    """Grava o manifesto de forma atômica (arquivo temporário + os.replace)."""
+    caminho_tmp = ARQUIVO_MANIFESTO + '.tmp'
+    with open(caminho_tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, ARQUIVO_MANIFESTO)
+
+def nova_versao_dados(manifesto):
+    """Registra no manifesto uma nova versão dos dados (invalida os arquivos derivados atuais)."""
+    manifesto['versao_dados'] = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    salvar_manifesto(manifesto)
+
+def esquema_para_texto(esquema):
+    return base64.b64encode(esquema.serialize().to_pybytes()).decode('ascii')
+
+def esquema_de_texto(texto):
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(texto)))
+
+def arquivo_mudou(arquivo_csv, entrada):
+    """
+    Compara o CSV com sua entrada no manifesto. Tamanho e mtime iguais bastam;
+    se mudaram, o hash decide (um 'touch' não força o reprocessamento).
+    """
+    info = os.stat(arquivo_csv)
+    if entrada is None:
+        return True
+    if entrada['tamanho'] == info.st_size and entrada['mtime_ns'] == info.st_mtime_ns:
+        return False
+    if entrada['tamanho'] == info.st_size and entrada['sha256'] == hash_arquivo(arquivo_csv):
+        entrada['mtime_ns'] = info.st_mtime_ns
+        return False
+    return True
+
+def remover_saidas(nome_base, prefixo=''):
+    """Apaga os arquivos do dataset e os cubos parciais gerados por um CSV."""
+    padrao = os.path.join(DIRETORIO_DATASET, '*', '*', f"{prefixo}{nome_base}.parquet")
+    for caminho in glob.glob(padrao):
+        os.remove(caminho)
+        # Partições que ficaram vazias também saem (pasta da UF e, se for o caso, a do ano)
+        pasta = os.path.dirname(caminho)
+        for _ in range(2):
+            if os.listdir(pasta):
+                break
+            os.rmdir(pasta)
+            pasta = os.path.dirname(pasta)
+    if not prefixo:
+        for pasta in (PASTA_CUBOS_PARCIAIS, PASTA_CUBOS_DEMOGRAFICOS_PARCIAIS):
+            caminho = os.path.join(pasta, f"{nome_base}.parquet")
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+def publicar_saidas(nome_base, caminhos_tmp, cubo, cubo_demografico):
+    """Troca as saídas antigas de um CSV pelas novas (gravadas com PREFIXO_TEMPORARIO)."""
+    remover_saidas(nome_base)
+    caminhos_finais = []
+    for caminho_tmp in caminhos_tmp:
+        pasta, nome = os.path.split(caminho_tmp)
+        caminho_final = os.path.join(pasta, nome[len(PREFIXO_TEMPORARIO):])
+        os.replace(caminho_tmp, caminho_final)
+        caminhos_finais.append(os.path.relpath(caminho_final, DIRETORIO_DATASET))
+    for pasta, parcial in ((PASTA_CUBOS_PARCIAIS, cubo), (PASTA_CUBOS_DEMOGRAFICOS_PARCIAIS, cubo_demografico)):
+        os.makedirs(pasta, exist_ok=True)
+        parcial.to_parquet(os.path.join(pasta, f"{nome_base}.parquet"), engine='pyarrow', index=False)
+    return sorted(caminhos_finais)
+
+def ler_cubos_parciais(pasta):
+    return [pd.read_parquet(caminho, engine='pyarrow') for caminho in sorted(glob.glob(os.path.join(pasta, '*.parquet')))]
+
+def gerar_metadados(cubo, cubo_demografico, manifesto):
+    """
+    Metadados do dataset para o app: contagens por valor das colunas de
+    filtro (somando o 'total' dos cubos, sem reler o dataset), intervalo de
+    anos, linhas por arquivo e as primeiras LINHAS_AMOSTRA_METADADOS linhas.
+    """
+    cubos = {'cubo': cubo, 'cubo_demografico': cubo_demografico}
+    contagens = {}
+    for col, nome_cubo in COLUNAS_METADADOS.items():
+        totais = (cubos[nome_cubo].groupby(col, observed=True)['total'].sum()
+                  .sort_values(ascending=False, kind='stable'))
+        # Lista de pares [valor, total]: no JSON as chaves viram texto e o ano deixaria de ser int
+        contagens[col] = [[valor, int(total)] for valor, total in zip(totais.index.tolist(), totais.tolist())]
+
+    anos = [valor for valor, _ in contagens['ano_registro']]
+    # head() lê só os primeiros arquivos do dataset
+    amostra = abrir_dataset().head(LINHAS_AMOSTRA_METADADOS).to_pandas()
+    return {
+        'versao_formato': VERSAO_FORMATO,
+        'versao_dados': manifesto['versao_dados'],
+        'total_linhas': sum(e['linhas'] for e in manifesto['arquivos'].values()),
+        'linhas_por_arquivo': {arquivo: e['linhas'] for arquivo, e in sorted(manifesto['arquivos'].items())},
+        'anos': [min(anos), max(anos)] if anos else None,
+        'contagens': contagens,
+        'amostra': {
+            'colunas': list(amostra.columns),
+            'linhas': json.loads(amostra.to_json(orient='records', date_format='iso', date_unit='s', force_ascii=False)),
+        },
+    }
+
+def salvar_metadados(metadados, caminho=ARQUIVO_METADADOS):
+    """Grava os metadados de forma atômica (arquivo temporário + os.replace)."""
+    caminho_tmp = caminho + '.tmp'
+    with open(caminho_tmp, 'w', encoding='utf-8') as f:
+        json.dump(metadados, f, ensure_ascii=False)
+    os.replace(caminho_tmp, caminho)
+
+def salvar_cubo(cubo, caminho, versao_dados):
+    """
+    Grava um cubo com a versão dos dados nos metadados do Parquet, de forma
+    atômica (na preparação do /admin o arquivo antigo é um hardlink do publicado).
+    """
+    tabela = pa.Table.from_pandas(cubo, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, b'versao_dados': versao_dados.encode()})
+    caminho_tmp = caminho + '.tmp'
+    pq.write_table(tabela, caminho_tmp)
+    os.replace(caminho_tmp, caminho)
+
+# --- Arrow do painel: uma cópia sem compressão das colunas dos gráficos ---
+def _com_dicionario(coluna, dicionario):
+    """Recodifica uma coluna (texto ou dictionary) para usar `dicionario` em todos os chunks."""
+    chunks = []
+    for chunk in coluna.chunks:
+        if pa.types.is_dictionary(chunk.type):
+            indices = pc.index_in(chunk.dictionary, value_set=dicionario).take(chunk.indices)
+        else:
+            indices = pc.index_in(chunk, value_set=dicionario)
+        chunks.append(pa.DictionaryArray.from_arrays(indices, dicionario))
+    return pa.chunked_array(chunks, type=pa.dictionary(pa.int32(), pa.string()))
+
+def gerar_arrow_painel(versao_dados, caminho=ARQUIVO_ARROW_PAINEL, colunas=COLUNAS_ARROW_PAINEL):
+    """
+    Grava as `colunas` do dataset num arquivo Arrow IPC sem compressão,
+    partição (ano, UF) por partição, com o intervalo de linhas de cada uma
+    (e a versão dos dados) nos metadados do esquema: o app filtra ano/UF
+    com slices sem cópia.
+    O formato de arquivo do IPC exige um só dicionário por coluna, então
+    uma primeira passada junta os valores de todas as partições.
+    """
+    dataset = abrir_dataset()
+    tipos = {col: dataset.schema.field(col).type for col in colunas}
+    colunas_texto = [c for c in colunas if pa.types.is_dictionary(tipos[c]) or pa.types.is_string(tipos[c])]
+
+    # 1a passada: linhas por partição (rodapés do Parquet) e valores distintos das colunas de texto
+    linhas_por_particao, valores = {}, {col: set() for col in colunas_texto}
+    for fragmento in dataset.get_fragments():
+        chave_particao = ds.get_partition_keys(fragmento.partition_expression)
+        chave_particao = (chave_particao['ano_registro'], chave_particao['uf_do_municipio_manifestante'])
+        linhas_por_particao[chave_particao] = linhas_por_particao.get(chave_particao, 0) + fragmento.metadata.num_rows
+        tabela = fragmento.to_table(columns=[c for c in colunas_texto if c not in COLUNAS_PARTICAO], schema=dataset.schema)
+        for col in tabela.column_names:
+            for chunk in tabela.column(col).chunks:
+                unicos = chunk.dictionary if pa.types.is_dictionary(chunk.type) else pc.unique(chunk)
+                valores[col].update(unicos.to_pylist())
+    valores['uf_do_municipio_manifestante'] = {uf for _, uf in linhas_por_particao}
+    dicionarios = {col: pa.array(sorted(v for v in valores[col] if v is not None), pa.string()) for col in colunas_texto}
+
+    particoes, inicio = [], 0
+    for ano, uf in sorted(linhas_por_particao):
+        particoes.append([ano, uf, inicio, inicio + linhas_por_particao[(ano, uf)]])
+        inicio += linhas_por_particao[(ano, uf)]
+    esquema = pa.schema(
+        [pa.field(c, pa.dictionary(pa.int32(), pa.string()) if c in colunas_texto else tipos[c]) for c in colunas],
+        metadata={'particoes': json.dumps(particoes, ensure_ascii=False), 'versao_dados': versao_dados},
+    )
+
+    # 2a passada: uma partição por vez (a memória não depende do tamanho do dataset)
+    caminho_tmp = caminho + '.tmp'
+    with pa.OSFile(caminho_tmp, 'wb') as destino, pa.ipc.new_file(destino, esquema) as escritor:
+        for ano, uf, _, _ in particoes:
+            filtro = (ds.field('ano_registro') == ano) & (ds.field('uf_do_municipio_manifestante') == uf)
+            tabela = dataset.to_table(columns=colunas, filter=filtro)
+            tabela = pa.table(
+                [_com_dicionario(tabela.column(c), dicionarios[c]) if c in colunas_texto else tabela.column(c) for c in colunas],
+                schema=esquema,
+            )
+            escritor.write_table(tabela, max_chunksize=LINHAS_POR_GRUPO_PADRAO)
+    # os.replace: quem já mapeou o arquivo antigo continua lendo o antigo até reabrir
+    os.replace(caminho_tmp, caminho)
+    return inicio
+
 # --- Função Principal do ETL ---
-def executar_etl():
-    ARQUIVO_PARQUET_FINAL = 'ouvidoria.parquet'
-    
+def executar_etl(num_workers=1, linhas_por_grupo=LINHAS_POR_GRUPO_PADRAO, completo=False, layout='agrupado', motor='arrow'):
+    """
+    Roda o ETL de forma incremental: só os CSVs novos ou alterados desde a
+    última execução (segundo o manifesto) são processados, e só as saídas
+    deles são substituídas. Cada CSV concluído é registrado no manifesto na
+    hora, então uma execução interrompida continua de onde parou.
+
+    Com `completo=True` o manifesto é ignorado e tudo é reprocessado.
+    `layout` escolhe a organização interna dos arquivos (ver LAYOUTS) e
+    `motor` a implementação da limpeza de texto (ver MOTORES_LIMPEZA).
+    Com `num_workers` > 1, os CSVs são lidos e limpos em paralelo por um
+    pool de processos (0 = um processo por núcleo).
+    Os erros só são impressos; retorna True se o ETL chegou ao fim.
+    """
+    if num_workers == 0:
+        num_workers = os.cpu_count() or 1
+
     caminho_arquivos = sorted(glob.glob('src/dados/*.csv'))
     
     if not caminho_arquivos:
         print("ERRO: Nenhum arquivo CSV encontrado em 'src/dados/'")
         return
 
-    print(f"Iniciando ETL para {len(caminho_arquivos)} arquivos CSV...")
+    if not completo and carregar_manifesto().get('versao_formato') != VERSAO_FORMATO:
+        print("Manifesto de uma versão anterior do formato de saída: reprocessando tudo.")
+        completo = True
 
-    if os.path.exists(ARQUIVO_PARQUET_FINAL):
-        try:
-            os.remove(ARQUIVO_PARQUET_FINAL)
-            print(f"Arquivo '{ARQUIVO_PARQUET_FINAL}' antigo removido.")
-        except PermissionError:
-            print(f"AVISO: Não foi possível remover '{ARQUIVO_PARQUET_FINAL}'. Verifique se ele está aberto.")
+    if completo and os.path.exists(DIRETORIO_DATASET):
+        # Publicado pelo /admin, o dataset é um link para a pasta da versão
+        pasta_versao = os.path.realpath(DIRETORIO_DATASET)
+        if os.path.islink(DIRETORIO_DATASET):
+            os.remove(DIRETORIO_DATASET)
+        shutil.rmtree(pasta_versao)
+        print(f"Dataset '{DIRETORIO_DATASET}' antigo removido (execução completa).")
+    os.makedirs(DIRETORIO_DATASET, exist_ok=True)
 
-    # --- NOVA ESTRATÉGIA: Lista para acumular os DataFrames ---
-    lista_dfs_processados = []
+    manifesto = carregar_manifesto()
+    esquema = esquema_de_texto(manifesto['esquema']) if manifesto['esquema'] else None
 
-    for i, arquivo_csv in enumerate(caminho_arquivos):
-        print(f"Processando arquivo {i+1}/{len(caminho_arquivos)}: {arquivo_csv}")
-        
-        try:
-            df_temp = pd.read_csv(
-                arquivo_csv, 
-                sep=';', 
-                low_memory=False, 
-                dtype=DTYPE_MAP
-            )
-        except UnicodeDecodeError:
-            df_temp = pd.read_csv(
-                arquivo_csv, 
-                sep=';', 
-                encoding='latin-1', 
-                low_memory=False, 
-                dtype=DTYPE_MAP
+    # Restos de uma execução interrompida
+    for caminho_tmp in glob.glob(os.path.join(DIRETORIO_DATASET, '*', '*', PREFIXO_TEMPORARIO + '*')):
+        os.remove(caminho_tmp)
+
+    arquivos_removidos = sorted(set(manifesto['arquivos']) - set(caminho_arquivos))
+    arquivos_pendentes = [a for a in caminho_arquivos if arquivo_mudou(a, manifesto['arquivos'].get(a))]
+    dados_mudaram = bool(arquivos_removidos or arquivos_pendentes)
+    # Versão nova ANTES de mexer no dataset: se a execução parar no meio, os
+    # cubos/Arrow/metadados antigos deixam de valer e o app lê o dataset
+    if dados_mudaram or 'versao_dados' not in manifesto:
+        nova_versao_dados(manifesto)
+
+    # CSVs que sumiram de 'src/dados/': remove suas saídas
+    for arquivo_csv in arquivos_removidos:
+        print(f"Arquivo removido da origem: {arquivo_csv}. Apagando suas saídas...")
+        remover_saidas(os.path.splitext(os.path.basename(arquivo_csv))[0])
+        del manifesto['arquivos'][arquivo_csv]
+        salvar_manifesto(manifesto)
+
+    print(f"Iniciando ETL: {len(arquivos_pendentes)} de {len(caminho_arquivos)} arquivos CSV novos ou alterados...")
+
+    escritor = EscritorDatasetParticionado(
+        DIRETORIO_DATASET, linhas_por_grupo=linhas_por_grupo, esquema=esquema, layout=layout
+    )
+
+    if num_workers > 1 and len(arquivos_pendentes) > 1:
+        print(f"Modo paralelo: {num_workers} processos.")
+        pool = ProcessPoolExecutor(max_workers=num_workers)
+        # Resultados na ordem dos arquivos, não na ordem de término: saída determinística
+        resultados = mapear_em_ordem(pool, partial(processar_arquivo_csv, motor=motor), arquivos_pendentes, janela=num_workers)
+        blocos_por_arquivo = (_blocos_do_resultado(resultado) for resultado in resultados)
+    else:
+        pool = None
+        # Modo serial: cada bloco do CSV vai da leitura à gravação sem juntar o arquivo inteiro
+        blocos_por_arquivo = (_blocos_do_csv(arquivo_csv, motor) for arquivo_csv in arquivos_pendentes)
+
+    try:
+        for i, (arquivo_csv, blocos) in enumerate(zip(arquivos_pendentes, blocos_por_arquivo)):
+            print(f"Processando arquivo {i+1}/{len(arquivos_pendentes)}: {arquivo_csv}")
+
+            # --- GRAVA O ARQUIVO LIMPO E DESCARTA (memória não cresce com o nº de CSVs) ---
+            nome_base = os.path.splitext(os.path.basename(arquivo_csv))[0]
+            nome_tmp = PREFIXO_TEMPORARIO + nome_base
+            linhas, datas, bytes_latin1, cubos, cubos_demograficos = 0, {}, 0, [], []
+            try:
+                for bloco in blocos:
+                    somar_relatorios_datas(datas, bloco['datas'])
+                    bytes_latin1 += bloco['bytes_latin1']
+                    if bloco['tabela'] is None:
+                        continue
+                    escritor.escrever(bloco['tabela'], nome_tmp)
+                    linhas += bloco['tabela'].num_rows
+                    cubos.append(bloco['cubo'])
+                    cubos_demograficos.append(bloco['cubo_demografico'])
+                caminhos_tmp = escritor.fechar_arquivo_origem(nome_tmp)
+            except Exception as e:
+                print(f"  ERRO ao processar {arquivo_csv}: {e}")
+                escritor.fechar_arquivo_origem(nome_tmp)
+                remover_saidas(nome_base, prefixo=PREFIXO_TEMPORARIO)
+                continue
+
+            if bytes_latin1:
+                print(f"  AVISO: {bytes_latin1} bytes fora do UTF-8 lidos como latin-1.")
+            for col, info_data in datas.items():
+                formato = info_data['formato'] or 'não detectado'
+                inferencia = ''
+                if info_data['blocos_inferencia']:
+                    inferencia = f", {info_data['blocos_inferencia']}/{info_data['blocos']} blocos inferidos pelo pandas"
+                print(f"  {col}: formato {formato}{inferencia}, {info_data['falhas']} valores não convertidos")
+            if linhas == 0:
+                print(f"  AVISO: Arquivo {arquivo_csv} vazio após limpeza.")
+                continue
+
+            # Publica as saídas do arquivo e registra no manifesto (ponto de retomada)
+            arquivos_saida = publicar_saidas(
+                nome_base, caminhos_tmp,
+                combinar_cubos(cubos, DIMENSOES_CUBO), combinar_cubos(cubos_demograficos, DIMENSOES_CUBO_DEMOGRAFICO)
             )
-        except Exception as e:
-            print(f"  ERRO ao ler {arquivo_csv}: {e}")
-            continue 
-
-        # Limpa o DataFrame
-        df_limpo = limpar_dataframe(df_temp)
-
-        # Correção final de tipos
-        for col in df_limpo.columns:
-            if df_limpo[col].dtype == "Int64":
-                df_limpo[col] = df_limpo[col].fillna(0).astype("int64")
-            elif df_limpo[col].dtype == "boolean":
-                df_limpo[col] = df_limpo[col].fillna(False).astype(bool)
-        
-        if df_limpo.empty:
-            print(f"  AVISO: Arquivo {arquivo_csv} vazio após limpeza.")
-            continue
-            
-        # --- ADICIONA NA LISTA EM VEZ DE SALVAR ---
-        lista_dfs_processados.append(df_limpo)
-
-    # --- ETAPA FINAL: CONCATENA E SALVA DE UMA VEZ ---
-    if not lista_dfs_processados:
+            info = os.stat(arquivo_csv)
+            manifesto['esquema'] = esquema_para_texto(escritor.esquema)
+            manifesto['arquivos'][arquivo_csv] = {
+                'tamanho': info.st_size,
+                'mtime_ns': info.st_mtime_ns,
+                'sha256': hash_arquivo(arquivo_csv),
+                'linhas': linhas,
+                'datas': datas,
+                'arquivos_saida': arquivos_saida,
+            }
+            salvar_manifesto(manifesto)
+            del blocos, cubos, cubos_demograficos
+    finally:
+        escritor.fechar()
+        if pool is not None:
+            pool.shutdown()
+
+    # --- ETAPA FINAL: RECOMBINA OS CUBOS ---
+    if not manifesto['arquivos']:
         print("\nERRO: Nenhum dado foi processado com sucesso. Verifique seus arquivos CSV.")
         return
 
-    print("\nConcatenando todos os dados (isso pode levar alguns segundos)...")
     try:
-        # Junta todos os pedaços em um único DataFrame Gigante
-        df_final = pd.concat(lista_dfs_processados, ignore_index=True)
+        # Versão final ANTES dos cubos: resultados guardados em cache durante a
+        # execução (com os dados pela metade) ficam com a versão intermediária
+        if dados_mudaram:
+            nova_versao_dados(manifesto)
+        else:
+            salvar_manifesto(manifesto)
+        versao_dados = manifesto['versao_dados']
+        total_linhas = sum(e['linhas'] for e in manifesto['arquivos'].values())
+        print(f"\nDataset '{DIRETORIO_DATASET}' atualizado: {total_linhas} linhas de {len(manifesto['arquivos'])} arquivos.")
         
-        print(f"Salvando arquivo final '{ARQUIVO_PARQUET_FINAL}' com {len(df_final)} linhas...")
-        # Salva de uma vez só (sem append, evitando o erro)
-        df_final.to_parquet(ARQUIVO_PARQUET_FINAL, engine='pyarrow')
-        
-        print(f"ETL Concluído com SUCESSO! Dados salvos em '{ARQUIVO_PARQUET_FINAL}'.")
+        cubo = combinar_cubos(ler_cubos_parciais(PASTA_CUBOS_PARCIAIS), DIMENSOES_CUBO)
+        salvar_cubo(cubo, ARQUIVO_CUBO, versao_dados)
+        cubo_demografico = combinar_cubos(ler_cubos_parciais(PASTA_CUBOS_DEMOGRAFICOS_PARCIAIS), DIMENSOES_CUBO_DEMOGRAFICO)
+        salvar_cubo(cubo_demografico, ARQUIVO_CUBO_DEMOGRAFICO, versao_dados)
+        print(f"Cubos salvos: '{ARQUIVO_CUBO}' ({len(cubo)} linhas) e '{ARQUIVO_CUBO_DEMOGRAFICO}' ({len(cubo_demografico)} linhas).")
+
+        linhas_arrow = gerar_arrow_painel(versao_dados)
+        print(f"Arrow do painel salvo em '{ARQUIVO_ARROW_PAINEL}' ({linhas_arrow} linhas, {os.path.getsize(ARQUIVO_ARROW_PAINEL) / 1024**2:.0f} MB).")
+
+        salvar_metadados(gerar_metadados(cubo, cubo_demografico, manifesto))
+        print(f"Metadados salvos em '{ARQUIVO_METADADOS}' ({os.path.getsize(ARQUIVO_METADADOS) / 1024:.0f} KB).")
+
+        print(f"ETL Concluído com SUCESSO! Dados salvos em '{DIRETORIO_DATASET}' (versão {versao_dados}).")
+        return True
         
     except Exception as e:
         print(f"ERRO FATAL ao salvar o arquivo final: {e}")
 
+# --- Verificação: os dois motores de limpeza geram a mesma saída ---
+def comparar_motores_limpeza():
+    """
+    Limpa cada CSV de 'src/dados/' com os dois motores, confere que os
+    resultados são idênticos (valores, dtypes e ordem das categorias) e
+    mostra o tempo de cada um. Retorna True se todos forem iguais.
+    """
+    caminho_arquivos = sorted(glob.glob('src/dados/*.csv'))
+    if not caminho_arquivos:
+        print("ERRO: Nenhum arquivo CSV encontrado em 'src/dados/'")
+        return False
+
+    todos_iguais = True
+    tempos = {motor: 0.0 for motor in MOTORES_LIMPEZA}
+    for arquivo_csv in caminho_arquivos:
+        df_bruto = ler_csv(arquivo_csv)
+        saidas = {}
+        for motor in MOTORES_LIMPEZA:
+            inicio = time.perf_counter()
+            saidas[motor] = limpar_dataframe(df_bruto.copy(), motor=motor)
+            tempos[motor] += time.perf_counter() - inicio
+
+        try:
+            pd.testing.assert_frame_equal(saidas['arrow'], saidas['pandas'], check_exact=True)
+            # Mesma tabela Arrow = mesmos bytes no Parquet
+            iguais = pa.Table.from_pandas(saidas['arrow']).equals(pa.Table.from_pandas(saidas['pandas']), check_metadata=True)
+        except AssertionError as e:
+            print(f"  DIFERENÇA em {arquivo_csv}: {e}")
+            iguais = False
+        print(f"{arquivo_csv}: {'idêntico' if iguais else 'DIFERENTE'}")
+        todos_iguais = todos_iguais and iguais
+
+    for motor, segundos in tempos.items():
+        print(f"Motor '{motor}': {segundos:.2f}s")
+    print(f"Ganho do motor 'arrow': {tempos['pandas'] / max(tempos['arrow'], 1e-9):.1f}x")
+    return todos_iguais
+
 # --- Roda o script ---
 if __name__ == '__main__':
-    executar_etl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ETL dos CSVs da Ouvidoria para o dataset Parquet.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processos para ler/limpar os CSVs em paralelo (0 = todos os núcleos).")
+    parser.add_argument('--linhas-por-grupo', type=int, default=LINHAS_POR_GRUPO_PADRAO,
+                        help="Linhas por row group nos arquivos Parquet gerados.")
+    parser.add_argument('--completo', action='store_true',
+                        help="Ignora o manifesto e reprocessa todos os CSVs.")
+    parser.add_argument('--layout', choices=LAYOUTS, default='agrupado',
+                        help="'agrupado' ordena por tipo/data com um tipo por row group; 'streaming' mantém a ordem do CSV.")
+    parser.add_argument('--motor', choices=MOTORES_LIMPEZA, default='arrow',
+                        help="Implementação da limpeza de texto (as duas geram a mesma saída).")
+    parser.add_argument('--comparar-motores', action='store_true',
+                        help="Só confere que os motores de limpeza geram saídas idênticas e compara os tempos.")
+    args = parser.parse_args()
+    if args.comparar_motores:
+        raise SystemExit(0 if comparar_motores_limpeza() else 1)
+    executar_etl(num_workers=args.workers, linhas_por_grupo=args.linhas_por_grupo,
+                 completo=args.completo, layout=args.layout, motor=args.motor)
@@ -0,0 +1,339 @@
+# explorador_dados.py
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from cache_consultas import CacheLRUDados
+from dataset_ouvidoria import DIRETORIO_DATASET, abrir_dataset, versao_dataset
+
+# ============================================================
+# Paginação no servidor da tabela /dados (DataTable com page/sort/filter 'custom')
+#
+# As linhas do dataset são numeradas na ordem dos row groups (catálogo). Para
+# cada combinação filtro + ordenação guardamos um índice de paginação: o
+# número de todas as linhas filtradas, já na ordem pedida. Ele é montado uma
+# vez (lendo só as colunas do filtro e da ordenação, com os filtros empurrados
+# para a poda de partições/row groups); depois qualquer página, por mais
+# funda, é um fatiamento do índice + a leitura dos row groups daquelas linhas.
+# ============================================================
+LIMITE_CACHE_INDICES = 256 * 1024 * 1024   # Bytes dos índices de paginação em cache
+LIMITE_CACHE_GRUPOS = 256 * 1024 * 1024    # Bytes dos row groups decodificados em cache
+
+# Operadores do filter_query do DataTable (mesma tabela da documentação do Dash)
+OPERADORES_FILTRO = [
+    ["ge ", ">="], ["le ", "<="], ["lt ", "<"], ["gt ", ">"],
+    ["ne ", "!="], ["eq ", "="], ["contains "], ["datestartswith "],
+]
+
+
+def separar_parte_filtro(parte):
+    """'{coluna} op valor' -> (coluna, op, valor), como no exemplo de filtro 'custom' do Dash."""
+    for tipo_operador in OPERADORES_FILTRO:
+        for operador in tipo_operador:
+            if operador in parte:
+                nome, valor = parte.split(operador, 1)
+                nome = nome[nome.find("{") + 1: nome.rfind("}")]
+                valor = valor.strip()
+                v0 = valor[0] if valor else ""
+                if v0 and v0 == valor[-1] and v0 in ("'", '"', "`"):
+                    valor = valor[1:-1].replace("\\" + v0, v0)
+                else:
+                    try:
+                        valor = float(valor)
+                    except ValueError:
+                        pass
+                return nome, tipo_operador[0].strip(), valor
+    return None, None, None
+
+
+def _fim_do_prefixo_data(inicio, prefixo):
+    # '2024' -> +1 ano, '2024-03' -> +1 mês, '2024-03-05' -> +1 dia
+    partes = len(str(prefixo).split("-"))
+    if partes == 1:
+        return inicio + pd.DateOffset(years=1)
+    if partes == 2:
+        return inicio + pd.DateOffset(months=1)
+    return inicio + pd.Timedelta(days=1)
+
+
+def expressao_filtro(filter_query, esquema):
+    """
+    Converte o filter_query do DataTable numa expressão do pyarrow.dataset.
+    Colunas desconhecidas são ignoradas. Retorna (expressão ou None, colunas usadas).
+    """
+    expressao = None
+    colunas = set()
+    for parte in (filter_query or "").split(" && "):
+        coluna, operador, valor = separar_parte_filtro(parte)
+        if coluna not in esquema.names:
+            continue
+        campo = ds.field(coluna)
+        tipo = esquema.field(coluna).type
+        if pa.types.is_dictionary(tipo):
+            tipo = tipo.value_type
+
+        if operador == "contains":
+            # match_substring não aceita dictionary: categorias e números viram texto
+            texto = campo if pa.types.is_string(esquema.field(coluna).type) else campo.cast(pa.string())
+            termo = pc.match_substring(texto, str(valor).removesuffix(".0") if isinstance(valor, float) else str(valor))
+        elif operador == "datestartswith":
+            if not pa.types.is_timestamp(tipo):
+                continue
+            inicio = pd.Timestamp(str(valor).removesuffix(".0"))
+            termo = (campo >= inicio.to_datetime64()) & (campo < _fim_do_prefixo_data(inicio, valor).to_datetime64())
+        else:
+            if pa.types.is_timestamp(tipo):
+                valor = pd.Timestamp(str(valor)).to_datetime64()
+            elif pa.types.is_boolean(tipo):
+                valor = str(valor).lower() in ("true", "1", "1.0", "sim")
+            elif pa.types.is_integer(tipo):
+                if not isinstance(valor, float):
+                    continue
+                valor = int(valor) if valor.is_integer() else valor
+            elif pa.types.is_string(tipo) and isinstance(valor, float):
+                valor = str(valor).removesuffix(".0")
+            termo = {
+                "ge": campo >= valor, "le": campo <= valor, "lt": campo < valor,
+                "gt": campo > valor, "ne": campo != valor, "eq": campo == valor,
+            }[operador]
+        expressao = termo if expressao is None else expressao & termo
+        colunas.add(coluna)
+    return expressao, colunas
+
+
+def chave_ordenacao(coluna):
+    """
+    Chave numérica (numpy) com a mesma ordem da coluna + máscara de nulos.
+    Texto, categorias e datas viram o posto do valor entre os valores
+    distintos: o argsort fica sobre inteiros pequenos em vez de strings.
+    """
+    tipo = coluna.type
+    if pa.types.is_dictionary(tipo):
+        tipo = tipo.value_type
+    if pa.types.is_string(tipo) or pa.types.is_large_string(tipo) or pa.types.is_timestamp(tipo):
+        tipo_valores = tipo if pa.types.is_timestamp(tipo) else pa.string()
+        pedacos = [c if pa.types.is_dictionary(c.type) else c.dictionary_encode() for c in coluna.chunks]
+        if not pedacos:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+        dicionarios = [p.dictionary.cast(tipo_valores) for p in pedacos]
+        distintos = pc.unique(pa.concat_arrays(dicionarios))
+        distintos = distintos.take(pc.sort_indices(distintos))
+        coluna = pa.chunked_array(
+            [pc.index_in(d, value_set=distintos).take(p.indices) for d, p in zip(dicionarios, pedacos)],
+            type=pa.int32(),
+        )
+    elif pa.types.is_boolean(tipo):
+        coluna = coluna.cast(pa.int64())
+
+    nulos = coluna.is_null().to_numpy(zero_copy_only=False)
+    valores = coluna.fill_null(0).to_numpy()
+    if valores.dtype.kind == "f":
+        nulos |= np.isnan(valores)
+    return valores, nulos
+
+
+def ordenar_posicoes(chaves):
+    """
+    Argsort estável por uma ou mais colunas, dadas como chaves
+    [(valores, nulos, descendente), ...] (a primeira manda). Empates ficam
+    na ordem do disco e os nulos de cada coluna vão para o fim.
+    """
+    if len(chaves) > 1:
+        # np.lexsort é estável e usa a última chave como a principal
+        ordem_lexsort = []
+        for valores, nulos, descendente in reversed(chaves):
+            if descendente:
+                valores = -valores.astype(np.float64 if valores.dtype.kind == "f" else np.int64)
+            ordem_lexsort += [valores, nulos]
+        return np.lexsort(ordem_lexsort)
+
+    valores, nulos, descendente = chaves[0]
+    presentes = np.flatnonzero(~nulos)
+    chave = valores[presentes]
+    if chave.dtype.kind in "iu" and len(chave) and chave.min() >= 0 and chave.max() < 2 ** 16:
+        # Postos (poucos valores distintos): em 16 bits o argsort estável do NumPy é um radix sort
+        chave = chave.astype(np.uint16)
+        if descendente:
+            chave = chave.max() - chave
+    elif descendente:
+        # Chave negada em vez de inverter o resultado: os empates continuam na ordem do disco
+        chave = -chave.astype(np.float64 if chave.dtype.kind == "f" else np.int64)
+    ordem = np.argsort(chave, kind="stable")
+    return np.concatenate([presentes[ordem], np.flatnonzero(nulos)])
+
+
+def tipo_coluna_tabela(tipo):
+    """Tipo da coluna no DataTable ('numeric', 'datetime' ou 'text'), que define o operador padrão do filtro."""
+    if pa.types.is_dictionary(tipo):
+        tipo = tipo.value_type
+    if pa.types.is_timestamp(tipo):
+        return "datetime"
+    if pa.types.is_integer(tipo) or pa.types.is_floating(tipo):
+        return "numeric"
+    return "text"
+
+
+class _CatalogoGrupos:
+    """Row groups do dataset em ordem fixa, com a linha global onde cada um começa."""
+
+    def __init__(self, caminho):
+        self.dataset = abrir_dataset(caminho)
+        self.fragmentos = []   # (fragmento, id do row group)
+        inicios = [0]
+        self._grupo_por_chave = {}
+        for fragmento in self.dataset.get_fragments():
+            for row_group in fragmento.row_groups:
+                self._grupo_por_chave[(fragmento.path, row_group.id)] = len(self.fragmentos)
+                self.fragmentos.append((fragmento, row_group.id))
+                inicios.append(inicios[-1] + row_group.num_rows)
+        self.inicios = np.array(inicios, dtype=np.int64)
+        self.total_linhas = int(self.inicios[-1])
+
+    def grupo(self, fragmento, id_row_group):
+        return self._grupo_por_chave[(fragmento.path, id_row_group)]
+
+    def localizar(self, linhas):
+        """Linhas globais -> (índice do row group, linha dentro do row group)."""
+        grupos = np.searchsorted(self.inicios, linhas, side="right") - 1
+        return grupos, linhas - self.inicios[grupos]
+
+
+class ExploradorDados:
+    """
+    Páginas do dataset com filtro, ordenação e offset/limit feitos no
+    servidor. Seguro para uso concorrente pelos callbacks.
+    """
+
+    def __init__(self, caminho=DIRETORIO_DATASET,
+                 limite_indices=LIMITE_CACHE_INDICES, limite_grupos=LIMITE_CACHE_GRUPOS):
+        self.caminho = caminho
+        self.indices = CacheLRUDados(limite_indices)
+        self.limite_grupos = limite_grupos
+        self._grupos = OrderedDict()   # (versão, índice do row group) -> pa.Table
+        self._bytes_grupos = 0
+        self._catalogo = None          # (versão, _CatalogoGrupos)
+        self._lock = threading.Lock()
+
+    def _versao(self):
+        # Um novo ETL (ou uma nova pasta publicada pelo /admin) muda a versão e invalida tudo
+        pasta = os.path.realpath(self.caminho)
+        return pasta, versao_dataset(pasta)
+
+    def catalogo(self):
+        versao = self._versao()
+        with self._lock:
+            if self._catalogo is not None and self._catalogo[0] == versao:
+                return versao, self._catalogo[1]
+        catalogo = _CatalogoGrupos(versao[0])
+        with self._lock:
+            self._catalogo = (versao, catalogo)
+            self._grupos.clear()
+            self._bytes_grupos = 0
+        return versao, catalogo
+
+    def colunas(self):
+        """Colunas do DataTable, com o tipo de cada uma."""
+        _, catalogo = self.catalogo()
+        return [
+            {"name": campo.name.replace("_", " ").title(), "id": campo.name, "type": tipo_coluna_tabela(campo.type)}
+            for campo in catalogo.dataset.schema
+        ]
+
+    def _montar_indice(self, catalogo, expressao, colunas_filtro, ordem):
+        """
+        Linhas globais que passam no filtro, na ordem pedida por `ordem`
+        ([(coluna, descendente), ...]); lê só as colunas necessárias.
+        """
+        colunas = sorted(set(colunas_filtro) | {coluna for coluna, _ in ordem})
+
+        linhas, pedacos_ordem = [], {coluna: [] for coluna, _ in ordem}
+        # Partições e row groups fora do filtro nem são lidos (poda pelo caminho e por min/max)
+        for fragmento in catalogo.dataset.get_fragments(filter=expressao):
+            partes = (fragmento.split_by_row_group(filter=expressao, schema=catalogo.dataset.schema)
+                      if expressao is not None else [fragmento.subset(row_group_ids=[rg.id]) for rg in fragmento.row_groups])
+            for parte in partes:
+                id_row_group = parte.row_groups[0].id
+                inicio = catalogo.inicios[catalogo.grupo(fragmento, id_row_group)]
+                tabela = parte.to_table(columns=colunas, schema=catalogo.dataset.schema)
+                if expressao is not None:
+                    # Posições dentro do row group preservadas: o filtro por linha é aplicado aqui
+                    tabela = tabela.append_column("__linha", pa.array(np.arange(tabela.num_rows, dtype=np.int64)))
+                    tabela = tabela.filter(expressao)
+                    posicoes = tabela.column("__linha").to_numpy()
+                else:
+                    posicoes = np.arange(tabela.num_rows, dtype=np.int64)
+                linhas.append(inicio + posicoes)
+                for coluna, pedacos in pedacos_ordem.items():
+                    pedacos.extend(tabela.column(coluna).chunks)
+
+        linhas = np.concatenate(linhas) if linhas else np.zeros(0, dtype=np.int64)
+        if ordem and len(linhas):
+            chaves = []
+            for coluna, descendente in ordem:
+                tipo = catalogo.dataset.schema.field(coluna).type
+                chaves.append((*chave_ordenacao(pa.chunked_array(pedacos_ordem[coluna], type=tipo)), descendente))
+            linhas = linhas[ordenar_posicoes(chaves)]
+        return pd.DataFrame({"linha": linhas})
+
+    def _ler_grupo(self, versao, catalogo, indice_grupo):
+        chave = (versao, indice_grupo)
+        with self._lock:
+            tabela = self._grupos.get(chave)
+            if tabela is not None:
+                self._grupos.move_to_end(chave)
+                return tabela
+        fragmento, id_row_group = catalogo.fragmentos[indice_grupo]
+        tabela = fragmento.subset(row_group_ids=[id_row_group]).to_table(schema=catalogo.dataset.schema)
+        with self._lock:
+            if chave not in self._grupos and tabela.nbytes <= self.limite_grupos:
+                self._grupos[chave] = tabela
+                self._bytes_grupos += tabela.nbytes
+                while self._bytes_grupos > self.limite_grupos:
+                    _, removida = self._grupos.popitem(last=False)
+                    self._bytes_grupos -= removida.nbytes
+        return tabela
+
+    def pagina(self, pagina_atual, tamanho_pagina, ordenacao=None, filter_query=""):
+        """
+        Retorna (DataFrame da página, total de linhas filtradas).
+        `ordenacao` é o sort_by do DataTable (uma ou mais colunas, a primeira manda).
+        """
+        versao, catalogo = self.catalogo()
+        expressao, colunas_filtro = expressao_filtro(filter_query, catalogo.dataset.schema)
+        ordem = tuple(
+            (item["column_id"], item["direction"] == "desc")
+            for item in (ordenacao or []) if item["column_id"] in catalogo.dataset.schema.names
+        )
+
+        inicio = pagina_atual * tamanho_pagina
+        if expressao is None and not ordem:
+            # Sem filtro nem ordenação o índice é a própria numeração das linhas
+            total = catalogo.total_linhas
+            linhas = np.arange(inicio, min(inicio + tamanho_pagina, total), dtype=np.int64)
+        else:
+            chave = (versao, str(expressao), ordem)
+            indice = self.indices.obter_ou_carregar(
+                chave, lambda: self._montar_indice(catalogo, expressao, colunas_filtro, ordem)
+            )
+            total = len(indice)
+            linhas = indice["linha"].to_numpy()[inicio:inicio + tamanho_pagina]
+
+        if len(linhas) == 0:
+            return pd.DataFrame(columns=catalogo.dataset.schema.names), total
+
+        grupos, posicoes = catalogo.localizar(linhas)
+        pedacos, ordem_na_pagina = [], []
+        for indice_grupo in np.unique(grupos):
+            selecao = np.flatnonzero(grupos == indice_grupo)
+            tabela = self._ler_grupo(versao, catalogo, int(indice_grupo))
+            pedacos.append(tabela.take(pa.array(posicoes[selecao])))
+            ordem_na_pagina.append(selecao)
+        pagina = pa.concat_tables(pedacos, promote_options="permissive")
+        pagina = pagina.take(pa.array(np.argsort(np.concatenate(ordem_na_pagina))))
+        return pagina.to_pandas(), total
@@ -0,0 +1,30 @@
+# features_modelo.py
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# Features do modelo de satisfação. Ficam num módulo próprio porque o
+# modelo salvo (joblib) referencia estas funções: o app precisa conseguir
+# importá-las ao carregar o modelo, sem rodar o ml_classificacao.py.
+# ============================================================
+FEATURES_TEXTO = 'assunto'
+FEATURES_CATEGORICAS_MODELO = [
+    'tipo_manifestacao', 'nome_orgao', 'genero', 
+    'faixa_etaria', 'raca_cor', 'uf_do_municipio_manifestante'
+]
+COLUNAS_MODELO = FEATURES_CATEGORICAS_MODELO + [FEATURES_TEXTO]
+
+
+def preparar_features(df):
+    """Mesma preparação do treino em memória: categóricas e assunto como texto."""
+    X = pd.DataFrame(index=df.index)
+    for col in FEATURES_CATEGORICAS_MODELO:
+        X[col] = df[col].astype(str).fillna('não informado')
+    X[FEATURES_TEXTO] = df[FEATURES_TEXTO].astype(str).fillna('sem assunto')
+    return X
+
+
+def tokens_categoricos(X):
+    """Cada linha vira a lista ['coluna=valor', ...] usada pelo FeatureHasher."""
+    tokens = [(col + '=' + X[col].astype(str)).to_numpy(dtype=object) for col in X.columns]
+    return np.column_stack(tokens).tolist() if tokens else [[] for _ in range(len(X))]
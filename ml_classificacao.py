@@ -3,15 +3,20 @@ import joblib
 import re 
 import time # Para medir o tempo
 import sys
+import argparse
+import os
+import numpy as np
+import scipy.sparse as sp
 
 # Tentar importar scikit-learn; se não estiver disponível, mostrar instrução clara.
 try:
-    from sklearn.model_selection import train_test_split
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.preprocessing import OneHotEncoder
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    from sklearn.feature_extraction import FeatureHasher
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer, HashingVectorizer
+    from sklearn.preprocessing import OneHotEncoder, FunctionTransformer
     from sklearn.compose import ColumnTransformer
     from sklearn.pipeline import Pipeline
-    from sklearn.linear_model import LogisticRegression
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
     from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
 except Exception as e:
     print("ERRO: scikit-learn não pode ser importado. Instale ou atualize com: pip install -U scikit-learn")
@@ -19,69 +24,83 @@ except Exception as e:
 
 import warnings
 
+from dataset_ouvidoria import DIRETORIO_DATASET, iterar_lotes, ler_dataset
+from pontuador_compacto import MODELO_COMPACTO, PontuadorCompacto
+from features_modelo import (
+    COLUNAS_MODELO,
+    FEATURES_CATEGORICAS_MODELO,
+    FEATURES_TEXTO,
+    preparar_features,
+    tokens_categoricos
+)
+
 #warnings.filterwarnings('ignore', category=FutureWarning)
 
 # --- Constantes ---
-ARQUIVO_PARQUET = "ouvidoria.parquet"
 MODELO_SALVO = "modelo_satisfacao.joblib"
 
-def treinar_e_salvar_modelo():
-    """
-    Função completa (v3) com logs detalhados para
-    diagnosticar lentidão.
-    """
-    start_total = time.time()
-    print(f"Iniciando o processo de ML (v3 - com logs detalhados)...")
-    
+# --- Modo tuning (busca em grade com validação cruzada) ---
+GRADE_TFIDF = [
+    {'max_features': 500, 'ngram_range': (1, 1)},
+    {'max_features': 1000, 'ngram_range': (1, 2)},
+    {'max_features': 5000, 'ngram_range': (1, 2)},
+]
+GRADE_C = [0.1, 1.0, 10.0]
+N_FOLDS_TUNING = 5
+RESULTADOS_TUNING = "resultados_tuning.csv"
+
+# --- Modo streaming (treino fora da memória) ---
+TAMANHO_LOTE_TREINO = 64 * 1024
+FRACAO_TESTE = 0.25
+N_FEATURES_TEXTO = 2 ** 20
+N_FEATURES_CATEGORICAS = 2 ** 18
+
+def construir_pipeline(features_categoricas=FEATURES_CATEGORICAS_MODELO, max_features=1000, ngram_range=(1, 2), C=1.0):
+    """Pipeline TF-IDF (assunto) + OneHot (categóricas) + LogisticRegression."""
+    preprocessor_texto = TfidfVectorizer(max_features=max_features, stop_words=None, ngram_range=ngram_range)
+    preprocessor_categorico = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
+    preprocessor_combinado = ColumnTransformer(
+        transformers=[
+            ('texto', preprocessor_texto, FEATURES_TEXTO),
+            ('categorico', preprocessor_categorico, list(features_categoricas))
+        ],
+        remainder='drop' 
+    )
+    return Pipeline(steps=[
+        ('preprocessor', preprocessor_combinado),
+        ('classifier', LogisticRegression(C=C, random_state=42, max_iter=1000, class_weight='balanced'))
+    ])
+
+
+def carregar_dados_treino():
+    """Etapas 1 e 2: lê as linhas com alvo 0/1 e prepara (X, y). Retorna (None, None) se não der."""
     # --- 1. Carga dos Dados ---
+    # Só as colunas do modelo e só as linhas com alvo 0/1 ('alvo' vem pronto
+    # do ETL; o filtro é aplicado na leitura do Parquet)
     print("\n--- Etapa 1: Carga dos Dados ---")
     start_load = time.time()
     try:
-        #
-        df = pd.read_parquet(ARQUIVO_PARQUET, engine="pyarrow")
+        df = ler_dataset(
+            colunas=COLUNAS_MODELO + ['alvo'],
+            filtros=[('alvo', 'in', [0, 1])]
+        )
         end_load = time.time()
-        print(f"Dados carregados: {len(df)} linhas.")
+        print(f"Dados carregados (alvo 0/1): {len(df)} linhas.")
         print(f"Tempo de Carga: {end_load - start_load:.2f} segundos.")
     except Exception as e:
-        print(f"ERRO: Não foi possível ler '{ARQUIVO_PARQUET}'. {e}")
-        return
+        print(f"ERRO: Não foi possível ler '{DIRETORIO_DATASET}'. {e}")
+        return None, None
 
     # --- 2. Preparação dos Dados (Feature Engineering) ---
     print("\n--- Etapa 2: Preparação dos Dados ---")
     start_prep = time.time()
     
-    df_ml = df.copy()
+    df_ml = df
 
-    # 2a. Criar o Alvo (y)
-    print("Passo 2a: Convertendo 'satisfacao' para string...")
-    df_ml['satisfacao_texto'] = df_ml['satisfacao'].astype(str)
-    
-    print("Passo 2a: Extraindo número da 'satisfacao' (ex: '(1)')...")
-    print("(ESTA PODE SER A ETAPA MAIS LENTA - 7.1M de linhas)")
-    start_extract = time.time()
-    # Formato é (1) muito insatisfeito
-    df_ml['satisfacao_num'] = df_ml['satisfacao_texto'].str.extract(r'\((\d)\)')
-    end_extract = time.time()
-    print(f"Tempo de Extração: {end_extract - start_extract:.2f} segundos.")
-    
-    print("Passo 2a: Convertendo número extraído para numérico...")
-    df_ml['satisfacao_num'] = pd.to_numeric(df_ml['satisfacao_num'], errors='coerce')
-    
-    print("Passo 2a: Removendo linhas Nulas (drop NA)...")
-    df_ml.dropna(subset=['satisfacao_num'], inplace=True)
-    
-    print(f"Linhas restantes após dropna: {len(df_ml)}")
-    
-    print("Passo 2a: Criando coluna 'alvo' binária (0 ou 1)...")
-    # 1 = Insatisfeito (1, 2) / 0 = Satisfeito (4, 5)
-    df_ml['alvo'] = df_ml['satisfacao_num'].apply(lambda x: 1 if x <= 2 else (0 if x >= 4 else -1))
-    
-    print("Passo 2a: Filtrando apenas classes 0 e 1 (removendo nota 3)...")
-    df_ml = df_ml[df_ml['alvo'].isin([0, 1])].copy()
-    
+    # 2a. Alvo (y): 1 = Insatisfeito (1, 2) / 0 = Satisfeito (4, 5)
     if df_ml.empty or len(df_ml['alvo'].unique()) < 2:
         print("ERRO: Dados insuficientes para treinar.")
-        return
+        return None, None
         
     print(f"Dados preparados para o alvo (y): {len(df_ml)} linhas úteis.")
     print("Distribuição das classes (Alvo):")
@@ -89,11 +108,7 @@ def treinar_e_salvar_modelo():
 
     # 2b. Definir as Features (X)
     print("\nPasso 2b: Definindo e limpando Features (X)...")
-    FEATURES_TEXTO = 'assunto'
-    FEATURES_CATEGORICAS = [
-        'tipo_manifestacao', 'nome_orgao', 'genero', 
-        'faixa_etaria', 'raca_cor', 'uf_do_municipio_manifestante'
-    ]
+    FEATURES_CATEGORICAS = list(FEATURES_CATEGORICAS_MODELO)
     
     for col in FEATURES_CATEGORICAS:
         if col in df_ml.columns:
@@ -105,29 +120,45 @@ def treinar_e_salvar_modelo():
          df_ml[FEATURES_TEXTO] = df_ml[FEATURES_TEXTO].astype(str).fillna('sem assunto')
     else:
         print(f"ERRO: Coluna '{FEATURES_TEXTO}' não encontrada.")
-        return
+        return None, None
 
     X = df_ml[FEATURES_CATEGORICAS + [FEATURES_TEXTO]]
     y = df_ml['alvo']
     end_prep = time.time()
     print(f"Tempo total de Preparação: {end_prep - start_prep:.2f} segundos.")
+    return X, y
+
+
+def salvar_modelo(pipeline, caminho=MODELO_SALVO):
+    """
+    Grava o modelo num arquivo temporário e o troca de uma vez (os.replace).
+    O app mapeia o modelo em memória e o recarrega a quente: ele nunca pode
+    ver um arquivo pela metade nem ter o arquivo mapeado sobrescrito.
+    """
+    caminho_tmp = caminho + ".tmp"
+    joblib.dump(pipeline, caminho_tmp)  # Sem compressão: os arrays podem ser mapeados (mmap_mode)
+    os.replace(caminho_tmp, caminho)
+
+
+def treinar_e_salvar_modelo(deduplicar=True):
+    """
+    Função completa (v3) com logs detalhados para
+    diagnosticar lentidão.
+
+    Com `deduplicar`, linhas de treino idênticas viram uma só com peso
+    (mesmo objetivo do ajuste linha a linha, em bem menos linhas).
+    """
+    start_total = time.time()
+    print(f"Iniciando o processo de ML (v3 - com logs detalhados)...")
+    
+    X, y = carregar_dados_treino()
+    if X is None:
+        return
 
     # --- 3. Criar o Pipeline de Pré-processamento e Modelo ---
     print("\n--- Etapa 3: Construindo o Pipeline de ML ---")
     
-    preprocessor_texto = TfidfVectorizer(max_features=1000, stop_words=None, ngram_range=(1, 2))
-    preprocessor_categorico = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
-    preprocessor_combinado = ColumnTransformer(
-        transformers=[
-            ('texto', preprocessor_texto, FEATURES_TEXTO),
-            ('categorico', preprocessor_categorico, FEATURES_CATEGORICAS)
-        ],
-        remainder='drop' 
-    )
-    pipeline_completo = Pipeline(steps=[
-        ('preprocessor', preprocessor_combinado),
-        ('classifier', LogisticRegression(random_state=42, max_iter=1000, class_weight='balanced'))
-    ])
+    pipeline_completo = construir_pipeline([c for c in X.columns if c != FEATURES_TEXTO])
     print("Pipeline construído.")
 
     # --- 4. Dividir os Dados (Treino e Teste) ---
@@ -144,7 +175,10 @@ def treinar_e_salvar_modelo():
     print("\n--- Etapa 5: Treinamento do Modelo ---")
     print("(Isso pode levar alguns minutos...)")
     start_fit = time.time()
-    pipeline_completo.fit(X_train, y_train)
+    if deduplicar:
+        ajustar_pipeline_deduplicado(pipeline_completo, X_train, y_train)
+    else:
+        pipeline_completo.fit(X_train, y_train)
     end_fit = time.time()
     print(f"Modelo treinado com sucesso. Tempo de Treino: {end_fit - start_fit:.2f} segundos.")
 
@@ -164,18 +198,449 @@ def treinar_e_salvar_modelo():
     # --- 7. Salvar o Modelo ---
     print(f"\n--- Etapa 7: Salvando o Modelo ---")
     start_save = time.time()
+    modelo_salvo = False
     try:
-        joblib.dump(pipeline_completo, MODELO_SALVO)
+        salvar_modelo(pipeline_completo)
+        modelo_salvo = True
         end_save = time.time()
         print(f"Sucesso! Modelo salvo como '{MODELO_SALVO}'.")
         print(f"Tempo de Salvamento: {end_save - start_save:.2f} segundos.")
     except Exception as e:
         print(f"ERRO ao salvar o modelo: {e}")
+
+    # --- 8. Exportar o Pontuador Compacto (usado pelo app, sem sklearn) ---
+    print(f"\n--- Etapa 8: Exportando o Pontuador Compacto ---")
+    if not modelo_salvo:
+        # O pontuador compacto em uso continua correspondendo ao modelo em uso
+        print("Modelo não salvo: pontuador compacto não exportado.")
+    else:
+        try:
+            exportar_modelo_compacto(pipeline_completo, X_test)
+        except Exception as e:
+            print(f"ERRO ao exportar o pontuador compacto: {e}")
         
     end_total = time.time()
     print(f"\n--- Processo Concluído ---")
     print(f"Tempo Total de Execução: {(end_total - start_total) / 60:.2f} minutos.")
 
 
+def _separar_teste(n_linhas, rng):
+    # Sorteio fixo (semente) das linhas de teste, lote a lote
+    return rng.random(n_linhas) < FRACAO_TESTE
+
+
+def deduplicar_treino(X, y):
+    """Linhas idênticas (features + alvo) viram uma só; retorna (X_unicos, y_unicos, contagens)."""
+    tabela = X.assign(alvo=np.asarray(y))
+    unicos = tabela.groupby(list(tabela.columns), sort=False, observed=True).size().reset_index(name='contagem')
+    return unicos[list(X.columns)], unicos['alvo'].to_numpy(), unicos['contagem'].to_numpy(dtype=np.int64)
+
+
+def pesos_balanceados(y):
+    """Peso de cada classe como no class_weight='balanced' (n / (n_classes * contagem))."""
+    classes, contagem = np.unique(y, return_counts=True)
+    return dict(zip(classes, len(y) / (len(classes) * contagem)))
+
+
+def ajustar_tfidf_ponderado(vetorizador, textos, contagens):
+    """
+    Ajusta o vocabulário e o idf de um TfidfVectorizer já ajustado como se
+    cada texto distinto aparecesse `contagens` vezes (o fit do sklearn não
+    aceita pesos). Reproduz a escolha das max_features e o idf suavizado.
+    """
+    if vetorizador.min_df != 1 or vetorizador.max_df != 1.0 or not vetorizador.smooth_idf:
+        raise ValueError("ajuste ponderado só suporta min_df=1, max_df=1.0 e smooth_idf=True")
+
+    contador = CountVectorizer(analyzer=vetorizador.build_analyzer(), dtype=np.int64)
+    matriz = contador.fit_transform(textos)  # termos em ordem alfabética, como no sklearn
+    termos = contador.get_feature_names_out()
+    frequencias = np.asarray(matriz.T @ contagens).ravel()
+    documentos = np.asarray((matriz > 0).astype(np.int64).T @ contagens).ravel()
+
+    # Mesmo critério do CountVectorizer: os termos mais frequentes no corpus
+    mantidos = np.arange(len(termos))
+    if vetorizador.max_features is not None and len(termos) > vetorizador.max_features:
+        mantidos = np.sort((-frequencias).argsort()[:vetorizador.max_features])
+
+    n_documentos = float(contagens.sum()) + 1
+    vetorizador.vocabulary_ = {termos[i]: j for j, i in enumerate(mantidos)}
+    vetorizador.idf_ = np.log(n_documentos / (documentos[mantidos].astype(np.float64) + 1)) + 1
+
+
+def transformar_com_texto_distinto(preprocessor, X):
+    """Como preprocessor.transform(X), mas o TF-IDF roda uma vez por assunto distinto e é replicado nas linhas."""
+    codigos, assuntos = pd.factorize(X[FEATURES_TEXTO])
+    texto = preprocessor.named_transformers_['texto'].transform(assuntos)[codigos]
+    colunas_categoricas = preprocessor.transformers_[1][2]
+    categorico = preprocessor.named_transformers_['categorico'].transform(X[colunas_categoricas])
+    return sp.hstack([texto, categorico], format='csr')
+
+
+def ajustar_pipeline_deduplicado(pipeline, X_train, y_train):
+    """
+    Ajusta o Pipeline TF-IDF + OneHot + LR nas combinações únicas do treino,
+    com sample_weight = contagem x peso da classe. O objetivo é o mesmo do
+    fit linha a linha com class_weight='balanced'.
+    """
+    X_unicos, y_unicos, contagens = deduplicar_treino(X_train, y_train)
+    print(f"Treino deduplicado: {len(X_train)} linhas -> {len(X_unicos)} combinações únicas.")
+
+    preprocessor = pipeline.named_steps['preprocessor']
+    preprocessor.fit(X_unicos)
+    codigos, assuntos = pd.factorize(X_unicos[FEATURES_TEXTO])
+    contagens_assunto = np.bincount(codigos, weights=contagens).astype(np.int64)
+    print(f"TF-IDF sobre {len(assuntos)} assuntos distintos.")
+    ajustar_tfidf_ponderado(preprocessor.named_transformers_['texto'], assuntos, contagens_assunto)
+
+    pesos_classe = pesos_balanceados(y_train)
+    classificador = pipeline.named_steps['classifier']
+    classificador.set_params(class_weight=None)  # o balanceamento já vai no sample_weight
+    classificador.fit(
+        transformar_com_texto_distinto(preprocessor, X_unicos), y_unicos,
+        sample_weight=contagens * np.array([pesos_classe[c] for c in y_unicos])
+    )
+    return pipeline
+
+
+def _avaliar_configuracao_tfidf(fold, config_tfidf, valores_c, assuntos, codigos_treino, codigos_teste,
+                                categorico_treino, categorico_teste, y_treino, y_teste):
+    """
+    Uma tarefa da busca: ajusta o TF-IDF uma vez para o fold (sobre os
+    assuntos distintos, ponderados) e reaproveita a matriz para todos os C.
+    """
+    start = time.time()
+    contagens = np.bincount(codigos_treino, minlength=len(assuntos))
+    presentes = contagens > 0
+    vetorizador = TfidfVectorizer(stop_words=None, **config_tfidf)
+    vetorizador.fit(assuntos[presentes])
+    ajustar_tfidf_ponderado(vetorizador, assuntos[presentes], contagens[presentes])
+    texto = vetorizador.transform(assuntos)
+    X_treino = sp.hstack([texto[codigos_treino], categorico_treino], format='csr')
+    X_teste = sp.hstack([texto[codigos_teste], categorico_teste], format='csr')
+    tempo_transformacao = time.time() - start
+
+    linhas = []
+    for C in valores_c:
+        start = time.time()
+        classificador = LogisticRegression(C=C, random_state=42, max_iter=1000, class_weight='balanced')
+        classificador.fit(X_treino, y_treino)
+        tempo_ajuste = time.time() - start
+        start = time.time()
+        acuracia = accuracy_score(y_teste, classificador.predict(X_teste))
+        linhas.append({
+            'fold': fold,
+            'max_features': config_tfidf['max_features'],
+            'ngram_range': str(config_tfidf['ngram_range']),
+            'C': C,
+            'acuracia': acuracia,
+            'tempo_transformacao': tempo_transformacao,
+            'tempo_ajuste': tempo_ajuste,
+            'tempo_avaliacao': time.time() - start,
+        })
+    return linhas
+
+
+def buscar_hiperparametros(n_folds=N_FOLDS_TUNING, n_jobs=-1):
+    """
+    Busca em grade (GRADE_TFIDF x GRADE_C) com validação cruzada estratificada,
+    em paralelo (uma tarefa por fold x configuração do TF-IDF). As matrizes
+    do OneHot são calculadas uma vez por fold e as do TF-IDF uma vez por
+    fold e configuração, e servem a todos os valores de C. O melhor pipeline
+    é reajustado com todos os dados e salvo como MODELO_SALVO.
+    """
+    tempos = {}
+    start_total = time.time()
+    print(f"Iniciando a busca de hiperparâmetros ({n_folds} folds)...")
+
+    start = time.time()
+    X, y = carregar_dados_treino()
+    if X is None:
+        return
+    features_categoricas = [c for c in X.columns if c != FEATURES_TEXTO]
+    y = y.to_numpy()
+    tempos['carga e preparação'] = time.time() - start
+
+    # --- Cache por fold: códigos dos assuntos e matrizes do OneHot ---
+    print("\n--- Preparando os folds ---")
+    start = time.time()
+    codigos, assuntos = pd.factorize(X[FEATURES_TEXTO])
+    assuntos = np.asarray(assuntos, dtype=object)
+    folds = []
+    for indices_treino, indices_teste in StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42).split(X, y):
+        onehot = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
+        categorico_treino = onehot.fit_transform(X.iloc[indices_treino][features_categoricas])
+        categorico_teste = onehot.transform(X.iloc[indices_teste][features_categoricas])
+        folds.append((codigos[indices_treino], codigos[indices_teste], categorico_treino, categorico_teste,
+                      y[indices_treino], y[indices_teste]))
+    tempos['folds e OneHot'] = time.time() - start
+
+    # --- Busca em paralelo ---
+    n_tarefas = len(folds) * len(GRADE_TFIDF)
+    print(f"\n--- Busca em grade: {n_tarefas} tarefas x {len(GRADE_C)} valores de C ---")
+    start = time.time()
+    resultados = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(_avaliar_configuracao_tfidf)(i, config, GRADE_C, assuntos, *fold)
+        for i, fold in enumerate(folds) for config in GRADE_TFIDF
+    )
+    tempos['busca (tempo real)'] = time.time() - start
+    tabela = pd.DataFrame([linha for linhas in resultados for linha in linhas])
+    tempos['  TF-IDF nos processos (soma)'] = tabela.drop_duplicates(['fold', 'max_features', 'ngram_range'])['tempo_transformacao'].sum()
+    tempos['  ajuste da LR nos processos (soma)'] = tabela['tempo_ajuste'].sum()
+    tempos['  avaliação nos processos (soma)'] = tabela['tempo_avaliacao'].sum()
+
+    resumo = (tabela.groupby(['max_features', 'ngram_range', 'C'])
+              .agg(acuracia_media=('acuracia', 'mean'), acuracia_desvio=('acuracia', 'std'),
+                   tempo_ajuste_medio=('tempo_ajuste', 'mean'))
+              .sort_values('acuracia_media', ascending=False).reset_index())
+    resumo.to_csv(RESULTADOS_TUNING, index=False)
+    print("\nResultados (melhores primeiro):")
+    print(resumo.to_string(index=False))
+    print(f"Tabela salva em '{RESULTADOS_TUNING}'.")
+
+    # --- Reajuste do melhor pipeline com todos os dados ---
+    melhor = resumo.iloc[0]
+    ngram_range = next(c['ngram_range'] for c in GRADE_TFIDF if str(c['ngram_range']) == melhor['ngram_range'])
+    print(f"\n--- Melhor configuração: max_features={melhor['max_features']}, ngram_range={ngram_range}, C={melhor['C']} ---")
+    start = time.time()
+    pipeline_completo = construir_pipeline(
+        features_categoricas, max_features=int(melhor['max_features']), ngram_range=ngram_range, C=float(melhor['C'])
+    )
+    ajustar_pipeline_deduplicado(pipeline_completo, X, y)
+    tempos['reajuste do melhor'] = time.time() - start
+
+    start = time.time()
+    try:
+        salvar_modelo(pipeline_completo)
+        print(f"Sucesso! Modelo salvo como '{MODELO_SALVO}'.")
+        # Só depois do modelo salvo (um erro no salvar_modelo pula a exportação)
+        exportar_modelo_compacto(pipeline_completo, X.sample(min(len(X), 5000), random_state=42))
+    except Exception as e:
+        print(f"ERRO ao salvar o modelo ou o pontuador compacto: {e}")
+    tempos['salvamento'] = time.time() - start
+    tempos['total'] = time.time() - start_total
+
+    print("\n--- Tempo por etapa ---")
+    for etapa, segundos in tempos.items():
+        print(f"{etapa:<40} {segundos:8.2f} s")
+
+
+def treinar_e_salvar_modelo_streaming(tamanho_lote=TAMANHO_LOTE_TREINO, epocas=1):
+    """
+    Treino fora da memória: o dataset é lido em lotes (só as colunas do
+    modelo e só as linhas com alvo 0/1), as features são geradas por hashing
+    (sem vocabulário para guardar) e o classificador linear é treinado com
+    partial_fit. A memória usada é a de um lote, seja qual for o histórico.
+
+    O modelo salvo é um Pipeline com predict_proba, como o do treino em
+    memória, então o app o usa sem mudanças.
+    """
+    start_total = time.time()
+    print(f"Iniciando o processo de ML (streaming, lotes de {tamanho_lote} linhas)...")
+    filtros = [('alvo', 'in', [0, 1])]
+
+    # --- 1. Contagem das classes (só a coluna 'alvo') para balancear os pesos ---
+    print("\n--- Etapa 1: Contando as classes ---")
+    contagem = np.zeros(2, dtype=np.int64)
+    try:
+        for lote in iterar_lotes(colunas=['alvo'], filtros=filtros, tamanho_lote=tamanho_lote):
+            contagem += np.bincount(lote['alvo'].to_numpy(), minlength=2)[:2]
+    except Exception as e:
+        print(f"ERRO: Não foi possível ler '{DIRETORIO_DATASET}'. {e}")
+        return
+    if contagem.min() == 0:
+        print("ERRO: Dados insuficientes para treinar.")
+        return
+    # Mesmo critério do class_weight='balanced'
+    pesos_classe = contagem.sum() / (2 * contagem)
+    print(f"Linhas úteis: {contagem.sum()} (satisfeito: {contagem[0]}, insatisfeito: {contagem[1]})")
+
+    # --- 2. Pipeline sem estado (hashing) + classificador incremental ---
+    preprocessor_combinado = ColumnTransformer(
+        transformers=[
+            ('texto', HashingVectorizer(n_features=N_FEATURES_TEXTO, ngram_range=(1, 2), alternate_sign=False), FEATURES_TEXTO),
+            ('categorico', Pipeline(steps=[
+                ('tokens', FunctionTransformer(tokens_categoricos)),
+                ('hash', FeatureHasher(n_features=N_FEATURES_CATEGORICAS, input_type='string', alternate_sign=False)),
+            ]), FEATURES_CATEGORICAS_MODELO),
+        ],
+        remainder='drop'
+    )
+    classificador = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+
+    # --- 3. Treino lote a lote ---
+    print("\n--- Etapa 3: Treinamento incremental ---")
+    start_fit = time.time()
+    linhas_treino = 0
+    for epoca in range(epocas):
+        rng = np.random.default_rng(42)  # mesmo sorteio de teste em todas as épocas
+        for lote in iterar_lotes(colunas=COLUNAS_MODELO + ['alvo'], filtros=filtros, tamanho_lote=tamanho_lote):
+            treino = ~_separar_teste(len(lote), rng)
+            if not treino.any():
+                continue
+            X = preparar_features(lote[treino])
+            y = lote['alvo'].to_numpy()[treino]
+            if linhas_treino == 0:
+                preprocessor_combinado.fit(X)  # transformadores sem estado: só registra as colunas
+            classificador.partial_fit(
+                preprocessor_combinado.transform(X), y,
+                classes=np.array([0, 1]), sample_weight=pesos_classe[y]
+            )
+            linhas_treino += len(y)
+        print(f"Época {epoca + 1}/{epocas} concluída.")
+    print(f"Modelo treinado com {linhas_treino} linhas. Tempo de Treino: {time.time() - start_fit:.2f} segundos.")
+
+    pipeline_completo = Pipeline(steps=[
+        ('preprocessor', preprocessor_combinado),
+        ('classifier', classificador)
+    ])
+
+    # --- 4. Avaliação (linhas de teste, também em lotes) ---
+    print("\n--- Etapa 4: Avaliação do Modelo ---")
+    start_eval = time.time()
+    matriz = np.zeros((2, 2), dtype=np.int64)
+    rng = np.random.default_rng(42)
+    for lote in iterar_lotes(colunas=COLUNAS_MODELO + ['alvo'], filtros=filtros, tamanho_lote=tamanho_lote):
+        teste = _separar_teste(len(lote), rng)
+        if not teste.any():
+            continue
+        y_pred = pipeline_completo.predict(preparar_features(lote[teste]))
+        matriz += confusion_matrix(lote['alvo'].to_numpy()[teste], y_pred, labels=[0, 1])
+    print(f"Tempo de Avaliação: {time.time() - start_eval:.2f} segundos.")
+    print(f"Acurácia (Accuracy): {np.trace(matriz) / max(matriz.sum(), 1):.4f}")
+    print("\nMatriz de Confusão (Linhas=Real, Colunas=Previsto):")
+    print(matriz)
+
+    # --- 5. Salvar o Modelo ---
+    print(f"\n--- Etapa 5: Salvando o Modelo ---")
+    try:
+        salvar_modelo(pipeline_completo)
+        print(f"Sucesso! Modelo salvo como '{MODELO_SALVO}'.")
+        # O pontuador compacto só existe para o pipeline TF-IDF: um antigo não vale mais
+        remover_modelo_compacto()
+    except Exception as e:
+        print(f"ERRO ao salvar o modelo: {e}")
+
+    print(f"\n--- Processo Concluído ---")
+    print(f"Tempo Total de Execução: {(time.time() - start_total) / 60:.2f} minutos.")
+
+
+def remover_modelo_compacto(caminho=MODELO_COMPACTO):
+    """Remove o pontuador compacto, que não corresponde mais ao modelo salvo."""
+    if os.path.exists(caminho):
+        os.remove(caminho)
+        print(f"Pontuador compacto antigo '{caminho}' removido.")
+
+
+def exportar_modelo_compacto(pipeline, X_verificacao=None, caminho=MODELO_COMPACTO):
+    """
+    Exporta o Pipeline TF-IDF + OneHot + LogisticRegression para os arrays
+    do PontuadorCompacto (vocabulário, idf, pesos por categoria, intercepto).
+
+    O arquivo é gravado como temporário, conferido com verificar_modelo_compacto
+    em `X_verificacao` e só então trocado com os.replace. Se a exportação ou a
+    conferência falhar, o pontuador antigo também é removido (ele é do modelo
+    anterior) e o erro é propagado.
+    """
+    caminho_tmp = caminho + ".tmp"
+    try:
+        with open(caminho_tmp, "wb") as f:
+            np.savez(f, **_arrays_modelo_compacto(pipeline))
+        if X_verificacao is not None:
+            verificar_modelo_compacto(pipeline, X_verificacao, caminho=caminho_tmp)
+    except Exception:
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        remover_modelo_compacto(caminho)
+        raise
+    os.replace(caminho_tmp, caminho)
+    print(f"Pontuador compacto salvo como '{caminho}' ({os.path.getsize(caminho) / 1024:.0f} KB).")
+
+
+def _arrays_modelo_compacto(pipeline):
+    # Arrays do PontuadorCompacto; ValueError se o pipeline não for suportado
+    preprocessor = pipeline.named_steps['preprocessor']
+    classificador = pipeline.named_steps['classifier']
+    texto = preprocessor.named_transformers_['texto']
+    categorico = preprocessor.named_transformers_['categorico']
+
+    # Só a configuração usada no treino em memória é reproduzida pelo pontuador
+    if not isinstance(texto, TfidfVectorizer) or not isinstance(categorico, OneHotEncoder):
+        raise ValueError("o pontuador compacto só suporta o pipeline TF-IDF + OneHot (treino em memória)")
+    if (texto.analyzer != 'word' or texto.tokenizer or texto.preprocessor or texto.strip_accents
+            or texto.stop_words or texto.binary or texto.sublinear_tf or not texto.use_idf or texto.norm != 'l2'):
+        raise ValueError("configuração do TfidfVectorizer não suportada pelo pontuador compacto")
+    if (categorico.drop is not None or categorico.handle_unknown != 'ignore'
+            or categorico.min_frequency is not None or categorico.max_categories is not None):
+        raise ValueError("configuração do OneHotEncoder não suportada pelo pontuador compacto")
+    if classificador.coef_.shape[0] != 1:
+        raise ValueError("o pontuador compacto só suporta classificação binária")
+
+    pesos = classificador.coef_[0]
+    fatias = preprocessor.output_indices_
+    vocabulario = sorted(texto.vocabulary_, key=texto.vocabulary_.get)
+    colunas_categoricas = list(preprocessor.transformers_[1][2])
+
+    arrays = {
+        'coluna_texto': np.array(preprocessor.transformers_[0][2]),
+        'colunas_categoricas': np.array(colunas_categoricas),
+        'intercepto': np.array(classificador.intercept_[0]),
+        'token_pattern': np.array(texto.token_pattern),
+        'lowercase': np.array(texto.lowercase),
+        'ngram_range': np.array(texto.ngram_range),
+        'vocabulario': np.array(vocabulario),
+        'idf': texto.idf_.astype(np.float64),
+        'pesos_texto': pesos[fatias['texto']].astype(np.float64),
+    }
+    pesos_categoricos = pesos[fatias['categorico']]
+    inicio = 0
+    for i, categorias in enumerate(categorico.categories_):
+        arrays[f'categorias_{i}'] = np.array([str(c) for c in categorias])
+        arrays[f'pesos_{i}'] = pesos_categoricos[inicio:inicio + len(categorias)].astype(np.float64)
+        inicio += len(categorias)
+    return arrays
+
+
+def verificar_modelo_compacto(pipeline, X, tolerancia=1e-9, caminho=MODELO_COMPACTO):
+    """Confere que o pontuador compacto em `caminho` reproduz o predict_proba do Pipeline em `X`."""
+    pontuador = PontuadorCompacto.carregar(caminho)
+    esperado = pipeline.predict_proba(X)
+    start = time.time()
+    obtido = pontuador.predict_proba(X)
+    por_linha = (time.time() - start) / max(len(X), 1)
+    diferenca = float(np.max(np.abs(esperado - obtido))) if len(X) else 0.0
+    print(f"Diferença máxima para o predict_proba: {diferenca:.2e} ({len(X)} linhas)")
+    print(f"Tempo por predição (pontuador compacto): {por_linha * 1e6:.1f} µs")
+    if diferenca > tolerancia:
+        raise ValueError(f"pontuador compacto difere do Pipeline em {diferenca:.2e} (> {tolerancia:.0e})")
+    return diferenca
+
+
 if __name__ == "__main__":
-    treinar_e_salvar_modelo()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Treina o modelo de risco de insatisfação.")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Treino fora da memória (lotes do Parquet + hashing + partial_fit).")
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_TREINO,
+                        help="Linhas por lote no modo --streaming.")
+    parser.add_argument('--epocas', type=int, default=1,
+                        help="Passadas sobre o dataset no modo --streaming.")
+    parser.add_argument('--tuning', action='store_true',
+                        help=f"Busca de hiperparâmetros com validação cruzada (salva a tabela em '{RESULTADOS_TUNING}').")
+    parser.add_argument('--folds', type=int, default=N_FOLDS_TUNING,
+                        help="Folds da validação cruzada no modo --tuning.")
+    parser.add_argument('--workers', type=int, default=-1,
+                        help="Processos no modo --tuning (-1 = todos os núcleos).")
+    parser.add_argument('--sem-deduplicar', action='store_true',
+                        help="Ajusta linha a linha, sem agrupar as linhas de treino idênticas.")
+    parser.add_argument('--exportar-compacto', action='store_true',
+                        help=f"Só exporta '{MODELO_SALVO}' para o pontuador compacto '{MODELO_COMPACTO}'.")
+    args = parser.parse_args()
+    if args.exportar_compacto:
+        # Conferido com um lote do dataset antes de substituir o arquivo
+        lote = next(iterar_lotes(colunas=COLUNAS_MODELO, tamanho_lote=5000), None)
+        exportar_modelo_compacto(joblib.load(MODELO_SALVO), None if lote is None else preparar_features(lote))
+    elif args.tuning:
+        buscar_hiperparametros(n_folds=args.folds, n_jobs=args.workers)
+    elif args.streaming:
+        treinar_e_salvar_modelo_streaming(tamanho_lote=args.tamanho_lote, epocas=args.epocas)
+    else:
+        treinar_e_salvar_modelo(deduplicar=not args.sem_deduplicar)
\ No newline at end of file
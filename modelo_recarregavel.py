@@ -0,0 +1,141 @@
+# modelo_recarregavel.py
+import hashlib
+import os
+import threading
+import time
+
+import joblib
+import pandas as pd
+
+from features_modelo import COLUNAS_MODELO, FEATURES_TEXTO
+from pontuador_compacto import MODELO_COMPACTO, PontuadorCompacto
+
+# ============================================================
+# Modelo de satisfação carregado sob demanda e recarregado a quente
+#   - só é carregado no primeiro uso (primeira visita à página de predição);
+#   - os arrays do joblib são mapeados em memória (mmap_mode='r'): os
+#     workers do gunicorn compartilham as mesmas páginas do arquivo;
+#   - um arquivo novo (mtime/tamanho e depois hash) é carregado e aquecido
+#     numa thread em segundo plano e só então trocado de uma vez.
+# ============================================================
+INTERVALO_VERIFICACAO = 5.0  # Segundos entre verificações dos arquivos do modelo
+
+
+def _assinatura(caminho):
+    """(mtime_ns, tamanho) do arquivo, ou None se ele não existir."""
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def _hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class ModeloRecarregavel:
+    """
+    Dá acesso ao modelo atual com `obter()`. A troca por um modelo novo é
+    só a atribuição de uma referência (sob lock), feita depois do modelo
+    novo estar carregado e aquecido: uma predição em andamento continua com
+    o objeto que recebeu e nunca vê um modelo pela metade.
+    """
+
+    def __init__(self, caminho_modelo, caminho_compacto=MODELO_COMPACTO, intervalo=INTERVALO_VERIFICACAO):
+        self.caminho_modelo = caminho_modelo
+        self.caminho_compacto = caminho_compacto
+        self.intervalo = intervalo
+        self.erro = None
+        self._modelo = None
+        self._origem = None       # (caminho, hash) do modelo em uso
+        self._assinaturas = None  # Assinaturas dos arquivos na última verificação
+        self._proxima_verificacao = 0.0
+        self._recarregando = False
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+
+    def obter(self):
+        """Modelo atual (ou None). Carrega no primeiro uso; depois só verifica se há um arquivo novo."""
+        modelo = self._modelo
+        if modelo is None:
+            with self._lock_carga:
+                if self._modelo is None:
+                    self._carregar_e_trocar()
+                return self._modelo
+
+        agora = time.monotonic()
+        if agora >= self._proxima_verificacao:
+            with self._lock:
+                if agora < self._proxima_verificacao or self._recarregando:
+                    return self._modelo
+                self._proxima_verificacao = agora + self.intervalo
+                if self._ler_assinaturas() == self._assinaturas:
+                    return self._modelo
+                self._recarregando = True
+            threading.Thread(target=self._recarregar_em_segundo_plano, daemon=True).start()
+        return modelo
+
+    def _ler_assinaturas(self):
+        return (_assinatura(self.caminho_modelo), _assinatura(self.caminho_compacto))
+
+    def _escolher_arquivo(self, assinaturas):
+        # O pontuador compacto (só NumPy) é preferido quando está em dia com o
+        # modelo: a predição fica em microssegundos e o sklearn não é importado
+        assinatura_modelo, assinatura_compacto = assinaturas
+        if assinatura_compacto is not None and (
+            assinatura_modelo is None or assinatura_compacto[0] >= assinatura_modelo[0]
+        ):
+            return self.caminho_compacto
+        return self.caminho_modelo
+
+    def _carregar_e_trocar(self):
+        assinaturas = self._ler_assinaturas()
+        caminho = self._escolher_arquivo(assinaturas)
+        try:
+            hash_arquivo = _hash_arquivo(caminho)
+            if self._origem == (caminho, hash_arquivo):
+                # Só o mtime mudou (arquivo regravado com o mesmo conteúdo)
+                with self._lock:
+                    self._assinaturas = assinaturas
+                return
+
+            inicio = time.time()
+            if caminho == self.caminho_compacto:
+                modelo = PontuadorCompacto.carregar(caminho)
+            else:
+                # mmap_mode='r': os arrays do Pipeline ficam no page cache, compartilhados entre processos
+                modelo = joblib.load(caminho, mmap_mode="r")
+            self._aquecer(modelo)
+        except Exception as e:
+            print(f"ERRO: Não foi possível carregar o modelo '{caminho}': {e}")
+            with self._lock:
+                self.erro = e
+                # Arquivo ainda sendo gravado (ou inválido): tenta de novo na próxima verificação
+                self._assinaturas = None
+            return
+
+        with self._lock:
+            self._modelo = modelo
+            self._origem = (caminho, hash_arquivo)
+            self._assinaturas = assinaturas
+            self.erro = None
+        print(f"Modelo '{caminho}' carregado em {time.time() - inicio:.2f} s.")
+
+    def _recarregar_em_segundo_plano(self):
+        try:
+            self._carregar_e_trocar()
+        finally:
+            with self._lock:
+                self._recarregando = False
+
+    @staticmethod
+    def _aquecer(modelo):
+        # Uma predição de teste: importa o que faltar e monta os caches antes da troca
+        registro = {coluna: "não informado" for coluna in COLUNAS_MODELO}
+        registro[FEATURES_TEXTO] = "sem assunto"
+        modelo.predict_proba(pd.DataFrame([registro], columns=COLUNAS_MODELO))
@@ -0,0 +1,79 @@
+# pontuador_compacto.py
+import re
+
+import numpy as np
+
+# ============================================================
+# Pontuador compacto do modelo de satisfação (TF-IDF + OneHot + LR)
+# O modelo é linear, então basta guardar em arrays o vocabulário/idf, o peso
+# de cada categoria e o intercepto. A predição usa só NumPy (sem sklearn) e
+# dá o mesmo resultado que o predict_proba do Pipeline.
+# Gerado por ml_classificacao.exportar_modelo_compacto().
+# ============================================================
+MODELO_COMPACTO = "modelo_satisfacao_compacto.npz"
+
+
+class PontuadorCompacto:
+    """Mesma interface de predict_proba do Pipeline, para um DataFrame ou um dict."""
+
+    def __init__(self, arrays):
+        self.coluna_texto = str(arrays["coluna_texto"])
+        self.colunas_categoricas = arrays["colunas_categoricas"].tolist()
+        self.intercepto = float(arrays["intercepto"])
+
+        self._token = re.compile(str(arrays["token_pattern"]))
+        self._minusculas = bool(arrays["lowercase"])
+        self._ngrama_min, self._ngrama_max = (int(n) for n in arrays["ngram_range"])
+        self._indice_termo = {termo: i for i, termo in enumerate(arrays["vocabulario"].tolist())}
+        self._idf = arrays["idf"]
+        self._idf_peso = arrays["idf"] * arrays["pesos_texto"]
+
+        self._pesos_categorias = [
+            dict(zip(arrays[f"categorias_{i}"].tolist(), arrays[f"pesos_{i}"].tolist()))
+            for i in range(len(self.colunas_categoricas))
+        ]
+
+    @classmethod
+    def carregar(cls, caminho=MODELO_COMPACTO):
+        with np.load(caminho, allow_pickle=False) as arrays:
+            return cls(arrays)
+
+    def _termos(self, texto):
+        # Mesmo analisador 'word' do TfidfVectorizer: tokens + n-gramas
+        if self._minusculas:
+            texto = texto.lower()
+        tokens = self._token.findall(texto)
+        termos = []
+        for n in range(self._ngrama_min, self._ngrama_max + 1):
+            if n == 1:
+                termos.extend(tokens)
+            else:
+                termos.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return termos
+
+    def decisao(self, registro):
+        """Valor da função de decisão (logit da classe 1) para um registro (dict coluna -> valor)."""
+        contagens = {}
+        for termo in self._termos(str(registro[self.coluna_texto])):
+            indice = self._indice_termo.get(termo)
+            if indice is not None:
+                contagens[indice] = contagens.get(indice, 0) + 1
+
+        valor = self.intercepto
+        if contagens:
+            indices = np.fromiter(contagens.keys(), dtype=np.int64, count=len(contagens))
+            tf = np.fromiter(contagens.values(), dtype=np.float64, count=len(contagens))
+            norma = np.sqrt(np.sum((tf * self._idf[indices]) ** 2))  # normalização l2 do TF-IDF
+            valor += np.dot(tf, self._idf_peso[indices]) / norma
+
+        # OneHot com handle_unknown='ignore': categoria desconhecida não soma nada
+        for coluna, pesos in zip(self.colunas_categoricas, self._pesos_categorias):
+            valor += pesos.get(str(registro[coluna]), 0.0)
+        return valor
+
+    def predict_proba(self, X):
+        """Array (n, 2) com [P(satisfeito), P(insatisfeito)], como o Pipeline."""
+        registros = [X] if isinstance(X, dict) else X.to_dict("records")
+        decisoes = np.array([self.decisao(registro) for registro in registros], dtype=np.float64)
+        prob = 1.0 / (1.0 + np.exp(-decisoes))
+        return np.column_stack([1.0 - prob, prob])
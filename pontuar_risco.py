@@ -0,0 +1,128 @@
+# pontuar_risco.py
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_ouvidoria import abrir_dataset, iterar_lotes
+from features_modelo import COLUNAS_MODELO, preparar_features
+from ml_classificacao import MODELO_SALVO
+from processamento_paralelo import mapear_em_ordem
+
+# ============================================================
+# Pontuação em lote: risco de insatisfação para todo o dataset
+#   ouvidoria_risco.parquet        -> protocolo, risco_insatisfacao (uma linha por manifestação)
+#   ouvidoria_risco_orgaos.parquet -> resumo do risco por órgão
+# ============================================================
+ARQUIVO_RISCO = "ouvidoria_risco.parquet"
+ARQUIVO_RISCO_ORGAOS = "ouvidoria_risco_orgaos.parquet"
+TAMANHO_LOTE_PONTUACAO = 64 * 1024
+SITUACOES_ENCERRADAS = ["concluída", "arquivada"]
+LIMIAR_RISCO_ALTO = 0.6  # Mesmo corte do "Risco Alto" da página de predição
+
+
+def esquema_risco():
+    """Esquema de ARQUIVO_RISCO: 'protocolo' com o mesmo tipo do dataset."""
+    return pa.schema([
+        abrir_dataset().schema.field("protocolo"),
+        ("risco_insatisfacao", pa.float64()),
+    ])
+
+
+# Modelo carregado uma vez por processo (initializer do pool)
+_modelo = None
+
+
+def _carregar_modelo(caminho_modelo):
+    global _modelo
+    _modelo = joblib.load(caminho_modelo)
+
+
+def _pontuar_lote(lote):
+    """Probabilidade de insatisfação (classe 1) de cada linha do lote."""
+    risco = _modelo.predict_proba(preparar_features(lote))[:, 1]
+    return pd.DataFrame({
+        "protocolo": lote["protocolo"].to_numpy(),
+        "nome_orgao": lote["nome_orgao"].astype(str).to_numpy(),
+        "risco_insatisfacao": risco,
+    })
+
+
+def pontuar_dataset(num_workers=0, tamanho_lote=TAMANHO_LOTE_PONTUACAO, apenas_abertas=True,
+                    caminho_modelo=MODELO_SALVO):
+    """
+    Lê o dataset em lotes (só as colunas do modelo), pontua os lotes em
+    paralelo e grava o risco por manifestação e o resumo por órgão. Cada
+    processo carrega o modelo uma única vez. Com `apenas_abertas`, as
+    manifestações concluídas/arquivadas ficam de fora (filtro na leitura).
+    """
+    if num_workers == 0:
+        num_workers = os.cpu_count() or 1
+    inicio = time.time()
+    filtros = [("situacao", "not in", SITUACOES_ENCERRADAS)] if apenas_abertas else None
+    lotes = iterar_lotes(colunas=["protocolo"] + COLUNAS_MODELO, filtros=filtros, tamanho_lote=tamanho_lote)
+
+    if num_workers > 1:
+        print(f"Pontuando com {num_workers} processos...")
+        pool = ProcessPoolExecutor(max_workers=num_workers, initializer=_carregar_modelo, initargs=(caminho_modelo,))
+        resultados = mapear_em_ordem(pool, _pontuar_lote, lotes, janela=2 * num_workers)
+    else:
+        pool = None
+        _carregar_modelo(caminho_modelo)
+        resultados = map(_pontuar_lote, lotes)
+
+    esquema = esquema_risco()
+    caminho_tmp = ARQUIVO_RISCO + ".tmp"
+    total_linhas = 0
+    resumos = []
+    try:
+        with pq.ParquetWriter(caminho_tmp, esquema) as writer:
+            for resultado in resultados:
+                writer.write_table(pa.Table.from_pandas(resultado[["protocolo", "risco_insatisfacao"]],
+                                                        schema=esquema, preserve_index=False))
+                total_linhas += len(resultado)
+                # Resumo parcial por órgão (somas: combinável entre lotes)
+                resultado["alto_risco"] = resultado["risco_insatisfacao"] > LIMIAR_RISCO_ALTO
+                resumos.append(resultado.groupby("nome_orgao").agg(
+                    manifestacoes=("risco_insatisfacao", "size"),
+                    soma_risco=("risco_insatisfacao", "sum"),
+                    alto_risco=("alto_risco", "sum"),
+                ))
+        os.replace(caminho_tmp, ARQUIVO_RISCO)
+    except Exception as e:
+        print(f"ERRO na pontuação: {e}")
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        return
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if resumos:
+        por_orgao = pd.concat(resumos).groupby(level=0).sum()
+        por_orgao["risco_medio"] = por_orgao["soma_risco"] / por_orgao["manifestacoes"]
+        por_orgao = (por_orgao.drop(columns="soma_risco")
+                     .sort_values("risco_medio", ascending=False).reset_index())
+        por_orgao.to_parquet(ARQUIVO_RISCO_ORGAOS, engine="pyarrow", index=False)
+        print(f"Resumo por órgão salvo em '{ARQUIVO_RISCO_ORGAOS}' ({len(por_orgao)} órgãos).")
+
+    segundos = time.time() - inicio
+    print(f"Risco salvo em '{ARQUIVO_RISCO}': {total_linhas} manifestações.")
+    print(f"Tempo: {segundos:.2f} segundos ({total_linhas / max(segundos, 1e-9):,.0f} linhas/s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pontua o risco de insatisfação de todo o dataset.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processos de pontuação (0 = todos os núcleos).")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PONTUACAO,
+                        help="Linhas por lote enviado a cada processo.")
+    parser.add_argument("--todas", action="store_true",
+                        help="Pontua também as manifestações concluídas/arquivadas.")
+    args = parser.parse_args()
+    pontuar_dataset(num_workers=args.workers, tamanho_lote=args.tamanho_lote, apenas_abertas=not args.todas)
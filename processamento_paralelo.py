@@ -0,0 +1,22 @@
+# processamento_paralelo.py
+from collections import deque
+
+# ============================================================
+# Helpers de paralelismo compartilhados pelo ETL (etl.py) e pela
+# pontuação em lote (pontuar_risco.py)
+# ============================================================
+
+
+def mapear_em_ordem(pool, funcao, itens, janela):
+    """
+    Como pool.map, mas sem enviar todos os itens de uma vez: no máximo
+    `janela` tarefas ficam em andamento (limita a memória dos resultados).
+    Os resultados saem na ordem dos itens, não na ordem de término.
+    """
+    pendentes = deque()
+    for item in itens:
+        pendentes.append(pool.submit(funcao, item))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
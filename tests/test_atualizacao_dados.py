@@ -0,0 +1,67 @@
+# tests/test_atualizacao_dados.py
+# Publicação do /admin: pasta de versão nova, link trocado com os.replace e
+# só as VERSOES_MANTIDAS versões mais novas no disco.
+import os
+
+import atualizacao_dados as ad
+from dataset_ouvidoria import DIRETORIO_DATASET
+
+
+def _preparar(conteudo):
+    pasta = os.path.join(ad.PASTA_PREPARACAO, DIRETORIO_DATASET)
+    os.makedirs(pasta)
+    with open(os.path.join(pasta, '_manifesto.json'), 'w') as f:
+        f.write(conteudo)
+
+
+def _conteudo_publicado():
+    with open(os.path.join(DIRETORIO_DATASET, '_manifesto.json')) as f:
+        return f.read()
+
+
+def test_publicar_troca_o_link_e_limpa_versoes_antigas(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Dataset de um etl.py rodado fora do /admin: pasta comum
+    os.makedirs(DIRETORIO_DATASET)
+    with open(os.path.join(DIRETORIO_DATASET, '_manifesto.json'), 'w') as f:
+        f.write('v0')
+
+    _preparar('v1')
+    ad.publicar_preparacao()
+    versoes = ad.versoes_publicadas()
+    assert os.path.islink(DIRETORIO_DATASET)
+    assert os.readlink(DIRETORIO_DATASET) == versoes[-1]
+    assert _conteudo_publicado() == 'v1'
+    # A pasta comum virou a versão anterior, ordenada antes da nova
+    assert len(versoes) == 2
+    with open(os.path.join(versoes[0], '_manifesto.json')) as f:
+        assert f.read() == 'v0'
+    assert not os.path.exists(ad.PASTA_PREPARACAO)
+
+    for i in range(2, 6):
+        _preparar(f'v{i}')
+        ad.publicar_preparacao()
+        versoes = ad.versoes_publicadas()
+        assert os.readlink(DIRETORIO_DATASET) == versoes[-1]
+        assert _conteudo_publicado() == f'v{i}'
+        assert len(versoes) == ad.VERSOES_MANTIDAS
+    assert not os.path.lexists(f'{DIRETORIO_DATASET}.link-tmp')
+
+
+def test_publicar_depois_de_etl_completo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _preparar('v1')
+    ad.publicar_preparacao()
+    # etl.py --completo troca o link por uma pasta comum de novo
+    os.remove(DIRETORIO_DATASET)
+    os.makedirs(DIRETORIO_DATASET)
+    with open(os.path.join(DIRETORIO_DATASET, '_manifesto.json'), 'w') as f:
+        f.write('completo')
+
+    _preparar('v2')
+    ad.publicar_preparacao()
+    versoes = ad.versoes_publicadas()
+    assert os.readlink(DIRETORIO_DATASET) == versoes[-1]
+    assert _conteudo_publicado() == 'v2'
+    with open(os.path.join(versoes[-2], '_manifesto.json')) as f:
+        assert f.read() == 'completo'
@@ -0,0 +1,103 @@
+# tests/test_backend_consultas.py
+# Todos os backends de consulta (e os caminhos internos do pyarrow: cubos,
+# Arrow mapeado e Parquet bruto) devolvem o mesmo que agregar as linhas do
+# dataset no pandas, para as consultas que o dashboard faz.
+import os
+import random
+import re
+
+import pandas as pd
+import pytest
+
+import backend_consultas as bc
+import etl
+from dataset_ouvidoria import ler_dataset
+
+UFS = ['SP', 'RJ', 'MG', 'BA', 'DF']
+TIPOS = ['Reclamação', 'Denúncia', 'Solicitação', 'Sugestão', 'Elogio', 'Comunicação']
+SATISFACOES = ['', '(1) Muito insatisfeito', '(2) Insatisfeito', '(3) Regular', '(4) Satisfeito', '(5) Muito satisfeito']
+
+
+def _gravar_csvs(pasta, linhas_por_ano=1500):
+    cabecalho = ['protocolo', 'data registro', 'data prazo resposta', 'data resposta'] + etl.COLUNAS_TEXTO + etl.COLUNAS_NUM
+    sorteio = random.Random(0)
+    valores = {
+        'uf do município manifestante': lambda: sorteio.choice(UFS),
+        'tipo manifestação': lambda: sorteio.choice(TIPOS),
+        'nome Órgão': lambda: f'Órgão {sorteio.randint(1, 25)}',
+        'satisfação': lambda: sorteio.choice(SATISFACOES),
+        'gênero': lambda: sorteio.choice(['Masculino', 'Feminino', 'Não informado', '']),
+        'faixa etária': lambda: sorteio.choice(['18 a 29', '30 a 39', '40 a 49', '']),
+        'raça/cor': lambda: sorteio.choice(['Branca', 'Parda', 'Preta', 'Indígena']),
+        'dias de atraso': lambda: sorteio.choice(['', '0', '0', '3', '12']),
+    }
+    for ano in (2022, 2023):
+        linhas = [';'.join(cabecalho)]
+        for i in range(linhas_por_ano):
+            data = f'{sorteio.randint(1, 28):02d}/{sorteio.randint(1, 12):02d}/{ano}'
+            campos = {'protocolo': str(ano * 10 ** 6 + i), 'data registro': data, 'data prazo resposta': data}
+            linhas.append(';'.join(campos.get(col) or valores.get(col, lambda: '')() for col in cabecalho))
+        (pasta / f'manifestacoes_{ano}.csv').write_text('\n'.join(linhas), encoding='utf-8')
+
+
+@pytest.fixture(scope='module')
+def pasta_dataset(tmp_path_factory):
+    """Roda o ETL sobre CSVs sintéticos numa pasta temporária (o ETL usa caminhos relativos)."""
+    pasta = tmp_path_factory.mktemp('ouvidoria')
+    (pasta / 'src' / 'dados').mkdir(parents=True)
+    _gravar_csvs(pasta / 'src' / 'dados')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(pasta)
+        etl.executar_etl()
+        yield pasta
+
+
+def _esperado(df, consulta):
+    if consulta.vazia():
+        return bc.resultado_vazio(consulta)
+    for col, valores in consulta.filtros.items():
+        df = df[df[col].isin(valores)]
+    if df.empty:
+        return bc.resultado_vazio(consulta)
+    base = df.assign(total=1, soma_dias_atraso=pd.to_numeric(df['dias_de_atraso']).fillna(0))
+    medidas = list(consulta.medidas)
+    if consulta.dimensoes:
+        resultado = base.groupby(list(consulta.dimensoes), observed=True)[medidas].sum().reset_index()
+    else:
+        resultado = base[medidas].sum().to_frame().T
+    return bc.ordenar_resultado(resultado, consulta)
+
+
+BACKENDS = {
+    'pyarrow': lambda: bc.BackendPyArrow(),
+    'pyarrow-arrow-mapeado': lambda: bc.BackendPyArrow(usar_cubos=False),
+    'pyarrow-parquet': lambda: bc.BackendPyArrow(usar_cubos=False, usar_arrow=False),
+    'duckdb': lambda: bc.BackendDuckDB(),
+}
+
+
+@pytest.mark.parametrize('nome_backend', list(BACKENDS))
+def test_backend_igual_ao_pandas(pasta_dataset, nome_backend):
+    if nome_backend == 'duckdb' and bc.duckdb is None:
+        pytest.skip('pacote duckdb não instalado (requirements-opcionais.txt)')
+    backend = BACKENDS[nome_backend]()
+    linhas = ler_dataset()
+
+    consultas = 0
+    for anos, ufs, tipo in bc.cenarios_de_comparacao():
+        for consulta in bc.consultas_do_dashboard(anos, ufs, tipo):
+            obtido = bc.normalizar_resultado(backend.consultar(consulta))
+            esperado = bc.normalizar_resultado(_esperado(linhas, consulta))
+            pd.testing.assert_frame_equal(
+                obtido, esperado, check_dtype=False, check_index_type=False, rtol=1e-9, obj=repr(consulta)
+            )
+            consultas += 1
+    assert consultas == len(bc.cenarios_de_comparacao()) * (len(bc.CONSULTAS_PAINEL) + 2)
+
+
+def test_app_so_usa_consultas_comparadas():
+    # O app consulta pelos nomes de CONSULTAS_PAINEL: todos existem e todos são usados
+    caminho_app = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+    with open(caminho_app, encoding='utf-8') as f:
+        nomes = set(re.findall(r'consultar\([^()]*"(\w+)"\)', f.read()))
+    assert nomes == set(bc.CONSULTAS_PAINEL)
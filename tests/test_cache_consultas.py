@@ -0,0 +1,105 @@
+# tests/test_cache_consultas.py
+# Cache de figuras em disco: invalidação pela versão dos dados, limite de
+# bytes (sai primeiro o acessado há mais tempo), regravação do horário de
+# acesso no máximo a cada `intervalo_acesso` e saídas marcadas com nao_memorizar.
+import os
+import types
+
+import pytest
+
+import cache_consultas as cc
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = types.SimpleNamespace(valor=1_000_000.0)
+    monkeypatch.setattr(cc, 'time', types.SimpleNamespace(time=lambda: agora.valor))
+    return agora
+
+
+def _cache(tmp_path, limite_bytes=10 ** 6, versao='v1'):
+    estado = types.SimpleNamespace(versao=versao)
+    cache = cc.CacheFigurasDisco(str(tmp_path / 'figuras.sqlite'), limite_bytes, lambda: estado.versao)
+    return cache, estado
+
+
+def _acesso(cache, chave):
+    return cache._conexao().execute('SELECT acesso FROM figuras WHERE chave = ?', (chave,)).fetchone()[0]
+
+
+def test_versao_nova_invalida_as_entradas(tmp_path, relogio):
+    cache, estado = _cache(tmp_path)
+    cache.guardar('a', 'v1', {'x': 1})
+    assert cache.obter('a', 'v1') == {'x': 1}
+
+    estado.versao = 'v2'
+    assert cache.obter('a', 'v2') is None
+    cache.guardar('b', 'v2', {'x': 2})
+    # A primeira gravação da versão nova apaga as antigas
+    assert cache.estatisticas()['itens'] == 1
+    assert cache.obter('b', 'v2') == {'x': 2}
+
+
+def test_saida_calculada_durante_troca_de_versao_nao_e_guardada(tmp_path, relogio):
+    cache, estado = _cache(tmp_path)
+    estado.versao = 'v2'
+    cache.guardar('a', 'v1', {'x': 1})
+    assert cache.estatisticas()['itens'] == 0
+
+
+def test_limite_de_bytes_remove_as_menos_acessadas(tmp_path, relogio):
+    # Conteúdo aleatório de mesmo tamanho: entradas de tamanho (quase) igual
+    cache, _ = _cache(tmp_path)
+    for chave in 'abcde':
+        relogio.valor += 100
+        cache.guardar(chave, 'v1', os.urandom(512).hex())
+        if chave == 'a':
+            # Limite para três entradas
+            cache.limite_bytes = int(cache.estatisticas()['bytes_em_uso'] * 3.5)
+        if chave == 'c':
+            relogio.valor += 100
+            assert cache.obter('a', 'v1') is not None  # 'a' volta a ser recente
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas['bytes_em_uso'] <= cache.limite_bytes
+    presentes = {chave for chave in 'abcde' if cache.obter(chave, 'v1') is not None}
+    assert presentes == {'a', 'd', 'e'}
+
+
+def test_saida_maior_que_o_limite_nao_e_guardada(tmp_path, relogio):
+    cache, _ = _cache(tmp_path, limite_bytes=100)
+    cache.guardar('a', 'v1', os.urandom(512).hex())
+    assert cache.estatisticas()['itens'] == 0
+
+
+def test_horario_de_acesso_regravado_no_maximo_a_cada_intervalo(tmp_path, relogio):
+    cache, _ = _cache(tmp_path)
+    cache.guardar('a', 'v1', {'x': 1})
+    gravado = _acesso(cache, 'a')
+
+    relogio.valor += cc.INTERVALO_ATUALIZACAO_ACESSO - 1
+    cache.obter('a', 'v1')
+    assert _acesso(cache, 'a') == gravado
+
+    relogio.valor += 2
+    cache.obter('a', 'v1')
+    assert _acesso(cache, 'a') == relogio.valor
+
+
+def test_memorizar_nao_guarda_saida_marcada(tmp_path, relogio):
+    cache, _ = _cache(tmp_path)
+    chamadas = []
+
+    @cache.memorizar('callback')
+    def callback(falhar):
+        chamadas.append(falhar)
+        if falhar:
+            cache.nao_memorizar()
+            return 'vazio'
+        return 'cheio'
+
+    assert [callback(True), callback(True)] == ['vazio', 'vazio']
+    assert len(chamadas) == 2
+    assert [callback(False), callback(False)] == ['cheio', 'cheio']
+    assert len(chamadas) == 3
+    assert (cache.acertos, cache.falhas) == (1, 3)
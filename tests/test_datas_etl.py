@@ -0,0 +1,79 @@
+# tests/test_datas_etl.py
+# Datas do ETL: formato detectado uma vez por arquivo, conversão por valor
+# distinto e volta para a inferência do pandas só quando o formato não serve.
+import warnings
+
+import pandas as pd
+import pytest
+
+import etl
+
+
+@pytest.mark.parametrize('valores, formato', [
+    (['05/10/2022', '31/12/2023', '01/02/2024'], '%d/%m/%Y'),
+    (['05/10/2022 10:30:00', '31/12/2023 00:00:00'], '%d/%m/%Y %H:%M:%S'),
+    (['2022-10-05', '2023-12-31'], '%Y-%m-%d'),
+    (['2022-10-05 08:00:00'], '%Y-%m-%d %H:%M:%S'),
+    (['05-10-2022'], '%d-%m-%Y'),
+    (['05/10/2022', '2023-12-31'], None),   # Formatos misturados na amostra
+    (['abc'], None),
+    ([], None),
+])
+def test_detectar_formato_data(valores, formato):
+    assert etl.detectar_formato_data(pd.Series(valores, dtype=object).to_numpy()) == formato
+
+
+def test_converter_datas_dia_antes_do_mes():
+    serie = pd.Series(['05/10/2022', None, '05/10/2022', '12/01/2023'], dtype=object)
+    datas, inferencia, falhas = etl.converter_datas(serie, '%d/%m/%Y')
+    assert not inferencia and falhas == 0
+    assert datas.tolist()[0] == pd.Timestamp('2022-10-05')
+    assert pd.isna(datas[1])
+    assert datas[3] == pd.Timestamp('2023-01-12')
+
+
+def test_converter_datas_iso():
+    serie = pd.Series(['2022-10-05', '2023-01-12'], dtype=object)
+    datas, inferencia, falhas = etl.converter_datas(serie, '%Y-%m-%d')
+    assert not inferencia and falhas == 0
+    assert datas.tolist() == [pd.Timestamp('2022-10-05'), pd.Timestamp('2023-01-12')]
+
+
+def test_bloco_fora_do_formato_do_arquivo_usa_inferencia():
+    # Formato detectado no 1o bloco (dd/mm/aaaa); este bloco tem ISO e um valor inválido
+    serie = pd.Series(['2022-10-05', '2023-01-12', 'abc'], dtype=object, index=[10, 11, 12])
+    datas, inferencia, falhas = etl.converter_datas(serie, '%d/%m/%Y')
+    assert inferencia
+    assert falhas == 1
+    assert datas.index.tolist() == [10, 11, 12]
+    assert pd.isna(datas[12])
+
+
+@pytest.mark.parametrize('formato', ['%d/%m/%Y', None])
+def test_coluna_vazia_vira_nat_sem_inferencia(formato):
+    serie = pd.Series([None, None, None], dtype=object, index=[3, 4, 5])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        datas, inferencia, falhas = etl.converter_datas(serie, formato)
+    assert not inferencia and falhas == 0
+    assert datas.dtype == 'datetime64[ns]'
+    assert datas.index.tolist() == [3, 4, 5]
+    assert datas.isna().all()
+
+
+def test_formato_detectado_no_primeiro_bloco_com_valores(tmp_path):
+    # 'data resposta' vazia no 1o bloco: o formato vem do 1o bloco em que ela tem valores
+    cabecalho = 'protocolo;data registro;data prazo resposta;data resposta\n'
+    (tmp_path / 'bloco1.csv').write_text(cabecalho + '1;05/10/2022;;\n2;31/12/2022;;\n', encoding='utf-8')
+    (tmp_path / 'bloco2.csv').write_text(cabecalho + '3;01/02/2023;;02/02/2023\n4;03/02/2023;;\n', encoding='utf-8')
+
+    formatos_data = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        blocos = [etl.limpar_dataframe(etl.ler_csv(str(tmp_path / nome)), formatos_data=formatos_data)
+                  for nome in ('bloco1.csv', 'bloco2.csv')]
+    assert formatos_data == {'data_registro': '%d/%m/%Y', 'data_resposta': '%d/%m/%Y'}
+    assert blocos[0].attrs['datas']['data_resposta'] == {'formato': None, 'blocos': 1, 'blocos_inferencia': 0, 'falhas': 0}
+    assert blocos[1].attrs['datas']['data_resposta']['blocos_inferencia'] == 0
+    assert blocos[1]['data_resposta'].tolist()[0] == pd.Timestamp('2023-02-02')
+    assert blocos[1]['data_prazo_resposta'].isna().all()
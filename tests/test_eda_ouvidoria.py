@@ -0,0 +1,74 @@
+# tests/test_eda_ouvidoria.py
+# Boxplot da satisfação calculado a partir de contagens: tem que dar os
+# mesmos quartis, média e bigodes que as linhas expandidas.
+import numpy as np
+import pandas as pd
+import pytest
+
+import eda_ouvidoria as eda
+
+
+def test_quantil_ponderado_igual_ao_np_quantile():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        valores = np.sort(rng.choice(np.arange(-20, 21), size=rng.integers(1, 8), replace=False)).astype(float)
+        contagens = rng.integers(1, 30, size=len(valores))
+        expandido = np.repeat(valores, contagens)
+        for q in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0):
+            assert eda.quantil_ponderado(valores, contagens, q) == pytest.approx(np.quantile(expandido, q), abs=1e-12)
+
+
+def _contagens(semente=0):
+    rng = np.random.default_rng(semente)
+    linhas = []
+    for atraso in (False, True):
+        for nota in range(1, 6):
+            total = int(rng.integers(0, 40)) if nota != 3 else 0
+            linhas.append({'em_atraso': atraso, 'satisfacao_num': nota, 'satisfacao': f'({nota})', 'total': total})
+    return pd.DataFrame(linhas)
+
+
+@pytest.mark.parametrize('semente', range(20))
+def test_estatisticas_boxplot_iguais_as_linhas_expandidas(semente):
+    df = _contagens(semente)
+    stats = eda.estatisticas_boxplot(df, 'em_atraso', 'satisfacao_num').set_index('em_atraso')
+    for atraso, grupo in df.groupby('em_atraso'):
+        expandido = np.repeat(grupo['satisfacao_num'].to_numpy(float), grupo['total'].to_numpy())
+        if expandido.size == 0:
+            assert atraso not in stats.index
+            continue
+        linha = stats.loc[atraso]
+        q1, mediana, q3 = np.quantile(expandido, [0.25, 0.5, 0.75])
+        assert (linha['q1'], linha['mediana'], linha['q3']) == pytest.approx((q1, mediana, q3))
+        assert linha['media'] == pytest.approx(expandido.mean())
+        assert linha['n'] == expandido.size
+        dentro = expandido[(expandido >= q1 - 1.5 * (q3 - q1)) & (expandido <= q3 + 1.5 * (q3 - q1))]
+        assert (linha['limite_inferior'], linha['limite_superior']) == (dentro.min(), dentro.max())
+        fora = expandido[(expandido < dentro.min()) | (expandido > dentro.max())]
+        assert sum(n for _, n in linha['outliers']) == fora.size
+
+
+def test_boxplot_com_outlier():
+    df = pd.DataFrame({
+        'em_atraso': [False] * 3, 'satisfacao_num': [1, 4, 5], 'satisfacao': ['(1)', '(4)', '(5)'], 'total': [1, 50, 50],
+    })
+    linha = eda.estatisticas_boxplot(df, 'em_atraso', 'satisfacao_num').iloc[0]
+    assert linha['limite_inferior'] == 4
+    assert [(float(v), int(n)) for v, n in linha['outliers']] == [(1.0, 1)]
+
+
+@pytest.mark.parametrize('df', [
+    pd.DataFrame(),
+    pd.DataFrame(columns=['em_atraso', 'satisfacao_num', 'satisfacao', 'total']),
+    pd.DataFrame({'em_atraso': [True], 'satisfacao_num': [2], 'satisfacao': ['(2)'], 'total': [0]}),
+], ids=['sem-colunas', 'sem-linhas', 'contagens-zeradas'])
+def test_grafico_satisfacao_sem_dados(df):
+    fig = eda.grafico_satisfacao(df)
+    assert fig.layout.title.text == 'Sem dados para exibir'
+    assert not fig.data
+
+
+def test_grafico_satisfacao_com_dados():
+    fig = eda.grafico_satisfacao(_contagens())
+    assert fig.data[0].type == 'box'
+    assert list(fig.data[0].x) == ['False', 'True']
@@ -0,0 +1,83 @@
+# tests/test_etl_incremental.py
+# ETL incremental: na segunda execução só o CSV alterado é reprocessado, o
+# que só ganhou 'touch' é pulado, o removido tem as saídas apagadas e a
+# versao_dados muda (e não muda quando nada mudou).
+import json
+import os
+import shutil
+
+import pytest
+
+import etl
+from dataset_ouvidoria import ler_dataset
+from test_backend_consultas import _gravar_csvs
+
+PASTA_DADOS = os.path.join('src', 'dados')
+
+
+def _versao_metadados():
+    with open(etl.ARQUIVO_METADADOS, encoding='utf-8') as f:
+        return json.load(f)['versao_dados']
+
+
+def _mtimes_saidas(manifesto, arquivo_csv):
+    return {caminho: os.stat(os.path.join(etl.DIRETORIO_DATASET, caminho)).st_mtime_ns
+            for caminho in manifesto['arquivos'][arquivo_csv]['arquivos_saida']}
+
+
+def _saidas_no_disco(nome_base):
+    return [os.path.join(raiz, nome) for raiz, _, nomes in os.walk(etl.DIRETORIO_DATASET)
+            for nome in nomes if nome == f'{nome_base}.parquet']
+
+
+def test_segunda_execucao_so_reprocessa_o_que_mudou(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(PASTA_DADOS)
+    _gravar_csvs(tmp_path / PASTA_DADOS, linhas_por_ano=400)
+    csv_2022, csv_2023, csv_extra = (os.path.join(PASTA_DADOS, f'manifestacoes_{nome}.csv')
+                                     for nome in ('2022', '2023', 'extra'))
+    shutil.copyfile(csv_2022, csv_extra)
+
+    assert etl.executar_etl()
+    manifesto = etl.carregar_manifesto()
+    assert sorted(manifesto['arquivos']) == [csv_2022, csv_2023, csv_extra]
+    versao = manifesto['versao_dados']
+    saidas_2022 = _mtimes_saidas(manifesto, csv_2022)
+    assert _saidas_no_disco('manifestacoes_extra')
+
+    # 2023 perde as últimas linhas; 2022 só tem o mtime trocado; extra some
+    with open(csv_2023, encoding='utf-8') as f:
+        linhas = f.read().split('\n')
+    with open(csv_2023, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(linhas[:-100]))
+    info = os.stat(csv_2022)
+    os.utime(csv_2022, ns=(info.st_atime_ns, info.st_mtime_ns + 10 ** 9))
+    os.remove(csv_extra)
+    capsys.readouterr()
+
+    assert etl.executar_etl()
+    saida = capsys.readouterr().out
+    assert 'Processando arquivo 1/1: ' + csv_2023 in saida
+    assert csv_2022 not in saida
+    assert f'Arquivo removido da origem: {csv_extra}' in saida
+
+    manifesto = etl.carregar_manifesto()
+    assert sorted(manifesto['arquivos']) == [csv_2022, csv_2023]
+    # Pulado: as saídas de 2022 são as mesmas e o mtime novo foi registrado
+    assert _mtimes_saidas(manifesto, csv_2022) == saidas_2022
+    assert manifesto['arquivos'][csv_2022]['mtime_ns'] == info.st_mtime_ns + 10 ** 9
+    assert manifesto['arquivos'][csv_2023]['linhas'] == 300
+    # Removido: nem o Parquet no dataset nem os cubos parciais ficam
+    assert not _saidas_no_disco('manifestacoes_extra')
+    assert sorted(os.listdir(etl.PASTA_CUBOS_PARCIAIS)) == ['manifestacoes_2022.parquet', 'manifestacoes_2023.parquet']
+
+    assert manifesto['versao_dados'] != versao
+    assert _versao_metadados() == manifesto['versao_dados']
+    assert len(ler_dataset(colunas=['protocolo'])) == 700
+
+    # Terceira execução sem mudanças: nada é reprocessado e a versão fica
+    versao = manifesto['versao_dados']
+    assert etl.executar_etl()
+    assert 'Processando arquivo' not in capsys.readouterr().out
+    assert etl.carregar_manifesto()['versao_dados'] == versao
+    assert _versao_metadados() == versao
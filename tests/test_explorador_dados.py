@@ -0,0 +1,126 @@
+# tests/test_explorador_dados.py
+# Páginas do /dados (filter_query traduzido para o pyarrow, ordenação por
+# postos e índice de paginação em cache) comparadas com o mesmo filtro e a
+# mesma ordenação feitos no pandas sobre todas as linhas.
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from explorador_dados import ExploradorDados
+
+TAMANHO_PAGINA = 7
+
+
+@pytest.fixture(scope='module')
+def pasta_dataset(tmp_path_factory):
+    """Dataset particionado pequeno, com row groups pequenos, nulos, empates e textos com aspas."""
+    pasta = tmp_path_factory.mktemp('dataset')
+    rng = np.random.default_rng(0)
+    for ano in (2022, 2023):
+        for uf in ('rj', 'sp'):
+            n = 60
+            tabela = pa.table({
+                'protocolo': pa.array(ano * 1000 + np.arange(n) + (500 if uf == 'sp' else 0), pa.int64()),
+                'data_registro': pa.array(
+                    pd.Timestamp(f'{ano}-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'), pa.timestamp('ns')),
+                'tipo_manifestacao': pa.array(rng.choice(['Reclamação', 'Denúncia', 'Elogio'], n)),
+                'nome_orgao': pa.array(rng.choice(['Órgão 1', 'Órgão 2', 'Órgão "3"', "Órgão d'Água"], n)).dictionary_encode(),
+                'dias_de_atraso': pa.array([None if v < 0 else int(v) for v in rng.integers(-3, 15, n)], pa.int64()),
+                'em_atraso': pa.array(rng.random(n) < 0.3),
+                'nota': pa.array([None if v < 0.1 else round(float(v) * 5, 1) for v in rng.random(n)], pa.float64()),
+            })
+            destino = pasta / f'ano_registro={ano}' / f'uf_do_municipio_manifestante={uf}'
+            os.makedirs(destino)
+            pq.write_table(tabela, destino / 'parte.parquet', row_group_size=16)
+    return str(pasta)
+
+
+@pytest.fixture(scope='module')
+def todas_as_linhas(pasta_dataset):
+    # Sem filtro nem ordenação a paginação segue a ordem do disco: é a base do pandas
+    df, total = ExploradorDados(pasta_dataset).pagina(0, 10 ** 6)
+    assert total == len(df) == 240
+    # Categorias do pandas ordenam pela ordem do dicionário: compara como texto
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df.assign(__posicao=np.arange(len(df)))
+
+
+def _filtrar(df, coluna, operador, valor):
+    serie = df[coluna]
+    if operador == 'contains':
+        return df[serie.astype(str).str.contains(valor, regex=False) & serie.notna()]
+    if operador == 'datestartswith':
+        return df[serie.dt.strftime('%Y-%m-%d').str.startswith(valor)]
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        valor = pd.Timestamp(valor)
+    comparacoes = {'=': serie.eq, '!=': serie.ne, '<': serie.lt, '<=': serie.le, '>': serie.gt, '>=': serie.ge}
+    return df[comparacoes[operador](valor) & serie.notna()]
+
+
+def _esperado(df, filtros, ordenacao):
+    for coluna, operador, valor in filtros:
+        df = _filtrar(df, coluna, operador, valor)
+    if ordenacao:
+        # Nulos no fim de cada coluna e empates na ordem do disco (__posicao)
+        colunas, ascendente = [], []
+        for item in ordenacao:
+            nulos = f"__nulo_{item['column_id']}"
+            df = df.assign(**{nulos: df[item['column_id']].isna()})
+            colunas += [nulos, item['column_id']]
+            ascendente += [True, item['direction'] == 'asc']
+        df = df.sort_values(colunas + ['__posicao'], ascending=ascendente + [True], kind='stable')
+    return df
+
+
+CASOS = {
+    'contains': ('{tipo_manifestacao} contains Recla', [('tipo_manifestacao', 'contains', 'Recla')]),
+    'contains-aspas': ('{nome_orgao} contains "\\"3\\""', [('nome_orgao', 'contains', '"3"')]),
+    'igual-texto-aspas-simples': ("{nome_orgao} = 'Órgão d\\'Água'", [('nome_orgao', '=', "Órgão d'Água")]),
+    'igual-numero': ('{dias_de_atraso} = 3', [('dias_de_atraso', '=', 3)]),
+    'menor': ('{dias_de_atraso} < 5', [('dias_de_atraso', '<', 5)]),
+    'maior-igual-float': ('{nota} >= 2.5', [('nota', '>=', 2.5)]),
+    'diferente': ('{tipo_manifestacao} != Elogio', [('tipo_manifestacao', '!=', 'Elogio')]),
+    'data': ('{data_registro} datestartswith 2023-03', [('data_registro', 'datestartswith', '2023-03')]),
+    'data-menor': ('{data_registro} < 2022-06-01', [('data_registro', '<', '2022-06-01')]),
+    'particao-e-texto': (
+        '{ano_registro} = 2023 && {nome_orgao} = "Órgão 1"',
+        [('ano_registro', '=', 2023), ('nome_orgao', '=', 'Órgão 1')],
+    ),
+    'sem-filtro': ('', []),
+}
+ORDENACOES = {
+    'sem-ordem': [],
+    'texto-asc': [{'column_id': 'tipo_manifestacao', 'direction': 'asc'}],
+    'dictionary-desc': [{'column_id': 'nome_orgao', 'direction': 'desc'}],
+    'int-com-nulos-desc': [{'column_id': 'dias_de_atraso', 'direction': 'desc'}],
+    'float-com-nulos-asc': [{'column_id': 'nota', 'direction': 'asc'}],
+    'multi': [{'column_id': 'em_atraso', 'direction': 'desc'}, {'column_id': 'tipo_manifestacao', 'direction': 'asc'},
+              {'column_id': 'dias_de_atraso', 'direction': 'desc'}],
+    'multi-nulos': [{'column_id': 'dias_de_atraso', 'direction': 'asc'}, {'column_id': 'nome_orgao', 'direction': 'desc'}],
+    'multi-data': [{'column_id': 'uf_do_municipio_manifestante', 'direction': 'asc'},
+                   {'column_id': 'data_registro', 'direction': 'desc'}],
+}
+
+
+@pytest.mark.parametrize('nome_ordenacao', list(ORDENACOES))
+@pytest.mark.parametrize('nome_caso', list(CASOS))
+def test_pagina_igual_ao_pandas(pasta_dataset, todas_as_linhas, nome_caso, nome_ordenacao):
+    filter_query, filtros = CASOS[nome_caso]
+    ordenacao = ORDENACOES[nome_ordenacao]
+    esperado = _esperado(todas_as_linhas, filtros, ordenacao)
+    if filtros:
+        assert 0 < len(esperado) < len(todas_as_linhas)
+
+    explorador = ExploradorDados(pasta_dataset)
+    paginas = -(-len(esperado) // TAMANHO_PAGINA)
+    for pagina_atual in list(range(paginas)) + [paginas]:
+        obtido, total = explorador.pagina(pagina_atual, TAMANHO_PAGINA, ordenacao, filter_query)
+        assert total == len(esperado)
+        fatia = esperado.iloc[pagina_atual * TAMANHO_PAGINA:(pagina_atual + 1) * TAMANHO_PAGINA]
+        assert obtido['protocolo'].tolist() == fatia['protocolo'].tolist()
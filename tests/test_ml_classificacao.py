@@ -0,0 +1,75 @@
+# tests/test_ml_classificacao.py
+# O ajuste deduplicado (TF-IDF ponderado + LR com sample_weight) tem que dar
+# o mesmo modelo do fit linha a linha do sklearn com class_weight='balanced':
+# ajustar_tfidf_ponderado copia a escolha do vocabulário e o idf do
+# TfidfVectorizer, e este teste pega qualquer mudança deles numa versão nova.
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_classificacao as ml
+from features_modelo import FEATURES_CATEGORICAS_MODELO, FEATURES_TEXTO
+
+PALAVRAS = ['atraso', 'entrega', 'benefício', 'cadastro', 'atendimento', 'pagamento',
+            'documento', 'saúde', 'escola', 'ônibus', 'energia', 'água']
+
+
+def _dados_com_duplicatas(n_linhas=6000, semente=0):
+    rng = np.random.default_rng(semente)
+    # Poucos assuntos distintos, repetidos em frequências bem diferentes (e empates)
+    assuntos = [' '.join(rng.choice(PALAVRAS, size=rng.integers(1, 5))) for _ in range(40)] + ['', 'sem assunto']
+    probabilidades = rng.dirichlet(np.full(len(assuntos), 0.5))
+    # Categóricas de baixa cardinalidade: a maioria das linhas se repete
+    X = pd.DataFrame({
+        col: rng.choice([f'{col}_{i}' for i in range(2 if col in ('genero', 'nome_orgao') else 1)], size=n_linhas)
+        for col in FEATURES_CATEGORICAS_MODELO
+    })
+    X[FEATURES_TEXTO] = rng.choice(assuntos, size=n_linhas, p=probabilidades)
+    # Classes desbalanceadas, dependentes de uma categórica e de uma palavra
+    logito = (X['genero'] == 'genero_0') * 1.5 + X[FEATURES_TEXTO].str.contains('atraso') * 2.0 - 2.0
+    y = (rng.random(n_linhas) < 1 / (1 + np.exp(-logito))).astype(np.int64)
+    return X, y
+
+
+@pytest.mark.parametrize('config_tfidf', ml.GRADE_TFIDF + [{'max_features': 7, 'ngram_range': (1, 2)}])
+def test_ajuste_deduplicado_igual_ao_linha_a_linha(config_tfidf):
+    X, y = _dados_com_duplicatas()
+    # Linhas novas com categorias e assuntos que o treino não viu
+    X_novo, _ = _dados_com_duplicatas(n_linhas=500, semente=1)
+    X_novo['genero'] = X_novo['genero'].str.replace('genero_1', 'genero_novo')
+    X_novo.loc[::7, FEATURES_TEXTO] = 'palavra inédita'
+
+    linha_a_linha = ml.construir_pipeline(**config_tfidf).fit(X, y)
+    deduplicado = ml.ajustar_pipeline_deduplicado(ml.construir_pipeline(**config_tfidf), X, y)
+
+    tfidf_esperado = linha_a_linha.named_steps['preprocessor'].named_transformers_['texto']
+    tfidf_obtido = deduplicado.named_steps['preprocessor'].named_transformers_['texto']
+    assert tfidf_obtido.vocabulary_ == tfidf_esperado.vocabulary_
+    np.testing.assert_array_equal(tfidf_obtido.idf_, tfidf_esperado.idf_)
+
+    for X_avaliado in (X, X_novo):
+        np.testing.assert_allclose(
+            deduplicado.predict_proba(X_avaliado), linha_a_linha.predict_proba(X_avaliado), rtol=0, atol=1e-9
+        )
+
+
+def test_deduplicar_treino_soma_as_contagens():
+    X, y = _dados_com_duplicatas(n_linhas=2000)
+    X_unicos, y_unicos, contagens = ml.deduplicar_treino(X, y)
+    assert len(X_unicos) * 5 < len(X)
+    assert contagens.sum() == len(X)
+    assert len(X_unicos.assign(alvo=y_unicos).drop_duplicates()) == len(X_unicos)
+    pesos = ml.pesos_balanceados(y)
+    assert sum(pesos[c] * n for c, n in zip(*np.unique(y, return_counts=True))) == pytest.approx(len(y))
+
+
+def test_tfidf_ponderado_desempata_como_o_sklearn():
+    # Todos os termos com a mesma frequência: o corte das max_features cai num empate
+    assuntos = np.array(['alfa beta', 'gama delta', 'beta alfa', 'delta gama épsilon', 'épsilon zeta zeta'])
+    contagens = np.array([3, 2, 1, 2, 1])
+    for max_features in (1, 2, 3, 5):
+        esperado = ml.TfidfVectorizer(max_features=max_features).fit(np.repeat(assuntos, contagens))
+        obtido = ml.TfidfVectorizer(max_features=max_features).fit(assuntos)
+        ml.ajustar_tfidf_ponderado(obtido, assuntos, contagens)
+        assert obtido.vocabulary_ == esperado.vocabulary_
+        np.testing.assert_array_equal(obtido.idf_, esperado.idf_)
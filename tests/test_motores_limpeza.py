@@ -0,0 +1,75 @@
+# tests/test_motores_limpeza.py
+# Os dois motores de limpeza ('arrow' e 'pandas') precisam gerar exatamente
+# a mesma saída, inclusive nos casos difíceis dos CSVs da Ouvidoria.
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import etl
+
+CABECALHO = [
+    'protocolo', 'assunto', 'data registro', 'data prazo resposta', 'data resposta',
+    'nome Órgão', 'município do Órgão', 'uf do Órgão', 'tipo manifestação', 'situação',
+    'esfera', 'serviço', 'outro serviço', 'formulário', 'demanda atendida', 'satisfação',
+    'dias para resolução', 'dias de atraso', 'faixa etária', 'raça/cor', 'gênero',
+    'município manifestante', 'uf do município manifestante', 'município manifestação',
+    'uf do município manifestação',
+]
+
+# Valores de texto problemáticos, distribuídos pelas colunas de texto
+TEXTOS = [
+    'Reclamação', '  ÓRGÃO Público  ', '\xa0Saúde\xa0', 'nan', 'NaN', '', ' ', '\xa0',
+    'São Paulo\t', 'Não informado', '(1) Muito insatisfeito', 'ÇÃÕ ÉÊÍ', 'N/A', 'x\x85',
+]
+# Só em UTF-8: fora do latin-1 (o lower() do Python difere do Arrow em alguns)
+TEXTOS_UNICODE = ['İstanbul', 'ΣΊΣΥΦΟΣ', '　Tóquio ', 'ǅ', 'ﬁ']
+DATAS = ['05/10/2022', '31/02/2022', 'abc', '', '2022-10-05', '14/09/2022 10:30:00']
+NUMEROS = ['41', '', 'abc', '3.5', '-2', 'nan']
+
+
+def _linhas(textos, quantidade=60):
+    linhas = []
+    for i in range(quantidade):
+        valores = []
+        for j, coluna in enumerate(CABECALHO):
+            if coluna == 'protocolo':
+                valores.append(str(20220000000 + i))
+            elif coluna.startswith('data'):
+                # A maioria das datas de registro é válida, para sobrar linhas após o dropna
+                valores.append('05/10/2022' if coluna == 'data registro' and i % 3 else DATAS[(i + j) % len(DATAS)])
+            elif coluna.startswith('dias'):
+                valores.append(NUMEROS[(i + j) % len(NUMEROS)])
+            else:
+                valores.append(textos[(i * 7 + j) % len(textos)])
+        linhas.append(';'.join(valores))
+    return linhas
+
+
+def _gravar_csv(caminho, codificacao):
+    if codificacao == 'latin-1':
+        conteudo = '\n'.join([';'.join(CABECALHO)] + _linhas(TEXTOS)).encode('latin-1')
+    else:
+        conteudo = '\n'.join([';'.join(CABECALHO)] + _linhas(TEXTOS + TEXTOS_UNICODE)).encode('utf-8')
+        if codificacao == 'utf-8 com bytes latin-1':
+            # Bytes inválidos depois da amostra de detecção são lidos como latin-1
+            inicio = conteudo.rindex('Reclamação'.encode('utf-8'))
+            conteudo = conteudo[:inicio] + conteudo[inicio:].replace('Reclamação'.encode('utf-8'), 'Reclamação'.encode('latin-1'), 1)
+    caminho.write_bytes(conteudo)
+    return str(caminho)
+
+
+@pytest.mark.parametrize('codificacao, bytes_latin1', [('latin-1', 0), ('utf-8', 0), ('utf-8 com bytes latin-1', 2)])
+def test_motores_geram_a_mesma_saida(tmp_path, monkeypatch, codificacao, bytes_latin1):
+    monkeypatch.setattr(etl, 'TAMANHO_AMOSTRA_CODIFICACAO', 1024)
+    df_bruto = etl.ler_csv(_gravar_csv(tmp_path / 'manifestacoes.csv', codificacao))
+    assert df_bruto.attrs['bytes_latin1'] == bytes_latin1
+    assert (df_bruto == 'Reclamação').any().any()
+    saidas = {motor: etl.limpar_dataframe(df_bruto.copy(), motor=motor) for motor in etl.MOTORES_LIMPEZA}
+
+    assert len(saidas['pandas']) > 0
+    pd.testing.assert_frame_equal(saidas['arrow'], saidas['pandas'], check_exact=True)
+    assert pa.Table.from_pandas(saidas['arrow']).equals(pa.Table.from_pandas(saidas['pandas']), check_metadata=True)
+
+
+def test_espacos_python_iguais_ao_isspace():
+    assert etl.ESPACOS_PYTHON == ''.join(chr(c) for c in range(0x110000) if chr(c).isspace())
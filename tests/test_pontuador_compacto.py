@@ -0,0 +1,54 @@
+# tests/test_pontuador_compacto.py
+# O PontuadorCompacto exportado de um pipeline treinado dá o mesmo
+# predict_proba do Pipeline, inclusive para categorias que o treino não viu
+# e para assuntos vazios ou só com palavras fora do vocabulário.
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_classificacao as ml
+from features_modelo import FEATURES_CATEGORICAS_MODELO, FEATURES_TEXTO
+from pontuador_compacto import PontuadorCompacto
+from test_ml_classificacao import _dados_com_duplicatas
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    X, y = _dados_com_duplicatas(n_linhas=2000)
+    return ml.construir_pipeline(max_features=20, ngram_range=(1, 2)).fit(X, y)
+
+
+def _dados_novos():
+    X, _ = _dados_com_duplicatas(n_linhas=300, semente=1)
+    for col in FEATURES_CATEGORICAS_MODELO:
+        X.loc[::5, col] = f'{col}_novo'
+    X.loc[::3, FEATURES_TEXTO] = ''
+    X.loc[1::3, FEATURES_TEXTO] = 'palavra inédita'
+    X.loc[2::9, FEATURES_TEXTO] = 'ATRASO na Entrega, atraso!'
+    return X
+
+
+def test_pontuador_igual_ao_predict_proba(pipeline, tmp_path):
+    caminho = str(tmp_path / 'modelo.npz')
+    X = _dados_novos()
+    ml.exportar_modelo_compacto(pipeline, X_verificacao=X, caminho=caminho)
+    pontuador = PontuadorCompacto.carregar(caminho)
+
+    esperado = pipeline.predict_proba(X)
+    np.testing.assert_allclose(pontuador.predict_proba(X), esperado, rtol=0, atol=1e-9)
+    # Um registro avulso (dict), como o app usa
+    registro = X.iloc[0].to_dict()
+    assert registro[FEATURES_TEXTO] == '' and registro['genero'] == 'genero_novo'
+    np.testing.assert_allclose(pontuador.predict_proba(registro), esperado[:1], rtol=0, atol=1e-9)
+
+
+def test_pontuador_sem_texto_nem_categoria_conhecida_usa_so_o_intercepto(pipeline, tmp_path):
+    caminho = str(tmp_path / 'modelo.npz')
+    ml.exportar_modelo_compacto(pipeline, caminho=caminho)
+    pontuador = PontuadorCompacto.carregar(caminho)
+    registro = {col: f'{col}_novo' for col in FEATURES_CATEGORICAS_MODELO} | {FEATURES_TEXTO: ''}
+    intercepto = pipeline.named_steps['classifier'].intercept_[0]
+    assert pontuador.decisao(registro) == pytest.approx(intercepto, abs=1e-12)
+    np.testing.assert_allclose(
+        pontuador.predict_proba(registro), pipeline.predict_proba(pd.DataFrame([registro])), rtol=0, atol=1e-9
+    )